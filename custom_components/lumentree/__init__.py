@@ -1,21 +1,152 @@
 """The Lumentree integration."""
 from __future__ import annotations
 
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
+
+from .api import LumentreeHttpApiClient
+from .coordinator_stats import LumentreeStatsCoordinator
+from .mqtt import LumentreeMqttClient
+from .const import DOMAIN, CONF_DEVICE_SN, CONF_DEVICE_ID, CONF_TRANSPORT
+from .modbus_tcp import LumentreeModbusTcpClient, LOCAL_TRANSPORTS
+from .services import async_setup_services, async_unload_services
+from .analytics import _load_numpy
+
+PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.BINARY_SENSOR]
+
+POLLING_INTERVAL_SECONDS = 5
+CELL_POLL_EVERY = 12 # Battery cells are read every N polls
+
+_LOGGER = logging.getLogger(__name__)
 
-DOMAIN = "lumentree"
-PLATFORMS: list[Platform] = [Platform.SENSOR]
+def _import_optional_modules() -> None:
+    """Import NumPy (blocking, run in an executor) before frames are handled in the event loop."""
+    _load_numpy()
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    """Set up Lumentree from a config entry."""
+    """Set up Lumentree from a config entry.
+
+    Platforms come up immediately (with restored states); authentication,
+    device info and the MQTT connection run in a background task.
+    """
+    started = time.monotonic()
     hass.data.setdefault(DOMAIN, {})
-    
+    device_sn = entry.data.get(CONF_DEVICE_SN)
+    device_id = entry.data.get(CONF_DEVICE_ID, device_sn)
+
+    await hass.async_add_executor_job(_import_optional_modules)
+    api_client = LumentreeHttpApiClient(async_get_clientsession(hass))
+    # Register reads go through the cloud broker or straight to a local Modbus gateway
+    client_cls = LumentreeModbusTcpClient if entry.data.get(CONF_TRANSPORT) in LOCAL_TRANSPORTS else LumentreeMqttClient
+    mqtt_client = client_cls(hass, entry, device_sn, device_id)
+    entry_data: dict[str, Any] = {
+        "device_api_info": {},
+        "api_client": api_client,
+        "mqtt_client": mqtt_client,
+        "stats_coordinator": LumentreeStatsCoordinator(
+            hass, api_client, device_sn, reconcile_energy=mqtt_client.async_reconcile_energy
+        ),
+        "startup_timing": {},
+    }
+    hass.data[DOMAIN][entry.entry_id] = entry_data
+    async_setup_services(hass)
+
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
-    
+    entry_data["startup_timing"]["platforms_ready_s"] = round(time.monotonic() - started, 3)
+
+    entry.async_create_background_task(
+        hass, _async_start_entry(hass, entry, started), f"{DOMAIN}_start_{device_sn}"
+    )
+    entry.async_on_unload(entry.add_update_listener(_async_options_updated))
     return True
 
+async def _async_options_updated(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the entry so changed alert rules are recompiled."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+async def _async_start_entry(hass: HomeAssistant, entry: ConfigEntry, started: float) -> None:
+    """Authenticate, fetch device info and connect MQTT concurrently."""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    timing = entry_data["startup_timing"]
+    device_sn = entry.data.get(CONF_DEVICE_SN)
+    device_id = entry.data.get(CONF_DEVICE_ID, device_sn)
+    api_client: LumentreeHttpApiClient = entry_data["api_client"]
+    mqtt_client: LumentreeMqttClient = entry_data["mqtt_client"]
+
+    async def _http_startup() -> None:
+        await api_client.authenticate_device(device_id)
+        timing["authenticated_s"] = round(time.monotonic() - started, 3)
+        info = await api_client.get_device_info(device_id)
+        timing["device_info_s"] = round(time.monotonic() - started, 3)
+        if info and "_error" not in info:
+            entry_data["device_api_info"] = info
+            dr.async_get(hass).async_get_or_create(
+                config_entry_id=entry.entry_id,
+                identifiers={(DOMAIN, device_sn)},
+                manufacturer="YS Tech (YiShen)",
+                model=info.get("deviceType"),
+                sw_version=info.get("controllerVersion"),
+                hw_version=info.get("liquidCrystalVersion"),
+            )
+        await entry_data["stats_coordinator"].async_refresh()
+        timing["stats_ready_s"] = round(time.monotonic() - started, 3)
+
+    async def _mqtt_startup() -> None:
+        await mqtt_client.connect()
+        timing["mqtt_connected_s"] = round(time.monotonic() - started, 3)
+        await mqtt_client.async_request_data()
+        timing["first_data_s"] = round(time.monotonic() - started, 3)
+
+    results = await asyncio.gather(_http_startup(), _mqtt_startup(), return_exceptions=True)
+    for name, result in zip(("HTTP", "MQTT"), results):
+        if isinstance(result, Exception):
+            _LOGGER.error(f"Lumentree {device_sn} background {name} startup failed: {result}")
+    if isinstance(results[1], Exception):
+        mqtt_client.async_schedule_reconnect()
+
+    polls = 0
+    polling = False
+
+    async def _async_poll(_now=None) -> None:
+        """Poll the device through the pipelined command queue (a tick is skipped while a poll is running)."""
+        nonlocal polls, polling
+        if not mqtt_client.is_connected:
+            return
+        if polling:
+            _LOGGER.debug(f"Lumentree {device_sn} poll still running, tick skipped")
+            return
+        polling = True
+        try:
+            polls += 1
+            await mqtt_client.async_request_data()
+            if polls % CELL_POLL_EVERY == 0:
+                await mqtt_client.async_request_battery_cells()
+        finally:
+            polling = False
+
+    entry.async_on_unload(
+        async_track_time_interval(hass, _async_poll, timedelta(seconds=POLLING_INTERVAL_SECONDS))
+    )
+    _LOGGER.info(f"Lumentree {device_sn} startup timing: {timing}")
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
\ No newline at end of file
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id, {})
+        mqtt_client = entry_data.get("mqtt_client")
+        if mqtt_client:
+            await mqtt_client.disconnect()
+        if not any(isinstance(data, dict) and "mqtt_client" in data for data in hass.data[DOMAIN].values()):
+            async_unload_services(hass)
+    return unload_ok
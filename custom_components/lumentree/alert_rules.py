@@ -0,0 +1,214 @@
+# /config/custom_components/lumentree/alert_rules.py
+# Alert rules compiled once into an evaluation plan; only rules whose inputs changed are re-evaluated
+#
+# Rule spec (JSON-compatible):
+#   {"id": "hot_and_full", "name": "Hot And Full",
+#    "condition": {"all": [{"key": "battery_temperature", "op": ">", "value": 45, "hysteresis": 2},
+#                          {"key": "battery_soc", "op": ">=", "value": 95}]},
+#    "for": 120}
+# Conditions nest with "all" (AND) / "any" (OR); leaves compare one key. "hysteresis" keeps a
+# true leaf true until the value is back past the threshold by that margin. "for" (seconds)
+# requires the condition to hold that long before the alert turns on.
+
+import logging
+import operator
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from .const import (
+    _LOGGER, ALERT_HIGH_TEMP, ALERT_LOW_BATTERY, ALERT_HIGH_VOLTAGE, ALERT_LOW_VOLTAGE,
+    KEY_BATTERY_TEMP, KEY_INVERTER_TEMP, KEY_DEVICE_TEMP, KEY_BATTERY_SOC,
+    KEY_BATTERY_VOLTAGE, KEY_FAULT_CODE,
+)
+
+from .parser import REGISTER_FIELDS, DERIVED_FIELDS, KEY_BATTERY_CELLS
+
+CONF_ALERT_RULES = "alert_rules"
+
+# Keys already present in the dispatched data; a custom rule id must not overwrite them
+RESERVED_KEYS: Set[str] = {
+    *REGISTER_FIELDS, *DERIVED_FIELDS, KEY_BATTERY_CELLS, "online_status", "battery_cell_info", "error",
+    "pv_today", "charge_today", "discharge_today", "grid_in_today", "load_today",
+    "avg_pv_power_10min", "avg_load_power_10min", "avg_efficiency_10min", "energy_self_sufficiency",
+    "temperature_trend", "power_trend",
+}
+RESERVED_PREFIXES = ("battery_cell_",)
+RESERVED_SUFFIXES = ("_anomaly",)
+
+# The original fixed alerts, expressed as rules
+BUILTIN_RULES: List[Dict[str, Any]] = [
+    {"id": "high_temperature_alert", "condition": {"any": [
+        {"key": KEY_BATTERY_TEMP, "op": ">", "value": ALERT_HIGH_TEMP},
+        {"key": KEY_INVERTER_TEMP, "op": ">", "value": ALERT_HIGH_TEMP},
+        {"key": KEY_DEVICE_TEMP, "op": ">", "value": ALERT_HIGH_TEMP},
+    ]}},
+    {"id": "low_battery_alert", "condition": {"key": KEY_BATTERY_SOC, "op": "<", "value": ALERT_LOW_BATTERY}},
+    {"id": "voltage_alert", "condition": {"any": [
+        {"key": KEY_BATTERY_VOLTAGE, "op": ">", "value": ALERT_HIGH_VOLTAGE},
+        {"key": KEY_BATTERY_VOLTAGE, "op": "<", "value": ALERT_LOW_VOLTAGE},
+    ]}},
+    {"id": "system_fault_alert", "condition": {"key": KEY_FAULT_CODE, "op": "not_in", "value": [0, "No Fault"]}},
+]
+
+BUILTIN_RULE_IDS: Set[str] = {rule["id"] for rule in BUILTIN_RULES}
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+    "==": operator.eq, "!=": operator.ne,
+    "in": lambda a, b: a in b, "not_in": lambda a, b: a not in b,
+}
+_MISSING = object()
+
+
+class AlertRuleError(ValueError):
+    """Invalid alert rule specification."""
+
+
+class _Leaf:
+    """Comparison of one key against a constant, with optional hysteresis."""
+
+    __slots__ = ("key", "op", "compare", "value", "hysteresis", "state")
+
+    def __init__(self, spec: Dict[str, Any]):
+        try:
+            self.key = spec["key"]
+            self.op = spec.get("op", ">")
+            self.compare = _OPERATORS[self.op]
+            self.value = spec["value"]
+        except KeyError as e:
+            raise AlertRuleError(f"Invalid condition {spec}: missing or unknown {e}") from e
+        self.hysteresis = float(spec.get("hysteresis", 0))
+        if self.op in ("in", "not_in") and not isinstance(self.value, (list, tuple)):
+            raise AlertRuleError(f"Condition {spec}: '{self.op}' needs a list value")
+        if self.hysteresis and self.op not in (">", ">=", "<", "<="):
+            raise AlertRuleError(f"Condition {spec}: hysteresis needs an ordering operator")
+        self.state = False
+
+    def __call__(self, data: Dict[str, Any]) -> bool:
+        value = data.get(self.key, _MISSING)
+        if value is _MISSING or value is None:
+            return self.state # Keep the last state when the key is absent from this frame
+        threshold = self.value
+        if self.state and self.hysteresis:
+            # Already on: release only once past the threshold by the hysteresis margin
+            threshold = threshold - self.hysteresis if self.op in (">", ">=") else threshold + self.hysteresis
+        try:
+            self.state = bool(self.compare(value, threshold))
+        except TypeError:
+            self.state = False
+        return self.state
+
+
+def _compile_condition(spec: Dict[str, Any], keys: Set[str]) -> Callable[[Dict[str, Any]], bool]:
+    """Compile a condition tree into a callable, collecting its input keys."""
+    if not isinstance(spec, dict):
+        raise AlertRuleError(f"Condition must be an object: {spec!r}")
+    for combinator, reducer in (("all", all), ("any", any)):
+        if combinator in spec:
+            children = [_compile_condition(child, keys) for child in spec[combinator]]
+            if not children:
+                raise AlertRuleError(f"Empty '{combinator}' condition")
+            # Evaluate every child so each leaf keeps its own hysteresis state current
+            return lambda data, children=children, reducer=reducer: reducer([child(data) for child in children])
+    leaf = _Leaf(spec)
+    keys.add(leaf.key)
+    return leaf
+
+
+class CompiledRule:
+    """One alert rule: compiled condition, input keys and duration latch."""
+
+    __slots__ = ("id", "name", "evaluate", "inputs", "hold_for", "state", "_true_since")
+
+    def __init__(self, spec: Dict[str, Any]):
+        if "id" not in spec or "condition" not in spec:
+            raise AlertRuleError(f"Rule needs 'id' and 'condition': {spec}")
+        self.id: str = spec["id"]
+        self.name: str = spec.get("name") or self.id.replace("_", " ").title()
+        inputs: Set[str] = set()
+        self.evaluate = _compile_condition(spec["condition"], inputs)
+        self.inputs = frozenset(inputs)
+        self.hold_for = float(spec.get("for", 0))
+        self.state = False
+        self._true_since: Optional[float] = None
+
+    def update(self, data: Dict[str, Any], now: float) -> bool:
+        """Re-evaluate; returns True while a 'for' duration is still pending."""
+        if not self.evaluate(data):
+            self._true_since = None
+            self.state = False
+            return False
+        if self._true_since is None:
+            self._true_since = now
+        self.state = now - self._true_since >= self.hold_for
+        return not self.state
+
+
+class AlertRuleEngine:
+    """Evaluation plan over compiled rules with a key -> rules dependency index."""
+
+    def __init__(self, rules: Iterable[Dict[str, Any]] = ()):
+        self.rules: List[CompiledRule] = []
+        self._index: Dict[str, List[CompiledRule]] = {}
+        self._last_inputs: Dict[str, Any] = {}
+        self._timed: Set[CompiledRule] = set() # Condition true, 'for' not yet elapsed
+        self._first = True
+        self.evaluations = 0
+        self.load(rules)
+
+    def load(self, rules: Iterable[Dict[str, Any]]) -> None:
+        """Compile rules (raises AlertRuleError) and rebuild the dependency index."""
+        compiled = [CompiledRule(spec) for spec in rules]
+        ids = [rule.id for rule in compiled]
+        if len(ids) != len(set(ids)):
+            raise AlertRuleError(f"Duplicate rule ids in {ids}")
+        index: Dict[str, List[CompiledRule]] = {}
+        for rule in compiled:
+            for key in rule.inputs:
+                index.setdefault(key, []).append(rule)
+        self.rules, self._index = compiled, index
+        self._last_inputs.clear()
+        self._timed.clear()
+        self._first = True
+
+    @property
+    def input_keys(self) -> Set[str]:
+        return set(self._index)
+
+    def evaluate(self, data: Dict[str, Any], now: Optional[float] = None) -> Dict[str, bool]:
+        """Re-evaluate rules whose inputs changed (plus pending 'for' timers); return all states."""
+        now = time.monotonic() if now is None else now
+        dirty: Set[CompiledRule] = set(self.rules) if self._first else set(self._timed)
+        self._first = False
+        for key, rules in self._index.items():
+            value = data.get(key, _MISSING)
+            if value is _MISSING or self._last_inputs.get(key, _MISSING) == value:
+                continue
+            self._last_inputs[key] = value
+            dirty.update(rules)
+        for rule in dirty:
+            self.evaluations += 1
+            if rule.update(data, now):
+                self._timed.add(rule)
+            else:
+                self._timed.discard(rule)
+        return {rule.id: rule.state for rule in self.rules}
+
+
+def _is_reserved(rule_id: Any) -> bool:
+    return isinstance(rule_id, str) and (
+        rule_id in RESERVED_KEYS or rule_id in BUILTIN_RULE_IDS
+        or rule_id.startswith(RESERVED_PREFIXES) or rule_id.endswith(RESERVED_SUFFIXES)
+    )
+
+
+def compile_rules(custom_rules: Iterable[Dict[str, Any]] = (), builtin: bool = True) -> AlertRuleEngine:
+    """Engine with the built-in rules (unless the fleet step evaluates them) followed by user rules.
+
+    User rule ids must not shadow data keys or built-in rule ids.
+    """
+    custom_rules = list(custom_rules)
+    for spec in custom_rules:
+        if isinstance(spec, dict) and _is_reserved(spec.get("id")):
+            raise AlertRuleError(f"Rule id '{spec['id']}' is already used by another value")
+    return AlertRuleEngine([*(BUILTIN_RULES if builtin else ()), *custom_rules])
@@ -3,138 +3,547 @@
 # Real-time analytics and alerts for Lumentree integration
 
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
 from collections import deque
+from array import array
+import math
 import statistics
 
-try:
-    from .const import (
-        _LOGGER, ALERT_HIGH_TEMP, ALERT_LOW_BATTERY, ALERT_HIGH_VOLTAGE, 
-        ALERT_LOW_VOLTAGE, KEY_BATTERY_TEMP, KEY_INVERTER_TEMP, KEY_DEVICE_TEMP,
-        KEY_BATTERY_SOC, KEY_BATTERY_VOLTAGE, KEY_FAULT_CODE, KEY_PV_POWER,
-        KEY_BATTERY_POWER, KEY_LOAD_POWER, KEY_GRID_POWER, KEY_SYSTEM_EFFICIENCY
-    )
-except ImportError:
-    _LOGGER = logging.getLogger(__name__)
-    ALERT_HIGH_TEMP = 60.0; ALERT_LOW_BATTERY = 20.0; ALERT_HIGH_VOLTAGE = 58.0; ALERT_LOW_VOLTAGE = 44.0
-    KEY_BATTERY_TEMP = "battery_temperature"; KEY_INVERTER_TEMP = "inverter_temperature"
-    KEY_DEVICE_TEMP = "device_temperature"; KEY_BATTERY_SOC = "battery_soc"
-    KEY_BATTERY_VOLTAGE = "battery_voltage"; KEY_FAULT_CODE = "fault_code"
-    KEY_PV_POWER = "pv_power"; KEY_BATTERY_POWER = "battery_power"
-    KEY_LOAD_POWER = "load_power"; KEY_GRID_POWER = "grid_power"
-    KEY_SYSTEM_EFFICIENCY = "system_efficiency"
+_numpy: Any = False # Not imported yet
+
+
+def _load_numpy():
+    """Import NumPy on first use; None when it is not installed."""
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+from .const import (
+    _LOGGER, KEY_BATTERY_TEMP, KEY_INVERTER_TEMP, KEY_DEVICE_TEMP,
+    KEY_BATTERY_SOC, KEY_BATTERY_VOLTAGE, KEY_FAULT_CODE, KEY_PV_POWER,
+    KEY_BATTERY_POWER, KEY_LOAD_POWER, KEY_GRID_POWER, KEY_SYSTEM_EFFICIENCY
+)
+
+from .alert_rules import AlertRuleEngine, AlertRuleError, compile_rules
+from .quantiles import KllSketch, QuantileWindows, summarise_sketches
+
+KEY_BATTERY_STATUS = "battery_status"
+
+# Daily energy flows integrated from MQTT power samples (same keys as the HTTP stats)
+ENERGY_KEYS = ("pv_today", "charge_today", "discharge_today", "grid_in_today", "load_today")
+ENERGY_MAX_GAP_SECONDS = 300 # Do not integrate across gaps longer than this (offline, restart)
+ENERGY_CHECKPOINTS = 720 # Running totals kept per sample (1 h at 5 s) to find the total at an HTTP sample time
+
+
+class EnergyIntegrator:
+    """Trapezoidal kWh integrator per energy flow, reset at local midnight."""
+
+    def __init__(self, max_gap: float = ENERGY_MAX_GAP_SECONDS):
+        self.max_gap = max_gap
+        self.day: Optional[str] = None
+        self.totals: Dict[str, float] = {key: 0.0 for key in ENERGY_KEYS}
+        self._last_ts: Optional[float] = None
+        self._last_powers: Dict[str, float] = {}
+        self._checkpoints: deque = deque(maxlen=ENERGY_CHECKPOINTS) # (ts, totals) after each sample
+
+    @staticmethod
+    def _flow_powers(data: Dict[str, Any]) -> Dict[str, float]:
+        """Split a frame into non-negative power (W) per energy flow."""
+        def _num(key: str) -> float:
+            value = data.get(key)
+            return float(value) if isinstance(value, (int, float)) else 0.0
+
+        battery = _num(KEY_BATTERY_POWER)
+        status = data.get(KEY_BATTERY_STATUS)
+        if isinstance(status, str) and "discharg" in status.lower():
+            charge, discharge = 0.0, abs(battery)
+        elif isinstance(status, str) and "charg" in status.lower():
+            charge, discharge = abs(battery), 0.0
+        else: # Signed power: positive = discharging
+            charge, discharge = max(-battery, 0.0), max(battery, 0.0)
+
+        return {
+            "pv_today": max(_num(KEY_PV_POWER), 0.0),
+            "charge_today": charge,
+            "discharge_today": discharge,
+            "grid_in_today": max(_num(KEY_GRID_POWER), 0.0),
+            "load_today": max(_num(KEY_LOAD_POWER), 0.0),
+        }
+
+    def _roll_day(self, now: datetime) -> None:
+        """Reset totals when the local date changes."""
+        day = now.date().isoformat()
+        if day != self.day:
+            if self.day is not None:
+                _LOGGER.debug(f"Energy integrator day rollover {self.day} -> {day}")
+            self.day = day
+            self.totals = {key: 0.0 for key in ENERGY_KEYS}
+            self._checkpoints.clear()
+
+    def update(self, data: Dict[str, Any], now: datetime) -> Dict[str, float]:
+        """Integrate one power sample and return the daily totals (kWh)."""
+        self._roll_day(now)
+        ts = now.timestamp()
+        powers = self._flow_powers(data)
+        if self._last_ts is not None:
+            dt = ts - self._last_ts
+            if 0 < dt <= self.max_gap:
+                for key, power in powers.items():
+                    previous = self._last_powers.get(key, power)
+                    self.totals[key] += (previous + power) / 2.0 * dt / 3_600_000.0
+        self._last_ts = ts
+        self._last_powers = powers
+        self._checkpoints.append((ts, dict(self.totals)))
+        return self.values()
+
+    def _totals_at(self, ts: float) -> Dict[str, float]:
+        """Integrated totals at ts (last sample at or before it; current totals if nothing is known)."""
+        found = self._checkpoints[0][1] if self._checkpoints and self._checkpoints[0][0] > ts else self.totals
+        for checkpoint_ts, totals in reversed(self._checkpoints):
+            if checkpoint_ts <= ts:
+                found = totals
+                break
+        return found
+
+    def reconcile(
+        self, http_totals: Dict[str, Optional[float]], now: datetime, sample_time: Optional[datetime] = None
+    ) -> Dict[str, float]:
+        """Snap to the HTTP daily totals (up or down), keeping only the energy integrated since sample_time.
+
+        sample_time: when the HTTP request was sent (default now); totals of another day are ignored.
+        """
+        self._roll_day(now)
+        sample_time = sample_time or now
+        if sample_time.date().isoformat() != self.day:
+            return self.values()
+        at_sample = self._totals_at(sample_time.timestamp())
+        for key in ENERGY_KEYS:
+            value = http_totals.get(key)
+            if value is None:
+                continue
+            offset = float(value) - at_sample[key] # New total: HTTP value + energy integrated since the sample
+            self.totals[key] += offset
+            for _ts, totals in self._checkpoints: # Later reconciles measure against the snapped series
+                totals[key] += offset
+        return self.values()
+
+    def values(self) -> Dict[str, float]:
+        return {key: round(value, 3) for key, value in self.totals.items()}
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Serializable state for persistence across restarts."""
+        return {"day": self.day, "totals": dict(self.totals)}
+
+    def restore(self, stored: Optional[Dict[str, Any]], now: datetime) -> None:
+        """Restore persisted totals if they belong to the current local day."""
+        if not stored or stored.get("day") != now.date().isoformat():
+            self._roll_day(now)
+            return
+        self.day = stored["day"]
+        for key, value in (stored.get("totals") or {}).items():
+            if key in self.totals and isinstance(value, (int, float)):
+                self.totals[key] = float(value)
+        _LOGGER.debug(f"Energy totals restored for {self.day}: {self.values()}")
+
+
+class BatteryCellTracker:
+    """Per-frame cell statistics plus a fixed 2-D ring buffer of cell voltages (history x cells)."""
+
+    def __init__(self, max_history: int = 360):
+        self.max_history = max_history
+        self.num_cells = 0
+        self.count = 0 # Frames stored (<= max_history)
+        self._pos = 0 # Next row to overwrite
+        self._buffer = None # np.ndarray (history, cells) or list of array('f') rows
+        self._np = None
+
+    def _allocate(self, num_cells: int) -> None:
+        self.num_cells = num_cells
+        self.count = 0
+        self._pos = 0
+        self._np = np = _load_numpy()
+        if np is not None:
+            self._buffer = np.zeros((self.max_history, num_cells), dtype=np.float32)
+        else:
+            self._buffer = [array('f', bytes(4 * num_cells)) for _ in range(self.max_history)]
+
+    def update(self, cells_mv) -> Dict[str, Any]:
+        """Store one frame of cell voltages (mV) and return its statistics (V)."""
+        n = len(cells_mv)
+        if not n:
+            return {}
+        if n != self.num_cells:
+            _LOGGER.debug(f"Battery cell count changed {self.num_cells} -> {n}, reset history")
+            self._allocate(n)
+
+        np = self._np
+        if np is not None:
+            volts = np.frombuffer(cells_mv, dtype=np.uint16).astype(np.float32) / 1000.0 if isinstance(cells_mv, array) \
+                else np.asarray(cells_mv, dtype=np.float32) / 1000.0
+            self._buffer[self._pos] = volts
+            i_min, i_max = int(volts.argmin()), int(volts.argmax())
+            v_min, v_max = float(volts[i_min]), float(volts[i_max])
+            mean, std = float(volts.mean()), float(volts.std())
+        else:
+            volts = array('f', (mv / 1000.0 for mv in cells_mv))
+            self._buffer[self._pos] = volts
+            v_min, v_max = min(volts), max(volts)
+            i_min, i_max = volts.index(v_min), volts.index(v_max)
+            mean = math.fsum(volts) / n
+            std = math.sqrt(max(math.fsum(v * v for v in volts) / n - mean * mean, 0.0))
+
+        self._pos = (self._pos + 1) % self.max_history
+        self.count = min(self.count + 1, self.max_history)
+        return {
+            'battery_cell_count': n,
+            'battery_cell_min': round(v_min, 3),
+            'battery_cell_max': round(v_max, 3),
+            'battery_cell_spread': round(v_max - v_min, 3),
+            'battery_cell_mean': round(mean, 3),
+            'battery_cell_std': round(std, 4),
+            'battery_cell_min_index': i_min + 1, # 1-based cell numbers
+            'battery_cell_max_index': i_max + 1,
+        }
+
+    def get_imbalance(self) -> Dict[str, Any]:
+        """Long-term per-cell mean deviation (V) from the pack mean over the stored history."""
+        if not self.count:
+            return {}
+        np = self._np
+        if np is not None:
+            rows = self._buffer[:self.count]
+            deviation = (rows - rows.mean(axis=1, keepdims=True)).mean(axis=0)
+            deviations = [round(float(d), 4) for d in deviation]
+        else:
+            sums = [0.0] * self.num_cells
+            for row in self._buffer[:self.count]:
+                row_mean = math.fsum(row) / self.num_cells
+                sums = [acc + v - row_mean for acc, v in zip(sums, row)]
+            deviations = [round(acc / self.count, 4) for acc in sums]
+        weakest = min(range(self.num_cells), key=deviations.__getitem__)
+        strongest = max(range(self.num_cells), key=deviations.__getitem__)
+        return {
+            'cell_deviation': deviations,
+            'weakest_cell': weakest + 1,
+            'strongest_cell': strongest + 1,
+            'frames': self.count,
+        }
+
+    def reset(self) -> None:
+        if self.num_cells:
+            self._allocate(self.num_cells)
+
+
+# Streaming anomaly models: key -> (EWMA alpha, minimum std dev in the key's unit)
+ANOMALY_METRICS: Dict[str, tuple] = {
+    "battery_voltage": (0.01, 0.2),
+    "grid_voltage": (0.01, 2.0),
+    "load_power": (0.02, 50.0),
+    "device_temperature": (0.01, 0.5),
+    "battery_temperature": (0.01, 0.5),
+    "inverter_temperature": (0.01, 0.5),
+}
+ANOMALY_WARMUP_SAMPLES = 60 # No anomaly before the model has seen this many samples
+ANOMALY_Z_ON = 4.0 # Enter anomaly when |x - mean| >= 4 sigma
+ANOMALY_Z_OFF = 3.0 # Leave it only once back under 3 sigma (hysteresis)
+
+
+class EwmaAnomalyModel:
+    """Exponentially weighted mean/variance with a hysteresis band, O(1) per update."""
+
+    __slots__ = ("alpha", "min_std", "mean", "var", "count", "active", "last_z")
+
+    def __init__(self, alpha: float, min_std: float):
+        self.alpha = alpha
+        self.min_std = min_std
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.active = False
+        self.last_z = 0.0
+
+    def update(self, value: float) -> bool:
+        """Score value against the learned band, then learn it; returns the anomaly state."""
+        if self.count == 0:
+            self.mean = value
+            self.count = 1
+            return False
+        diff = value - self.mean
+        z = abs(diff) / max(math.sqrt(self.var), self.min_std)
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+        self.last_z = z
+        if self.count < ANOMALY_WARMUP_SAMPLES:
+            self.active = False
+        elif not self.active and z >= ANOMALY_Z_ON:
+            self.active = True
+        elif self.active and z < ANOMALY_Z_OFF:
+            self.active = False
+        return self.active
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'mean': round(self.mean, 3), 'std': round(math.sqrt(self.var), 3),
+            'z': round(self.last_z, 2), 'samples': self.count, 'anomaly': self.active,
+        }
+
+
+# Multi-resolution history: (bucket seconds, retention seconds); bucket 0 = raw samples
+ROLLUP_METRICS = (
+    KEY_PV_POWER, KEY_LOAD_POWER, KEY_BATTERY_POWER, KEY_GRID_POWER, KEY_BATTERY_SOC,
+    KEY_BATTERY_VOLTAGE, "max_temperature", KEY_SYSTEM_EFFICIENCY,
+)
+ROLLUP_TIERS = ((0, 3600), (60, 86400), (900, 90 * 86400))
+STATISTICS_PERIOD_SECONDS = 86400
+STATISTICS_TARGET_POINTS = 96 # get_statistics picks the coarsest tier giving about this many points
+# Percentile sketches: stats name -> data key ("max_temperature" = hottest of the three sensors)
+QUANTILE_METRICS = {
+    'pv_power': KEY_PV_POWER, 'load_power': KEY_LOAD_POWER, 'grid_power': KEY_GRID_POWER,
+    'temperature': "max_temperature",
+}
+
+
+class RollupBucket:
+    """min/sum/max/count per metric over one time bucket."""
+
+    __slots__ = ("start", "count", "min", "sum", "max")
+
+    def __init__(self, start: float, num_metrics: int):
+        self.start = start
+        self.count = [0] * num_metrics
+        self.min = [math.inf] * num_metrics
+        self.sum = [0.0] * num_metrics
+        self.max = [-math.inf] * num_metrics
+
+    def add(self, values) -> None:
+        for i, value in enumerate(values):
+            if value is None:
+                continue
+            self.count[i] += 1
+            self.sum[i] += value
+            if value < self.min[i]:
+                self.min[i] = value
+            if value > self.max[i]:
+                self.max[i] = value
+
+    def as_dict(self, metrics) -> Dict[str, Any]:
+        point: Dict[str, Any] = {'ts': self.start}
+        for i, key in enumerate(metrics):
+            if self.count[i]:
+                point[key] = {
+                    'min': round(self.min[i], 2), 'mean': round(self.sum[i] / self.count[i], 2),
+                    'max': round(self.max[i], 2),
+                }
+        return point
+
+
+class TieredRollup:
+    """Raw samples for the last hour, 1-minute buckets for a day, 15-minute buckets for months.
+
+    Every sample updates the open bucket of each tier (O(metrics) per tier); closed
+    buckets are appended to a deque and expire after the tier's retention.
+    """
+
+    def __init__(self, metrics=ROLLUP_METRICS, tiers=ROLLUP_TIERS):
+        self.metrics = tuple(metrics)
+        self.raw_retention = tiers[0][1]
+        self._raw: deque = deque() # (timestamp, values tuple)
+        self._tiers: List[Dict[str, Any]] = [
+            {'size': size, 'retention': retention, 'closed': deque(), 'open': None}
+            for size, retention in tiers[1:]
+        ]
+
+    def add(self, ts: float, values) -> None:
+        """Add one sample (values in metric order, None = missing)."""
+        self._raw.append((ts, tuple(values)))
+        while self._raw and self._raw[0][0] < ts - self.raw_retention:
+            self._raw.popleft()
+        for tier in self._tiers:
+            size = tier['size']
+            bucket = tier['open']
+            if bucket is None or ts >= bucket.start + size:
+                if bucket is not None and any(bucket.count):
+                    tier['closed'].append(bucket)
+                bucket = tier['open'] = RollupBucket(ts - ts % size, len(self.metrics))
+                closed = tier['closed']
+                while closed and closed[0].start < ts - tier['retention']:
+                    closed.popleft()
+            bucket.add(values)
+
+    def _buckets(self, tier: Dict[str, Any], since: float) -> List[RollupBucket]:
+        size = tier['size']
+        buckets = [b for b in tier['closed'] if b.start + size > since]
+        if tier['open'] is not None and any(tier['open'].count):
+            buckets.append(tier['open'])
+        return buckets
+
+    def tier_size(self, resolution: float, period: float = 0) -> int:
+        """Coarsest bucket size not exceeding the resolution among the tiers retaining the period (0 = raw).
+
+        When no such tier covers the period, the finest tier that does is used.
+        """
+        tiers = [(0, self.raw_retention)] + [(tier['size'], tier['retention']) for tier in self._tiers]
+        covering = [size for size, retention in tiers if retention >= period] or [tiers[-1][0]]
+        fine = [size for size in covering if size <= resolution]
+        return max(fine) if fine else min(covering)
+
+    def recent(self, count: int) -> List[Tuple]:
+        """Values of the last raw samples (oldest first)."""
+        return [values for _, values in list(self._raw)[-count:]]
+
+    def points(self, since: float, resolution: float = 0, now: Optional[float] = None) -> Dict[str, Any]:
+        """History since a timestamp from the coarsest tier meeting the resolution that retains the period."""
+        size = self.tier_size(resolution, (now if now is not None else since) - since)
+        if size == 0:
+            points = [
+                {'ts': ts, **{key: v for key, v in zip(self.metrics, values) if v is not None}}
+                for ts, values in self._raw if ts >= since
+            ]
+        else:
+            tier = next(t for t in self._tiers if t['size'] == size)
+            points = [b.as_dict(self.metrics) for b in self._buckets(tier, since)]
+        return {'resolution_seconds': size, 'points': points}
+
+    def aggregate(self, since: float, now: float) -> Dict[str, Dict[str, float]]:
+        """min/mean/max/count per metric since a timestamp (served from a coarse tier)."""
+        size = self.tier_size((now - since) / STATISTICS_TARGET_POINTS, now - since)
+        num = len(self.metrics)
+        total = RollupBucket(since, num)
+        if size == 0:
+            for ts, values in self._raw:
+                if ts >= since:
+                    total.add(values)
+        else:
+            tier = next(t for t in self._tiers if t['size'] == size)
+            for bucket in self._buckets(tier, since):
+                for i in range(num):
+                    if bucket.count[i]:
+                        total.count[i] += bucket.count[i]
+                        total.sum[i] += bucket.sum[i]
+                        total.min[i] = min(total.min[i], bucket.min[i])
+                        total.max[i] = max(total.max[i], bucket.max[i])
+        return {
+            key: {'min': total.min[i], 'mean': total.sum[i] / total.count[i], 'max': total.max[i], 'count': total.count[i]}
+            for i, key in enumerate(self.metrics) if total.count[i]
+        }
+
+    def point_counts(self) -> Dict[str, int]:
+        counts = {'raw': len(self._raw)}
+        for tier in self._tiers:
+            counts[f"{tier['size']}s"] = len(tier['closed']) + (tier['open'] is not None)
+        return counts
+
+    def reset(self) -> None:
+        self._raw.clear()
+        for tier in self._tiers:
+            tier['closed'].clear()
+            tier['open'] = None
+
 
 class LumentreeAnalytics:
     """Real-time analytics and alert system for Lumentree data"""
     
-    def __init__(self, max_history: int = 100):
+    def __init__(self, max_history: int = 100, alert_rules: Optional[List[Dict[str, Any]]] = None,
+                 trends: bool = True, builtin_alerts: bool = True):
         self.max_history = max_history
-        self.power_history: deque = deque(maxlen=max_history)
-        self.efficiency_history: deque = deque(maxlen=max_history)
-        self.temperature_history: deque = deque(maxlen=max_history)
-        self.voltage_history: deque = deque(maxlen=max_history)
+        self.trends = trends # False when the shared fleet engine computes averages and trends per tick
+        self.builtin_alerts = builtin_alerts # False when the fleet engine evaluates the built-in alerts per tick
+        self.energy = EnergyIntegrator()
+        self.cells = BatteryCellTracker()
+        self.anomaly_models: Dict[str, EwmaAnomalyModel] = {
+            key: EwmaAnomalyModel(alpha, min_std) for key, (alpha, min_std) in ANOMALY_METRICS.items()
+        }
+        self.history = TieredRollup()
+        self.quantiles = QuantileWindows(QUANTILE_METRICS)
+        self._custom_alert_rules = list(alert_rules or [])
+        self.alerts: AlertRuleEngine = self._compile_alerts()
         self.last_update = None
         _LOGGER.debug("Analytics module initialized")
 
-    def update_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def _compile_alerts(self) -> AlertRuleEngine:
+        """Built-in plus custom rules; built-in only when stored custom rules are no longer valid"""
+        try:
+            return compile_rules(self._custom_alert_rules, self.builtin_alerts)
+        except AlertRuleError as e:
+            _LOGGER.error(f"Custom alert rules ignored: {e}")
+            return compile_rules(builtin=self.builtin_alerts)
+
+    def update_data(self, data: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
         """Update analytics with new data and return calculated metrics + alerts"""
-        current_time = datetime.now()
+        current_time = now or datetime.now()
         analytics_data = {}
         
-        # Store historical data
-        power_data = {
-            'timestamp': current_time,
-            'pv_power': data.get(KEY_PV_POWER, 0),
-            'battery_power': data.get(KEY_BATTERY_POWER, 0),
-            'load_power': data.get(KEY_LOAD_POWER, 0),
-            'grid_power': data.get(KEY_GRID_POWER, 0)
-        }
-        self.power_history.append(power_data)
-        
-        # Temperature tracking
+        # Temperature tracking (hottest of the three sensors)
         temps = [
             data.get(KEY_BATTERY_TEMP),
             data.get(KEY_INVERTER_TEMP),
             data.get(KEY_DEVICE_TEMP)
         ]
         valid_temps = [t for t in temps if t is not None]
-        if valid_temps:
-            temp_data = {
-                'timestamp': current_time,
-                'max_temp': max(valid_temps),
-                'avg_temp': sum(valid_temps) / len(valid_temps)
-            }
-            self.temperature_history.append(temp_data)
-
-        # Voltage tracking
         voltage = data.get(KEY_BATTERY_VOLTAGE)
-        if voltage is not None:
-            self.voltage_history.append({
-                'timestamp': current_time,
-                'voltage': voltage
-            })
-
-        # Efficiency tracking
         efficiency = data.get(KEY_SYSTEM_EFFICIENCY)
-        if efficiency is not None:
-            self.efficiency_history.append({
-                'timestamp': current_time,
-                'efficiency': efficiency
-            })
-
-        # Calculate alerts
-        analytics_data.update(self._calculate_alerts(data))
-        
-        # Calculate performance metrics
-        analytics_data.update(self._calculate_performance_metrics())
+
+        # Multi-resolution history (raw / 1 min / 15 min); also feeds the recent averages and trends
+        self.history.add(current_time.timestamp(), (
+            data.get(KEY_PV_POWER), data.get(KEY_LOAD_POWER), data.get(KEY_BATTERY_POWER),
+            data.get(KEY_GRID_POWER), data.get(KEY_BATTERY_SOC), voltage,
+            max(valid_temps) if valid_temps else None, efficiency,
+        ))
+        self.quantiles.add(current_time.timestamp(), (
+            data.get(KEY_PV_POWER), data.get(KEY_LOAD_POWER), data.get(KEY_GRID_POWER),
+            max(valid_temps) if valid_temps else None,
+        ))
+
+        # Alert rules (only rules whose inputs changed are re-evaluated)
+        analytics_data.update(self.alerts.evaluate(data))
+
+        # Streaming anomaly detection
+        analytics_data.update(self._calculate_anomalies(data))
         
-        # Calculate trends
-        analytics_data.update(self._calculate_trends())
+        if self.trends:
+            # Calculate performance metrics
+            analytics_data.update(self._calculate_performance_metrics())
+
+            # Calculate trends
+            analytics_data.update(self._calculate_trends())
+
+        # Integrate daily energy from power samples
+        analytics_data.update(self.energy.update(data, current_time))
         
         self.last_update = current_time
         return analytics_data
 
-    def _calculate_alerts(self, data: Dict[str, Any]) -> Dict[str, bool]:
-        """Calculate alert states"""
-        alerts = {}
-        
-        # Temperature alerts
-        high_temp_alert = False
-        for temp_key in [KEY_BATTERY_TEMP, KEY_INVERTER_TEMP, KEY_DEVICE_TEMP]:
-            temp = data.get(temp_key)
-            if temp is not None and temp > ALERT_HIGH_TEMP:
-                high_temp_alert = True
-                break
-        alerts['high_temperature_alert'] = high_temp_alert
-        
-        # Battery alerts
-        soc = data.get(KEY_BATTERY_SOC)
-        alerts['low_battery_alert'] = soc is not None and soc < ALERT_LOW_BATTERY
-        
-        # Voltage alerts
-        voltage = data.get(KEY_BATTERY_VOLTAGE)
-        voltage_alert = False
-        if voltage is not None:
-            if voltage > ALERT_HIGH_VOLTAGE or voltage < ALERT_LOW_VOLTAGE:
-                voltage_alert = True
-        alerts['voltage_alert'] = voltage_alert
-        
-        # System fault alert
-        fault_code = data.get(KEY_FAULT_CODE)
-        alerts['system_fault_alert'] = fault_code is not None and fault_code != "No Fault"
-        
-        return alerts
+    def _calculate_anomalies(self, data: Dict[str, Any]) -> Dict[str, bool]:
+        """Update the EWMA models with this frame and return anomaly states"""
+        anomalies = {}
+        for key, model in self.anomaly_models.items():
+            value = data.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                anomalies[f'{key}_anomaly'] = model.update(float(value))
+        return anomalies
+
+    def _recent_values(self, key: str, count: int) -> List[float]:
+        """Last raw-history values of one rollup metric (missing samples skipped)"""
+        i = self.history.metrics.index(key)
+        return [values[i] for values in self.history.recent(count) if values[i] is not None]
 
     def _calculate_performance_metrics(self) -> Dict[str, Any]:
         """Calculate performance metrics from historical data"""
         metrics = {}
         
-        if len(self.power_history) > 1:
-            # Average power over last 10 readings
-            recent_power = list(self.power_history)[-10:]
-            avg_pv = sum(p['pv_power'] for p in recent_power) / len(recent_power)
-            avg_load = sum(p['load_power'] for p in recent_power) / len(recent_power)
+        recent = self.history.recent(10)
+        if len(recent) > 1:
+            # Average power over last 10 readings (missing values count as 0)
+            avg_pv = sum(self._recent_values(KEY_PV_POWER, 10)) / len(recent)
+            avg_load = sum(self._recent_values(KEY_LOAD_POWER, 10)) / len(recent)
             
             metrics['avg_pv_power_10min'] = round(avg_pv, 1)
             metrics['avg_load_power_10min'] = round(avg_load, 1)
@@ -143,8 +552,8 @@ class LumentreeAnalytics:
             if avg_pv > 0:
                 metrics['energy_self_sufficiency'] = round(min(100, (avg_pv / avg_load) * 100), 1) if avg_load > 0 else 100
         
-        if len(self.efficiency_history) > 1:
-            recent_eff = [e['efficiency'] for e in list(self.efficiency_history)[-10:]]
+        recent_eff = self._recent_values(KEY_SYSTEM_EFFICIENCY, 10)
+        if len(recent_eff) > 1:
             metrics['avg_efficiency_10min'] = round(statistics.mean(recent_eff), 1)
         
         return metrics
@@ -154,53 +563,68 @@ class LumentreeAnalytics:
         trends = {}
         
         # Temperature trend
-        if len(self.temperature_history) >= 5:
-            recent_temps = [t['max_temp'] for t in list(self.temperature_history)[-5:]]
-            if len(recent_temps) >= 2:
-                temp_trend = recent_temps[-1] - recent_temps[0]
-                trends['temperature_trend'] = 'rising' if temp_trend > 2 else 'falling' if temp_trend < -2 else 'stable'
+        recent_temps = self._recent_values("max_temperature", 5)
+        if len(recent_temps) >= 5:
+            temp_trend = recent_temps[-1] - recent_temps[0]
+            trends['temperature_trend'] = 'rising' if temp_trend > 2 else 'falling' if temp_trend < -2 else 'stable'
         
         # Power trend
-        if len(self.power_history) >= 5:
-            recent_pv = [p['pv_power'] for p in list(self.power_history)[-5:]]
-            if len(recent_pv) >= 2:
-                power_trend = recent_pv[-1] - recent_pv[0]
-                trends['power_trend'] = 'increasing' if power_trend > 50 else 'decreasing' if power_trend < -50 else 'stable'
+        recent_pv = self._recent_values(KEY_PV_POWER, 5)
+        if len(recent_pv) >= 5:
+            power_trend = recent_pv[-1] - recent_pv[0]
+            trends['power_trend'] = 'increasing' if power_trend > 50 else 'decreasing' if power_trend < -50 else 'stable'
         
         return trends
 
-    def get_statistics(self) -> Dict[str, Any]:
-        """Get comprehensive statistics"""
+    def export_history(self, period_seconds: float, resolution_seconds: float = 0) -> Dict[str, Any]:
+        """History for export, from the coarsest tier meeting the requested resolution that still covers the period"""
+        now = self.last_update.timestamp() if self.last_update else 0.0
+        return {'metrics': list(self.history.metrics), **self.history.points(now - period_seconds, resolution_seconds, now)}
+
+    def quantile_sketches(self, period_seconds: float = STATISTICS_PERIOD_SECONDS) -> Dict[str, KllSketch]:
+        """Merged percentile sketches for the period (mergeable across devices for fleet stats)"""
+        now = self.last_update.timestamp() if self.last_update else 0.0
+        return self.quantiles.merged(now - period_seconds)
+
+    def update_cells(self, cells_mv) -> Dict[str, Any]:
+        """Update battery cell statistics from a decoded cell frame (mV)"""
+        return self.cells.update(cells_mv)
+
+    def get_statistics(self, period_seconds: float = STATISTICS_PERIOD_SECONDS) -> Dict[str, Any]:
+        """Get comprehensive statistics (over the last 24 h by default, from the rollup tiers)"""
         stats = {}
-        
-        if self.power_history:
-            all_pv = [p['pv_power'] for p in self.power_history]
-            all_load = [p['load_power'] for p in self.power_history]
-            
-            stats['max_pv_power'] = max(all_pv)
-            stats['avg_pv_power'] = round(statistics.mean(all_pv), 1)
-            stats['max_load_power'] = max(all_load)
-            stats['avg_load_power'] = round(statistics.mean(all_load), 1)
-        
-        if self.temperature_history:
-            all_temps = [t['max_temp'] for t in self.temperature_history]
-            stats['max_temperature'] = max(all_temps)
-            stats['avg_temperature'] = round(statistics.mean(all_temps), 1)
-        
-        if self.efficiency_history:
-            all_eff = [e['efficiency'] for e in self.efficiency_history]
-            stats['max_efficiency'] = max(all_eff)
-            stats['avg_efficiency'] = round(statistics.mean(all_eff), 1)
-        
-        stats['data_points'] = len(self.power_history)
+        now = self.last_update.timestamp() if self.last_update else 0.0
+        aggregates = self.history.aggregate(now - period_seconds, now)
+
+        for key, name in ((KEY_PV_POWER, 'pv_power'), (KEY_LOAD_POWER, 'load_power'),
+                          ('max_temperature', 'temperature'), (KEY_SYSTEM_EFFICIENCY, 'efficiency')):
+            if key in aggregates:
+                stats[f'max_{name}'] = aggregates[key]['max']
+                stats[f'avg_{name}'] = round(aggregates[key]['mean'], 1)
+
+        stats['quantiles'] = summarise_sketches(self.quantile_sketches(period_seconds))
+        stats['alert_rules'] = {'rules': len(self.alerts.rules), 'evaluations': self.alerts.evaluations}
+        stats['anomaly_models'] = {key: model.as_dict() for key, model in self.anomaly_models.items() if model.count}
+
+        cell_imbalance = self.cells.get_imbalance()
+        if cell_imbalance:
+            stats['battery_cell_imbalance'] = cell_imbalance
+
+        stats['period_seconds'] = period_seconds
+        stats['data_points'] = aggregates.get(KEY_PV_POWER, {}).get('count', 0)
+        stats['history_points'] = self.history.point_counts()
+        stats['quantile_sketch_values'] = self.quantiles.retained
         stats['last_update'] = self.last_update.isoformat() if self.last_update else None
         
         return stats
 
     def reset_history(self):
         """Reset all historical data"""
-        self.power_history.clear()
-        self.efficiency_history.clear()
-        self.temperature_history.clear()
-        self.voltage_history.clear()
+        self.history.reset()
+        self.quantiles.reset()
+        self.cells.reset()
+        self.anomaly_models = {
+            key: EwmaAnomalyModel(alpha, min_std) for key, (alpha, min_std) in ANOMALY_METRICS.items()
+        }
+        self.alerts = self._compile_alerts()
         _LOGGER.info("Analytics history reset")
@@ -4,27 +4,23 @@
 
 import asyncio
 import json
-from typing import Any, Dict, Optional, Tuple
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 import logging
 import time
 
 import aiohttp
 from aiohttp.client import ClientTimeout
 
-try:
-    from .const import (
-        BASE_URL, DEFAULT_HEADERS, _LOGGER,
-        URL_GET_SERVER_TIME, URL_SHARE_DEVICES, URL_DEVICE_MANAGE,
-        URL_GET_OTHER_DAY_DATA, URL_GET_PV_DAY_DATA, URL_GET_BAT_DAY_DATA
-    )
-except ImportError:
-    _LOGGER = logging.getLogger(__name__); BASE_URL = "http://lesvr.suntcn.com"
-    URL_GET_SERVER_TIME = "/lesvr/getServerTime"; URL_SHARE_DEVICES = "/lesvr/shareDevices"
-    URL_DEVICE_MANAGE = "/lesvr/deviceManage";
-    URL_GET_OTHER_DAY_DATA = "/lesvr/getOtherDayData"; URL_GET_PV_DAY_DATA = "/lesvr/getPVDayData"; URL_GET_BAT_DAY_DATA = "/lesvr/getBatDayData"
-    DEFAULT_HEADERS = {"versionCode": "1.6.3", "platform": "2", "wifiStatus": "1", "User-Agent": "Mozilla/5.0", "Accept": "application/json, text/plain, */*", "Accept-Language": "en-US,en;q=0.9"}
-
-DEFAULT_TIMEOUT = ClientTimeout(total=30)
+from .const import (
+    BASE_URL, DEFAULT_HEADERS, _LOGGER,
+    URL_GET_SERVER_TIME, URL_SHARE_DEVICES, URL_DEVICE_MANAGE,
+    URL_GET_OTHER_DAY_DATA, URL_GET_PV_DAY_DATA, URL_GET_BAT_DAY_DATA
+)
+
+from .curves import Curve, parse_curve
+from .latency import EndpointLatency, HedgeBudget
+
 AUTH_RETRY_DELAY = 0.5
 AUTH_MAX_RETRIES = 3
 
@@ -33,9 +29,16 @@ class AuthException(ApiException): pass
 
 class LumentreeHttpApiClient:
     """Handles HTTP Login, Device Info, and Daily Stats API calls."""
-    def __init__(self, session: aiohttp.ClientSession) -> None: self._session = session; self._token: Optional[str] = None
+    def __init__(self, session: aiohttp.ClientSession) -> None:
+        self._session = session; self._token: Optional[str] = None
+        self._latency: Dict[str, EndpointLatency] = {}; self._hedge_budget = HedgeBudget()
     def set_token(self, token: Optional[str]): self._token = token; _LOGGER.debug(f"API token {'set' if token else 'cleared'}.")
 
+    @property
+    def latency_stats(self) -> Dict[str, Any]:
+        """Per-endpoint latency, adaptive timeouts and hedging counters."""
+        return {"endpoints": {ep: st.as_dict() for ep, st in self._latency.items()}, "hedge_budget": self._hedge_budget.as_dict()}
+
     async def _request(
         self, method: str, endpoint: str, params: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None,
         extra_headers: Optional[Dict[str, str]] = None, requires_auth: bool = True
@@ -47,20 +50,59 @@ class LumentreeHttpApiClient:
             else: _LOGGER.error(f"Token needed for {endpoint}"); raise AuthException("Token required")
         if data and method.upper() == "POST": headers["Content-Type"] = headers.get("Content-Type", "application/x-www-form-urlencoded")
         _LOGGER.debug(f"HTTP Req: {method} {url}, H: {headers}, P: {params}, D: {data}")
+        stats = self._latency.setdefault(endpoint, EndpointLatency())
+        stats.requests += 1
+        self._hedge_budget.record_request()
+        timeout = ClientTimeout(total=stats.timeout())
+        request = partial(self._request_once, method, url, endpoint, headers, params, data, timeout, stats)
+        hedge_delay = stats.hedge_delay() if method.upper() == "GET" else None # Only idempotent requests are hedged
+        if hedge_delay is None:
+            return await request()
+        return await self._request_hedged(request, hedge_delay, stats)
+
+    async def _request_hedged(self, request: Callable[[], Awaitable[Dict[str, Any]]], hedge_delay: float, stats: EndpointLatency) -> Dict[str, Any]:
+        """Send a duplicate once the first attempt is slower than p95; first success wins, the loser is cancelled."""
+        primary = asyncio.ensure_future(request()); hedge: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+            if done or not self._hedge_budget.try_acquire():
+                return await primary
+            stats.hedged += 1; _LOGGER.debug(f"Hedging slow request after {hedge_delay:.2f}s")
+            hedge = asyncio.ensure_future(request())
+            pending = {primary, hedge}; error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge: stats.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done(): task.cancel()
+
+    async def _request_once(
+        self, method: str, url: str, endpoint: str, headers: Dict[str, str], params: Optional[Dict[str, Any]],
+        data: Optional[Dict[str, Any]], timeout: ClientTimeout, stats: EndpointLatency
+    ) -> Dict[str, Any]:
+        started = time.monotonic()
         try:
-            async with self._session.request(method, url, headers=headers, params=params, data=data, timeout=DEFAULT_TIMEOUT) as response:
+            async with self._session.request(method, url, headers=headers, params=params, data=data, timeout=timeout) as response:
                 _LOGGER.debug(f"HTTP Resp Status: {response.status} from {url}"); resp_text = await response.text(); resp_text_short = resp_text[:300]
                 try: resp_json = await response.json(content_type=None); _LOGGER.debug(f"HTTP Resp JSON: {resp_json}")
                 except (json.JSONDecodeError, aiohttp.ContentTypeError) as json_err: _LOGGER.error(f"Invalid JSON {url}: {resp_text_short}"); raise ApiException(f"Invalid JSON: {resp_text_short}") from json_err
                 if not response.ok and not resp_json: response.raise_for_status()
                 return_value = resp_json.get("returnValue")
-                if endpoint == URL_GET_SERVER_TIME and "data" in resp_json and "serverTime" in resp_json["data"]: return resp_json
+                if endpoint == URL_GET_SERVER_TIME and "data" in resp_json and "serverTime" in resp_json["data"]:
+                    stats.record(time.monotonic() - started); return resp_json
                 if return_value != 1:
                     msg = resp_json.get("msg", "Unknown"); _LOGGER.error(f"API Error {url}: RC={return_value}, Msg='{msg}'")
                     if return_value == 203 or response.status in [401, 403]: raise AuthException(f"Auth failed (RC={return_value}, HTTP={response.status}): {msg}")
                     raise ApiException(f"API error {msg} (RC={return_value})")
+                stats.record(time.monotonic() - started) # Only successful replies feed the adaptive timeout
                 return resp_json
-        except asyncio.TimeoutError as exc: _LOGGER.error(f"Timeout {url}"); raise ApiException("Timeout") from exc
+        except asyncio.TimeoutError as exc: stats.record_timeout(timeout.total); _LOGGER.error(f"Timeout {url} ({timeout.total:.1f}s)"); raise ApiException("Timeout") from exc
         except aiohttp.ClientResponseError as exc:
             if exc.status in [401, 403]: raise AuthException(f"Auth error ({exc.status}): {exc.message}") from exc
             _LOGGER.error(f"HTTP error {url}: {exc.status}"); raise ApiException(f"HTTP error: {exc.status}") from exc
@@ -129,11 +171,24 @@ class LumentreeHttpApiClient:
         except Exception as exc: _LOGGER.exception(f"Unexpected get info {device_id}"); return {"_error": f"Unexpected: {exc}"}
 
     async def get_daily_stats(self, device_identifier: str, query_date: str) -> Dict[str, Optional[float]]:
+        totals, _curves = await self.get_daily_data(device_identifier, query_date)
+        return totals
+
+    async def get_daily_data(self, device_identifier: str, query_date: str, partial: bool = False) -> Tuple[Dict[str, Optional[float]], Dict[str, Curve]]:
+        """Day totals plus the intraday curve of each flow (pv, charge, discharge, grid_in, load).
+
+        partial: the day is still running (today), so curves may stop before midnight.
+        """
         _LOGGER.debug(f"Fetching daily stats {device_identifier} @ {query_date}")
         results: Dict[str, Optional[float]] = {
             "pv_today": None, "charge_today": None, "discharge_today": None,
             "grid_in_today": None, "load_today": None
         }
+        curves: Dict[str, Curve] = {}
+
+        def _add_curve(result_key: str, item: Any) -> None:
+            curve = parse_curve(item, partial)
+            if curve is not None: curves[result_key.removesuffix("_today")] = curve
         base_params = {"deviceId": device_identifier, "queryDate": query_date}
 
         # Define API calls configuration
@@ -159,6 +214,7 @@ class LumentreeHttpApiClient:
                         item_data = data.get(dk, {})
                         val = item_data.get("tableValue")
                         rk = result_key[i]
+                        _add_curve(rk, item_data)
                         if val is not None:
                              # Check if rk is a valid key before assigning
                             if rk in results:
@@ -173,9 +229,11 @@ class LumentreeHttpApiClient:
                              if rk_charge in results: results[rk_charge] = float(bats_data[0]["tableValue"]) / 10.0
                         if len(bats_data) > 1 and "tableValue" in bats_data[1]:
                              if rk_discharge in results: results[rk_discharge] = float(bats_data[1]["tableValue"]) / 10.0
+                        for rk, item in zip((rk_charge, rk_discharge), bats_data): _add_curve(rk, item)
                 else: # Handle single key (PV data)
                     item_data = data.get(data_key, {})
                     val = item_data.get("tableValue")
+                    _add_curve(result_key, item_data)
                     # Ensure result_key is a string and exists in results
                     if isinstance(result_key, str) and result_key in results:
                          if val is not None: results[result_key] = float(val) / 10.0
@@ -193,5 +251,5 @@ class LumentreeHttpApiClient:
             except Exception:
                 _LOGGER.exception(f"Unexpected {result_key} stats error")
 
-        _LOGGER.debug(f"Processed daily stats: {results}")
-        return {k: v for k, v in results.items() if v is not None}
+        _LOGGER.debug(f"Processed daily stats: {results} (curves: {sorted(curves)})")
+        return {k: v for k, v in results.items() if v is not None}, curves
@@ -16,21 +16,18 @@ from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import DeviceInfo, generate_entity_id
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.helpers.template import slugify
 
-try:
-    from .const import (
-        DOMAIN, _LOGGER, CONF_DEVICE_SN, CONF_DEVICE_NAME, SIGNAL_UPDATE_FORMAT,
-        KEY_ONLINE_STATUS, KEY_IS_UPS_MODE, KEY_BATTERY_TEMP, KEY_INVERTER_TEMP,
-        KEY_BATTERY_SOC, KEY_BATTERY_VOLTAGE, KEY_FAULT_CODE, ALERT_HIGH_TEMP,
-        ALERT_LOW_BATTERY, ALERT_HIGH_VOLTAGE, ALERT_LOW_VOLTAGE
-    )
-except ImportError:
-    DOMAIN = "lumentree"; _LOGGER = logging.getLogger(__name__)
-    CONF_DEVICE_SN = "device_sn"; CONF_DEVICE_NAME = "device_name"
-    SIGNAL_UPDATE_FORMAT = "lumentree_mqtt_update_{device_sn}"
-    KEY_IS_UPS_MODE = "is_ups_mode"; KEY_ONLINE_STATUS="online_status"
-    def slugify(text): return re.sub(r"[^a-z0-9_]+", "_", text.lower())
+from .const import (
+    DOMAIN, _LOGGER, CONF_DEVICE_SN, CONF_DEVICE_NAME, SIGNAL_UPDATE_FORMAT,
+    KEY_ONLINE_STATUS, KEY_IS_UPS_MODE, KEY_BATTERY_TEMP, KEY_INVERTER_TEMP,
+    KEY_BATTERY_SOC, KEY_BATTERY_VOLTAGE, KEY_FAULT_CODE, ALERT_HIGH_TEMP,
+    ALERT_LOW_BATTERY, ALERT_HIGH_VOLTAGE, ALERT_LOW_VOLTAGE
+)
+
+from .state_writer import async_get_state_writer, CHANGE_ONLY_DEADBAND
+from .alert_rules import CONF_ALERT_RULES
 
 
 BINARY_SENSOR_DESCRIPTIONS: tuple[BinarySensorEntityDescription, ...] = (
@@ -38,9 +35,16 @@ BINARY_SENSOR_DESCRIPTIONS: tuple[BinarySensorEntityDescription, ...] = (
     BinarySensorEntityDescription(key=KEY_IS_UPS_MODE, name="UPS Mode", icon="mdi:power-plug-outline", device_class=None, entity_registry_enabled_default=True),
     # Alert binary sensors
     BinarySensorEntityDescription(key="high_temperature_alert", name="High Temperature Alert", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:thermometer-alert"),
-    BinarySensorEntityDescription(key="low_battery_alert", name="Low Battery Alert", device_class=BinarySensorDeviceClass.BATTERY_LOW, icon="mdi:battery-alert"),
+    BinarySensorEntityDescription(key="low_battery_alert", name="Low Battery Alert", device_class=BinarySensorDeviceClass.BATTERY, icon="mdi:battery-alert"),
     BinarySensorEntityDescription(key="voltage_alert", name="Voltage Alert", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:flash-alert"),
     BinarySensorEntityDescription(key="system_fault_alert", name="System Fault Alert", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:alert-circle"),
+    # Anomaly binary sensors (value outside the learned EWMA band)
+    BinarySensorEntityDescription(key="battery_voltage_anomaly", name="Battery Voltage Anomaly", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:chart-bell-curve", entity_registry_enabled_default=False),
+    BinarySensorEntityDescription(key="grid_voltage_anomaly", name="Grid Voltage Anomaly", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:chart-bell-curve", entity_registry_enabled_default=False),
+    BinarySensorEntityDescription(key="load_power_anomaly", name="Load Power Anomaly", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:chart-bell-curve", entity_registry_enabled_default=False),
+    BinarySensorEntityDescription(key="device_temperature_anomaly", name="Device Temperature Anomaly", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:chart-bell-curve", entity_registry_enabled_default=False),
+    BinarySensorEntityDescription(key="battery_temperature_anomaly", name="Battery Temperature Anomaly", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:chart-bell-curve", entity_registry_enabled_default=False),
+    BinarySensorEntityDescription(key="inverter_temperature_anomaly", name="Inverter Temperature Anomaly", device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:chart-bell-curve", entity_registry_enabled_default=False),
 )
 
 async def async_setup_entry(
@@ -62,10 +66,18 @@ async def async_setup_entry(
     )
     _LOGGER.debug(f"Creating DeviceInfo for BinarySensors {device_sn}: {device_info}")
 
-    entities = [ LumentreeBinarySensor(hass, entry, device_info, description) for description in BINARY_SENSOR_DESCRIPTIONS ]
+    descriptions = list(BINARY_SENSOR_DESCRIPTIONS)
+    known_keys = {description.key for description in descriptions}
+    # Custom alert rules (validated by the options flow) each get a problem sensor
+    for rule in entry.options.get(CONF_ALERT_RULES, []):
+        if rule.get("id") and rule["id"] not in known_keys:
+            descriptions.append(BinarySensorEntityDescription(key=rule["id"], name=rule.get("name") or rule["id"].replace("_", " ").title(), device_class=BinarySensorDeviceClass.PROBLEM, icon="mdi:bell-alert"))
+            known_keys.add(rule["id"])
+
+    entities = [ LumentreeBinarySensor(hass, entry, device_info, description) for description in descriptions ]
     if entities: async_add_entities(entities); _LOGGER.info(f"Added {len(entities)} binary sensors for {device_sn}")
 
-class LumentreeBinarySensor(BinarySensorEntity):
+class LumentreeBinarySensor(BinarySensorEntity, RestoreEntity):
     _attr_should_poll = False; _attr_has_entity_name = True
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry, device_info: DeviceInfo, description: BinarySensorEntityDescription) -> None:
         self.hass = hass; self.entity_description = description; self._device_sn = entry.data[CONF_DEVICE_SN]
@@ -81,10 +93,10 @@ class LumentreeBinarySensor(BinarySensorEntity):
             new_state = data[self.entity_description.key]
             # Xử lý cả True và False
             if isinstance(new_state, bool):
-                if self._attr_is_on != new_state:
+                if self._attr_is_on != new_state and async_get_state_writer(self.hass).async_schedule_write(
+                    self, new_state, CHANGE_ONLY_DEADBAND, self._set_is_on
+                ):
                     _LOGGER.info(f"Binary sensor {self.entity_id} state changing to: {new_state}")
-                    self._attr_is_on = new_state
-                    self.async_write_ha_state()
             else:
                 _LOGGER.warning(f"Received non-boolean value for {self.unique_id}: {new_state}")
                 # Nếu nhận giá trị không hợp lệ, có thể set về Unknown
@@ -92,7 +104,15 @@ class LumentreeBinarySensor(BinarySensorEntity):
                 #     self._attr_is_on = None
                 #     self.async_write_ha_state()
 
-    async def async_added_to_hass(self) -> None: # Giữ nguyên
+    @callback
+    def _set_is_on(self, value: bool) -> None:
+        self._attr_is_on = value
+
+    async def async_added_to_hass(self) -> None:
+        # Restore last state so entities are meaningful before MQTT connects (online status starts Unknown)
+        if self.entity_description.key != KEY_ONLINE_STATUS and (last_state := await self.async_get_last_state()) is not None:
+            if last_state.state in ("on", "off"):
+                self._attr_is_on = last_state.state == "on"
         signal = SIGNAL_UPDATE_FORMAT.format(device_sn=self._device_sn)
         self._remove_dispatcher = async_dispatcher_connect(self.hass, signal, self._handle_update)
         _LOGGER.debug(f"Binary sensor {self.unique_id} registered.")
@@ -101,4 +121,5 @@ class LumentreeBinarySensor(BinarySensorEntity):
         if self._remove_dispatcher:
             self._remove_dispatcher()
             self._remove_dispatcher = None
+        async_get_state_writer(self.hass).async_forget(self.entity_id)
         _LOGGER.debug(f"Binary sensor {self.unique_id} unregistered.")
@@ -0,0 +1,249 @@
+# /config/custom_components/lumentree/broker_endpoints.py
+# Broker endpoint list, cached async DNS and staggered (happy-eyeballs style) connection racing
+
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, _LOGGER
+
+CONF_BROKER_ENDPOINTS = "broker_endpoints" # "host:port, user:pass@bridge:1883", tried in order
+DATA_DNS_CACHE = "dns_cache"
+
+DNS_TTL_SECONDS = 300.0
+DNS_STALE_SECONDS = 86400.0 # A failed lookup falls back to addresses this old
+RACE_STAGGER_MIN_SECONDS = 0.25 # RFC 8305 connection attempt delay
+RACE_STAGGER_MAX_SECONDS = 2.0
+RACE_STAGGER_CONNECT_FACTOR = 1.5 # Next attempt starts once 1.5x the last good connect time has passed
+RACE_MAX_CANDIDATES = 8
+CONNECT_HISTORY = 20
+
+
+class BrokerEndpoint(NamedTuple):
+    host: str
+    port: int
+    username: Optional[str] = None
+    password: Optional[str] = None
+
+    def __str__(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+def parse_endpoints(value: Any, default_port: int) -> List[BrokerEndpoint]:
+    """Endpoints from a comma separated string (or list); raises ValueError on bad entries."""
+    items = value.split(",") if isinstance(value, str) else list(value or [])
+    endpoints: List[BrokerEndpoint] = []
+    for item in (str(i).strip() for i in items):
+        if not item:
+            continue
+        parts = urlsplit(item if "//" in item else f"//{item}")
+        try:
+            port = parts.port or default_port
+        except ValueError as e:
+            raise ValueError(f"Invalid broker port in '{item}'") from e
+        if not parts.hostname:
+            raise ValueError(f"Invalid broker endpoint '{item}'")
+        endpoints.append(BrokerEndpoint(parts.hostname, port, parts.username, parts.password))
+    return endpoints
+
+
+class DnsCache:
+    """Async getaddrinfo with a TTL cache, stale fallback and shared in-flight lookups."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[Tuple[int, str]]]] = {}
+        self._inflight: Dict[Tuple[str, int], asyncio.Task] = {}
+        self.metrics: Dict[str, int] = {"lookups": 0, "hits": 0, "stale": 0, "failures": 0}
+
+    async def async_resolve(self, host: str, port: int) -> List[Tuple[int, str]]:
+        """(family, address) pairs for host, IPv6 and IPv4 interleaved (RFC 8305)."""
+        try:
+            ip = ipaddress.ip_address(host)
+        except ValueError:
+            pass
+        else:
+            return [(socket.AF_INET6 if ip.version == 6 else socket.AF_INET, host)]
+
+        key = (host, port)
+        cached = self._entries.get(key)
+        if cached and time.monotonic() - cached[0] < DNS_TTL_SECONDS:
+            self.metrics["hits"] += 1
+            return cached[1]
+        task = self._inflight.get(key)
+        if task is None:
+            # One shared lookup task: waiters that give up (shield) never cancel it or leave others hanging
+            task = self.hass.loop.create_task(self._async_lookup(key, cached))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._lookup_done(key, done))
+        return await asyncio.shield(task)
+
+    async def _async_lookup(self, key: Tuple[str, int], cached: Optional[Tuple[float, List[Tuple[int, str]]]]) -> List[Tuple[int, str]]:
+        host, port = key
+        now = time.monotonic()
+        self.metrics["lookups"] += 1
+        try:
+            infos = await self.hass.loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            self.metrics["failures"] += 1
+            if cached and now - cached[0] < DNS_STALE_SECONDS:
+                self.metrics["stale"] += 1
+                _LOGGER.warning(f"DNS lookup of {host} failed ({e}), using cached addresses")
+                return cached[1]
+            raise
+        addresses = _interleave([(family, sockaddr[0]) for family, _, _, _, sockaddr in infos])
+        self._entries[key] = (now, addresses)
+        return addresses
+
+    def _lookup_done(self, key: Tuple[str, int], task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception() # Retrieved here too, in case every waiter gave up
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**self.metrics, "cached_hosts": len(self._entries)}
+
+
+def _interleave(addresses: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """Unique addresses, alternating families starting with the first returned."""
+    unique = list(dict.fromkeys(addresses))
+    if not unique:
+        return unique
+    first = [a for a in unique if a[0] == unique[0][0]]
+    other = [a for a in unique if a[0] != unique[0][0]]
+    result: List[Tuple[int, str]] = []
+    for i in range(max(len(first), len(other))):
+        result.extend(a[i] for a in (first, other) if i < len(a))
+    return result
+
+
+def async_get_dns_cache(hass: HomeAssistant) -> DnsCache:
+    """DNS cache shared by all clients."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_DNS_CACHE not in domain_data:
+        domain_data[DATA_DNS_CACHE] = DnsCache(hass)
+    return domain_data[DATA_DNS_CACHE]
+
+
+class ConnectStats:
+    """Connect times and endpoint choices of one client; remembers the last winner."""
+
+    def __init__(self):
+        self.preferred: Optional[str] = None
+        self.last_connect_seconds: Optional[float] = None
+        self.wins: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+        self.races = 0
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=CONNECT_HISTORY)
+
+    def stagger(self) -> float:
+        if self.last_connect_seconds is None:
+            return RACE_STAGGER_MIN_SECONDS
+        return min(max(self.last_connect_seconds * RACE_STAGGER_CONNECT_FACTOR, RACE_STAGGER_MIN_SECONDS), RACE_STAGGER_MAX_SECONDS)
+
+    def record(self, endpoint: Optional[BrokerEndpoint], address: Optional[str], seconds: float,
+               attempts: int, error: Optional[str] = None) -> None:
+        self.races += 1
+        if endpoint is not None:
+            self.preferred = str(endpoint)
+            self.last_connect_seconds = seconds
+            self.wins[str(endpoint)] = self.wins.get(str(endpoint), 0) + 1
+        self.history.append({
+            "at": time.time(), "endpoint": str(endpoint) if endpoint else None, "address": address,
+            "connect_ms": round(seconds * 1000, 1), "attempts": attempts, "error": error,
+        })
+
+    def record_failure(self, endpoint: BrokerEndpoint) -> None:
+        self.failures[str(endpoint)] = self.failures.get(str(endpoint), 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "preferred": self.preferred, "races": self.races, "wins": dict(self.wins),
+            "failures": dict(self.failures), "stagger_s": round(self.stagger(), 3), "history": list(self.history),
+        }
+
+
+async def async_race_connect(
+    hass: HomeAssistant, endpoints: List[BrokerEndpoint], stats: ConnectStats,
+    attempt: Callable[[BrokerEndpoint, str, int], Awaitable[Any]], discard: Callable[[Any], None],
+    timeout: float,
+) -> Tuple[Any, BrokerEndpoint, str]:
+    """Start attempt(endpoint, address, index) per candidate address, staggered; first success wins.
+
+    Endpoints are resolved concurrently and their addresses raced as soon as each answer
+    arrives (DNS counts against the timeout). The last winning endpoint is tried first.
+    The next attempt starts after the stagger delay or as soon as a running attempt
+    fails. Losing attempts are cancelled; ones that already succeeded are passed to discard().
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    ordered = sorted(endpoints, key=lambda ep: str(ep) != stats.preferred)
+    dns = async_get_dns_cache(hass)
+    resolving: Dict[asyncio.Task, int] = {
+        hass.loop.create_task(dns.async_resolve(ep.host, ep.port)): rank for rank, ep in enumerate(ordered)
+    }
+    pending: List[Tuple[int, BrokerEndpoint, str]] = [] # (endpoint rank, endpoint, address), best first
+    running: Dict[asyncio.Task, Tuple[BrokerEndpoint, str]] = {}
+    attempts = 0
+    next_start = started
+    last_error: Optional[BaseException] = None
+    try:
+        while running or (attempts < RACE_MAX_CANDIDATES and (resolving or pending)):
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if pending and attempts < RACE_MAX_CANDIDATES and (not running or now >= next_start):
+                _rank, endpoint, address = pending.pop(0)
+                task = hass.async_create_task(attempt(endpoint, address, attempts))
+                running[task] = (endpoint, address)
+                attempts += 1
+                next_start = now + stats.stagger()
+                continue
+            wait = deadline - now
+            if pending and attempts < RACE_MAX_CANDIDATES:
+                wait = min(wait, next_start - now)
+            done, _ = await asyncio.wait([*running, *resolving], timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task in resolving:
+                    rank = resolving.pop(task)
+                    endpoint = ordered[rank]
+                    if task.exception() is not None:
+                        _LOGGER.warning(f"Cannot resolve broker {endpoint}: {task.exception()}")
+                        stats.record_failure(endpoint)
+                        continue
+                    pending.extend((rank, endpoint, address) for _, address in task.result())
+                    pending.sort(key=lambda candidate: candidate[0]) # Stable: keeps the family interleaving
+                    continue
+                endpoint, address = running.pop(task)
+                if task.exception() is None:
+                    seconds = time.monotonic() - started
+                    stats.record(endpoint, address, seconds, attempts)
+                    _LOGGER.debug(f"Broker race won by {endpoint} ({address}) in {seconds * 1000:.0f} ms")
+                    return task.result(), endpoint, address
+                last_error = task.exception()
+                next_start = time.monotonic() # Failed: the next candidate need not wait for the stagger
+                stats.record_failure(endpoint)
+                _LOGGER.debug(f"Broker attempt {endpoint} ({address}) failed: {last_error!r}")
+    finally:
+        for task in resolving:
+            task.cancel() # The lookup itself continues in the DNS cache
+        for task in running:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception() is None:
+                discard(task.result())
+
+    if not attempts and not resolving:
+        stats.record(None, None, time.monotonic() - started, 0, "no addresses")
+        raise ConnectionRefusedError("No broker address could be resolved")
+    error = "timeout" if last_error is None else repr(last_error)
+    stats.record(None, None, time.monotonic() - started, attempts, error)
+    raise ConnectionRefusedError(f"All broker endpoints failed ({error})")
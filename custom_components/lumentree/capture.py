@@ -0,0 +1,214 @@
+# /config/custom_components/lumentree/capture.py
+# In-memory raw MQTT frame capture (debug only, never written to entity state)
+# plus a binary frame recorder and a replayer for profiling the processing pipeline
+
+import asyncio
+import logging
+import statistics
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from homeassistant.util import dt as dt_util
+
+from .const import _LOGGER
+
+from .parser import KEY_BATTERY_CELLS, merge_frames
+
+RAW_FRAME_BUFFER_SIZE = 200
+
+# Frame log: 8-byte header, then records of
+# (float64 unix ts, uint16 topic len, uint16 payload len, uint16 start register, topic, payload)
+FRAME_LOG_MAGIC = b"LTFR"
+FRAME_LOG_VERSION = 2
+_FRAME_LOG_HEADER = struct.Struct("<4sHxx")
+_FRAME_RECORD = struct.Struct("<dHHH")
+_FRAME_RECORD_V1 = struct.Struct("<dHH") # No start register (frames replayed at 0)
+FRAME_LOG_FLUSH_BYTES = 64 * 1024
+REPLAY_YIELD_EVERY = 200
+
+
+class RawFrameBuffer:
+    """Bounded ring buffer of (unix timestamp, raw payload bytes) for one device."""
+
+    def __init__(self, maxlen: int = RAW_FRAME_BUFFER_SIZE):
+        self._frames: Deque[Tuple[float, bytes]] = deque(maxlen=maxlen)
+        self.total = 0
+
+    def append(self, payload: bytes, timestamp: float = None) -> None:
+        self._frames.append((timestamp if timestamp is not None else time.time(), bytes(payload)))
+        self.total += 1
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def frames(self) -> List[Tuple[float, bytes]]:
+        return list(self._frames)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON-friendly dump (hex encoded) for diagnostics."""
+        return {
+            "capacity": self._frames.maxlen,
+            "total_received": self.total,
+            "frames": [{"ts": round(ts, 3), "hex": payload.hex()} for ts, payload in self._frames],
+        }
+
+    def clear(self) -> None:
+        self._frames.clear()
+
+
+class FrameRecorder:
+    """Appends received frames to a compact binary log; buffered in memory, flushed in bulk."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = 0
+        self._buffer = bytearray(_FRAME_LOG_HEADER.pack(FRAME_LOG_MAGIC, FRAME_LOG_VERSION))
+        self._truncate = True # First flush creates/overwrites the file
+        self._lock = threading.Lock() # Guards the buffer: record() runs in the event loop, flush() in an executor
+        self._write_lock = threading.Lock() # Keeps concurrent flushes in order (file I/O outside _lock)
+
+    def record(self, topic: str, payload: bytes, timestamp: Optional[float] = None, start_address: int = 0) -> bool:
+        """Buffer one frame (with the start register it answered); returns True when the buffer should be flushed."""
+        topic_bytes = topic.encode()
+        header = _FRAME_RECORD.pack(
+            timestamp if timestamp is not None else time.time(), len(topic_bytes), len(payload), start_address
+        )
+        with self._lock:
+            self._buffer += header
+            self._buffer += topic_bytes
+            self._buffer += payload
+            self.frames += 1
+            return len(self._buffer) >= FRAME_LOG_FLUSH_BYTES
+
+    def flush(self) -> None:
+        """Write buffered records to disk (blocking, run in an executor)."""
+        with self._write_lock:
+            with self._lock:
+                if not self._buffer:
+                    return
+                data, self._buffer = bytes(self._buffer), bytearray()
+            with open(self.path, "wb" if self._truncate else "ab") as log_file:
+                log_file.write(data)
+            self._truncate = False
+
+
+def read_frame_log(path: str) -> Iterator[Tuple[float, str, bytes, int]]:
+    """Yield (timestamp, topic, payload, start register) records from a frame log (v1 or v2)."""
+    with open(path, "rb") as log_file:
+        data = log_file.read()
+    magic, version = _FRAME_LOG_HEADER.unpack_from(data, 0)
+    if magic != FRAME_LOG_MAGIC or version not in (1, FRAME_LOG_VERSION):
+        raise ValueError(f"Not a Lumentree frame log (v1-v{FRAME_LOG_VERSION}): {path}")
+    record = _FRAME_RECORD if version == FRAME_LOG_VERSION else _FRAME_RECORD_V1
+    offset = _FRAME_LOG_HEADER.size
+    view = memoryview(data)
+    while offset + record.size <= len(data):
+        ts, topic_len, payload_len, *start = record.unpack_from(data, offset)
+        offset += record.size
+        topic = bytes(view[offset:offset + topic_len]).decode()
+        offset += topic_len
+        payload = bytes(view[offset:offset + payload_len])
+        offset += payload_len
+        yield ts, topic, payload, start[0] if start else 0
+
+
+def _latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {}
+    ms = sorted(s * 1000.0 for s in samples)
+    summary = {"mean": round(statistics.fmean(ms), 4), "max": round(ms[-1], 4)}
+    if len(ms) >= 2:
+        q = statistics.quantiles(ms, n=100, method="inclusive")
+        summary.update(p50=round(q[49], 4), p95=round(q[94], 4), p99=round(q[98], 4))
+    return summary
+
+
+async def async_replay_frames(
+    path: str,
+    parse: Callable[[bytes, int], Dict[str, Any]],
+    analytics: Any = None,
+    dispatch: Optional[Callable[[Dict[str, Any]], None]] = None,
+    speed: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Feed a frame log through parse -> analytics -> dispatch, the way the client handles live frames.
+
+    Cell frames go through update_cells; main frames are merged per poll (a poll ends when
+    the start register does not increase) and run through update_data once, at the recorded
+    time of the poll's last frame.
+    speed: 1.0 = real time, N = N times faster, None/0 = as fast as possible.
+    Returns throughput and per-stage latency (ms).
+    """
+    latencies: Dict[str, List[float]] = {"parse": [], "analytics": [], "dispatch": [], "total": []}
+    frames = parsed = polls = 0
+    first_ts: Optional[float] = None
+    poll_frames: List[Any] = []
+    poll_start = -1 # Start register of the last frame in poll_frames
+    poll_ts = 0.0 # Recorded time of the last frame in poll_frames
+    records = await asyncio.get_running_loop().run_in_executor(None, lambda: list(read_frame_log(path)))
+    started = time.perf_counter()
+
+    def _process(data: Dict[str, Any], ts: float, t0: float, t1: float) -> None:
+        cells = data.pop(KEY_BATTERY_CELLS, None) if isinstance(data, dict) else None
+        if analytics is not None and cells is not None:
+            data.update(analytics.update_cells(cells))
+            data["battery_cell_info"] = f"{len(cells)} cells"
+        elif analytics is not None:
+            data.maps[0].update(analytics.update_data(data, dt_util.as_local(dt_util.utc_from_timestamp(ts))))
+        t2 = time.perf_counter()
+        latencies["analytics"].append(t2 - t1)
+        if dispatch is not None:
+            dispatch(data)
+        t3 = time.perf_counter()
+        latencies["dispatch"].append(t3 - t2)
+        latencies["total"].append(t3 - t0)
+
+    def _end_poll() -> None:
+        nonlocal polls
+        if poll_frames:
+            polls += 1
+            t0 = time.perf_counter()
+            _process(merge_frames(poll_frames), poll_ts, t0, t0)
+            poll_frames.clear()
+
+    for ts, _topic, payload, start in records:
+        if speed:
+            if first_ts is None:
+                first_ts = ts
+            delay = (ts - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif frames % REPLAY_YIELD_EVERY == 0:
+            await asyncio.sleep(0) # Do not starve the event loop at max speed
+        frames += 1
+
+        t0 = time.perf_counter()
+        data = parse(payload, start)
+        latencies["parse"].append(time.perf_counter() - t0)
+        if not data:
+            continue
+        parsed += 1
+        if KEY_BATTERY_CELLS in data:
+            _process(data, ts, t0, time.perf_counter())
+            continue
+        if poll_frames and start <= poll_start:
+            _end_poll()
+        poll_frames.append(data)
+        poll_start, poll_ts = start, ts
+    _end_poll()
+
+    elapsed = time.perf_counter() - started
+    result = {
+        "frames": frames,
+        "parsed_frames": parsed,
+        "polls": polls,
+        "elapsed_s": round(elapsed, 4),
+        "frames_per_s": round(frames / elapsed, 1) if elapsed > 0 else None,
+        "speed": speed or "max",
+        "latency_ms": {stage: _latency_summary(values) for stage, values in latencies.items()},
+    }
+    _LOGGER.info(f"Replay {path}: {frames} frames in {result['elapsed_s']}s ({result['frames_per_s']}/s)")
+    return result
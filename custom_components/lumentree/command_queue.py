@@ -0,0 +1,141 @@
+# /config/custom_components/lumentree/command_queue.py
+# Pipelined Modbus read commands with request/response correlation, timeouts, retries and latency metrics
+
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .const import _LOGGER
+
+from .parser import generate_modbus_read_command
+
+COMMAND_TIMEOUT_SECONDS = 10.0
+COMMAND_RETRIES = 1
+COMMAND_MAX_IN_FLIGHT = 4
+LATENCY_SAMPLES = 200
+
+
+class CommandTimeout(Exception):
+    """No response received for a read command (after retries)."""
+
+
+class CommandPublishError(Exception):
+    """The read command could not be published (not connected, broker refused)."""
+
+
+class PendingRead:
+    """One in-flight read command waiting for its response."""
+
+    __slots__ = ("start", "count", "future", "sent", "transaction_id")
+
+    def __init__(self, start: int, count: int, future: asyncio.Future, transaction_id: int):
+        self.start = start
+        self.count = count
+        self.future = future
+        self.sent = time.monotonic()
+        self.transaction_id = transaction_id
+
+
+class ModbusCommandQueue:
+    """Per-device read pipeline.
+
+    Every attempt gets a 16-bit transaction id, passed to the publish callback.
+    Transports that echo it (Modbus TCP) are matched on it; otherwise a response
+    carries no register address and is matched to the oldest in-flight request
+    with the same register count (requests with equal counts are answered in order).
+    Responses that match nothing are counted as unsolicited.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, int], Awaitable[bool]],
+        timeout: float = COMMAND_TIMEOUT_SECONDS,
+        retries: int = COMMAND_RETRIES,
+        max_in_flight: int = COMMAND_MAX_IN_FLIGHT,
+        slave_id: int = 1,
+    ):
+        self._publish = publish
+        self.timeout = timeout
+        self.retries = retries
+        self.slave_id = slave_id
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._pending: Deque[PendingRead] = deque()
+        self._transaction_id = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.metrics: Dict[str, int] = {
+            "requests": 0, "responses": 0, "timeouts": 0, "retries": 0,
+            "failed": 0, "unsolicited": 0, "publish_errors": 0,
+        }
+
+    async def async_read(self, start: int, count: int, func_code: int = 3) -> Any:
+        """Publish a read command and return the parsed response for it."""
+        command_hex = generate_modbus_read_command(self.slave_id, func_code, start, count)
+        if not command_hex:
+            raise ValueError(f"Cannot build Modbus read {start}+{count}")
+        async with self._slots:
+            self.metrics["requests"] += 1
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.metrics["retries"] += 1
+                self._transaction_id = (self._transaction_id + 1) & 0xFFFF
+                pending = PendingRead(start, count, asyncio.get_running_loop().create_future(), self._transaction_id)
+                self._pending.append(pending)
+                try:
+                    if not await self._publish(command_hex, pending.transaction_id):
+                        self.metrics["publish_errors"] += 1
+                        self.metrics["failed"] += 1
+                        raise CommandPublishError(f"Cannot publish read {start}+{count}")
+                    return await asyncio.wait_for(asyncio.shield(pending.future), self.timeout)
+                except asyncio.TimeoutError:
+                    self.metrics["timeouts"] += 1
+                    _LOGGER.debug(f"Read {start}+{count} timed out (attempt {attempt + 1}/{self.retries + 1})")
+                finally:
+                    if pending in self._pending:
+                        self._pending.remove(pending)
+            self.metrics["failed"] += 1
+            raise CommandTimeout(f"No response for read {start}+{count}")
+
+    def match_response(self, register_count: Optional[int], transaction_id: Optional[int] = None) -> Optional[PendingRead]:
+        """Claim the in-flight request answered by a response of this size (and transaction id, if echoed)."""
+        if register_count is None:
+            return None
+        for pending in self._pending:
+            if transaction_id is not None and pending.transaction_id != transaction_id:
+                continue
+            if pending.count == register_count and not pending.future.done():
+                self._pending.remove(pending)
+                return pending
+        self.metrics["unsolicited"] += 1
+        return None
+
+    def complete(self, pending: PendingRead, result: Any) -> None:
+        """Deliver the parsed response and record the round-trip latency."""
+        self._latencies.append(time.monotonic() - pending.sent)
+        self.metrics["responses"] += 1
+        if not pending.future.done():
+            pending.future.set_result(result)
+
+    def cancel_all(self) -> None:
+        while self._pending:
+            pending = self._pending.popleft()
+            if not pending.future.done():
+                pending.future.cancel()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {**self.metrics, "in_flight": self.in_flight}
+        samples: List[float] = sorted(self._latencies)
+        if samples:
+            stats["rtt_ms"] = {
+                "mean": round(statistics.fmean(samples) * 1000, 1),
+                "p50": round(samples[len(samples) // 2] * 1000, 1),
+                "p95": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 1),
+                "max": round(samples[-1] * 1000, 1),
+            }
+        return stats
@@ -2,22 +2,35 @@
 """Config flow for Lumentree integration."""
 from __future__ import annotations
 
+import json
 import logging
 from typing import Any
 
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 
-from .const import DOMAIN
+from .const import (
+    DOMAIN, CONF_TRANSPORT, CONF_SLAVE_ID, TRANSPORT_CLOUD_MQTT, TRANSPORT_MODBUS_TCP,
+    TRANSPORT_RTU_OVER_TCP, DEFAULT_MODBUS_PORT,
+)
+from .alert_rules import CONF_ALERT_RULES, AlertRuleError, compile_rules
+from .broker_endpoints import CONF_BROKER_ENDPOINTS, parse_endpoints
+from .republish import (
+    CONF_REPUBLISH_MODE, CONF_REPUBLISH_PREFIX, DEFAULT_REPUBLISH_PREFIX, REPUBLISH_MODES, REPUBLISH_OFF,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 STEP_USER_DATA_SCHEMA = vol.Schema({
-    vol.Required("host", default="localhost"): str,
-    vol.Required("port", default=1883): int,
+    vol.Required(CONF_TRANSPORT, default=TRANSPORT_CLOUD_MQTT): vol.In(
+        [TRANSPORT_CLOUD_MQTT, TRANSPORT_MODBUS_TCP, TRANSPORT_RTU_OVER_TCP]
+    ),
+    vol.Required("host", default="localhost"): str, # Local gateway (Modbus transports)
+    vol.Required("port", default=DEFAULT_MODBUS_PORT): int,
+    vol.Optional(CONF_SLAVE_ID, default=1): vol.All(int, vol.Range(min=1, max=247)),
 })
 
 class LumentreeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -42,3 +55,52 @@ class LumentreeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             data_schema=STEP_USER_DATA_SCHEMA,
             errors=errors,
         )
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> LumentreeOptionsFlow:
+        """Get the options flow for this handler."""
+        return LumentreeOptionsFlow(config_entry)
+
+class LumentreeOptionsFlow(config_entries.OptionsFlowWithConfigEntry):
+    """Handle Lumentree options (custom alert rules as JSON, local republishing, broker endpoints)."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the options."""
+        errors: dict[str, str] = {}
+        options = self.options
+        current = json.dumps(options.get(CONF_ALERT_RULES, []))
+
+        if user_input is not None:
+            current = user_input.get(CONF_ALERT_RULES) or "[]"
+            try:
+                rules = json.loads(current)
+                if not isinstance(rules, list):
+                    raise AlertRuleError("Alert rules must be a JSON list")
+                compile_rules(rules) # Validate before saving
+            except (ValueError, TypeError) as e: # AlertRuleError and JSONDecodeError are ValueErrors
+                _LOGGER.warning(f"Invalid alert rules: {e}")
+                errors["base"] = "invalid_alert_rules"
+            try:
+                parse_endpoints(user_input.get(CONF_BROKER_ENDPOINTS, ""), 1883)
+            except ValueError as e:
+                _LOGGER.warning(f"Invalid broker endpoints: {e}")
+                errors[CONF_BROKER_ENDPOINTS] = "invalid_broker_endpoints"
+            if not errors:
+                return self.async_create_entry(data={**options, **user_input, CONF_ALERT_RULES: rules})
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema({
+                vol.Optional(CONF_ALERT_RULES, default=current): str,
+                vol.Optional(CONF_REPUBLISH_MODE, default=options.get(CONF_REPUBLISH_MODE, REPUBLISH_OFF)): vol.In(REPUBLISH_MODES),
+                vol.Optional(CONF_REPUBLISH_PREFIX, default=options.get(CONF_REPUBLISH_PREFIX, DEFAULT_REPUBLISH_PREFIX)): str,
+                # Comma separated "host:port" / "user:pass@host:port", empty = cloud broker only
+                vol.Optional(CONF_BROKER_ENDPOINTS, default=options.get(CONF_BROKER_ENDPOINTS, "")): str,
+            }),
+            errors=errors,
+        )
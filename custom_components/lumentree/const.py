@@ -1,4 +1,70 @@
-
 """Constants for the Lumentree integration."""
 
+import logging
+
 DOMAIN = "lumentree"
+_LOGGER = logging.getLogger(__package__)
+
+CONF_DEVICE_SN = "device_sn"
+CONF_DEVICE_ID = "device_id"
+CONF_DEVICE_NAME = "device_name"
+
+# Transport used to read the inverter registers
+CONF_TRANSPORT = "transport"
+CONF_SLAVE_ID = "slave_id"
+TRANSPORT_CLOUD_MQTT = "cloud_mqtt"
+TRANSPORT_MODBUS_TCP = "modbus_tcp"
+TRANSPORT_RTU_OVER_TCP = "rtu_over_tcp"
+DEFAULT_MODBUS_PORT = 502
+
+# HTTP API
+BASE_URL = "http://lesvr.suntcn.com"
+URL_GET_SERVER_TIME = "/lesvr/getServerTime"
+URL_SHARE_DEVICES = "/lesvr/shareDevices"
+URL_DEVICE_MANAGE = "/lesvr/deviceManage"
+URL_GET_OTHER_DAY_DATA = "/lesvr/getOtherDayData"
+URL_GET_PV_DAY_DATA = "/lesvr/getPVDayData"
+URL_GET_BAT_DAY_DATA = "/lesvr/getBatDayData"
+DEFAULT_HEADERS = {
+    "versionCode": "1.6.3", "platform": "2", "wifiStatus": "1", "User-Agent": "Mozilla/5.0",
+    "Accept": "application/json, text/plain, */*", "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Cloud MQTT broker
+MQTT_BROKER = "lesvr.suntcn.com"
+MQTT_PORT = 1886
+MQTT_USERNAME = "appuser"
+MQTT_PASSWORD = "app666"
+MQTT_KEEPALIVE = 20
+MQTT_SUB_TOPIC_FORMAT = "reportApp/{device_sn}"
+MQTT_PUB_TOPIC_FORMAT = "listenApp/{device_sn}"
+MQTT_CLIENT_ID_FORMAT = "android-{device_id}-{timestamp}"
+SIGNAL_UPDATE_FORMAT = f"{DOMAIN}_mqtt_update_{{device_sn}}"
+
+DEFAULT_POLLING_INTERVAL = 5 # Seconds between register polls
+DEFAULT_STATS_INTERVAL = 1800 # Seconds between daily stats refreshes
+
+# Battery cell registers
+REG_ADDR_CELL_START = 250
+REG_ADDR_CELL_COUNT = 50
+
+# Data keys
+KEY_ONLINE_STATUS = "online_status"
+KEY_IS_UPS_MODE = "is_ups_mode"
+KEY_PV_POWER = "pv_power"
+KEY_BATTERY_POWER = "battery_power"
+KEY_LOAD_POWER = "load_power"
+KEY_GRID_POWER = "grid_power"
+KEY_BATTERY_SOC = "battery_soc"
+KEY_BATTERY_VOLTAGE = "battery_voltage"
+KEY_BATTERY_TEMP = "battery_temperature"
+KEY_INVERTER_TEMP = "inverter_temperature"
+KEY_DEVICE_TEMP = "device_temperature"
+KEY_FAULT_CODE = "fault_code"
+KEY_SYSTEM_EFFICIENCY = "system_efficiency"
+
+# Built-in alert thresholds
+ALERT_HIGH_TEMP = 60.0
+ALERT_LOW_BATTERY = 20.0
+ALERT_HIGH_VOLTAGE = 58.0
+ALERT_LOW_VOLTAGE = 44.0
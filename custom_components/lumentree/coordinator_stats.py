@@ -4,7 +4,7 @@
 
 import asyncio
 import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 import logging
 
 from homeassistant.core import HomeAssistant
@@ -15,55 +15,28 @@ from homeassistant.util import dt as dt_util
 # Import ConfigEntryAuthFailed từ đúng module
 from homeassistant.exceptions import ConfigEntryAuthFailed
 
-try:
-    # Import các thành phần cần thiết từ component
-    from .api import LumentreeHttpApiClient, ApiException, AuthException
-    from .const import DOMAIN, _LOGGER, DEFAULT_STATS_INTERVAL, CONF_DEVICE_SN
-except ImportError as import_err:
-    # --- Fallback Definitions (Đã sửa lỗi cú pháp) ---
-    _LOGGER = logging.getLogger(__name__)
-    _LOGGER.error(f"ImportError in coordinator_stats: {import_err}. Using fallback definitions.")
-    DOMAIN = "lumentree"
-    DEFAULT_STATS_INTERVAL = 1800
-    CONF_DEVICE_SN = "device_sn"
-
-    # Fallback Class API (Đã sửa lỗi cú pháp)
-    class LumentreeHttpApiClient:
-        def __init__(self, session=None):
-            pass
-        # Định nghĩa async def đúng cách (thụt lề)
-        async def get_daily_stats(self, sn, date):
-            _LOGGER.warning("Using fallback get_daily_stats - returning empty dict.")
-            return {}
-
-    # Fallback cho Exceptions (Tách dòng)
-    class ApiException(Exception):
-        pass
-    class AuthException(ApiException):
-        pass
-
-    try:
-        from homeassistant.helpers.update_coordinator import UpdateFailed
-    # Tách except và class fallback ra dòng riêng
-    except ImportError:
-        class UpdateFailed(Exception):
-            pass
-    try:
-        from homeassistant.exceptions import ConfigEntryAuthFailed
-    # Tách except và class fallback ra dòng riêng
-    except ImportError:
-        class ConfigEntryAuthFailed(Exception):
-            pass
-    # --- Hết phần Fallback ---
+from .api import LumentreeHttpApiClient, ApiException, AuthException
+from .const import DOMAIN, _LOGGER, DEFAULT_STATS_INTERVAL, CONF_DEVICE_SN
+from .energy_statistics import DailyEnergyStatistics
+from .curves import DailyCurveStore
 
 # --- Định nghĩa Lớp Coordinator ---
 class LumentreeStatsCoordinator(DataUpdateCoordinator[Dict[str, Optional[float]]]):
     """Coordinator to fetch daily statistics via HTTP API."""
 
-    def __init__(self, hass: HomeAssistant, api_client: LumentreeHttpApiClient, device_sn: str):
+    def __init__(
+        self, hass: HomeAssistant, api_client: LumentreeHttpApiClient, device_sn: str,
+        reconcile_energy: Optional[Callable[[Dict[str, Optional[float]], datetime.datetime], Dict[str, float]]] = None,
+    ):
         """Initialize the coordinator."""
         self.api_client = api_client
         self.device_sn = device_sn
+        # Optional hook (LumentreeMqttClient.async_reconcile_energy) merging HTTP totals with MQTT-integrated energy
+        self.reconcile_energy = reconcile_energy
+        # Daily totals are also written to long-term statistics (with backfill of past days)
+        self.energy_statistics = DailyEnergyStatistics(hass, api_client, device_sn)
+        # Intraday curves parsed from the same day-data responses (past days frozen once complete)
+        self.curves = DailyCurveStore(hass, device_sn)
         update_interval = datetime.timedelta(seconds=DEFAULT_STATS_INTERVAL)
 
         # Gọi super().__init__
@@ -97,12 +70,15 @@ class LumentreeStatsCoordinator(DataUpdateCoordinator[Dict[str, Optional[float]]
                  _LOGGER.error(f"Error getting timezone from HA config: {tz_err}. Using default.")
                  timezone = dt_util.get_default_time_zone()
 
-            today_str = dt_util.now(timezone).strftime("%Y-%m-%d")
+            today = dt_util.now(timezone).date()
+            today_str = today.strftime("%Y-%m-%d")
             _LOGGER.debug(f"Querying daily stats for date: {today_str}")
 
             # Gọi API
+            requested = dt_util.now() # HTTP sample time: MQTT energy integrated after it is kept on top
             async with asyncio.timeout(60):
-                stats_data = await self.api_client.get_daily_stats(self.device_sn, today_str)
+                stats_data, curves = await self.api_client.get_daily_data(self.device_sn, today_str, partial=True)
+            await self._async_update_curves(today, curves)
 
             # Xử lý kết quả
             if stats_data is None:
@@ -113,6 +89,13 @@ class LumentreeStatsCoordinator(DataUpdateCoordinator[Dict[str, Optional[float]]
                 raise UpdateFailed("Invalid data type received from API")
 
             _LOGGER.debug(f"Successfully fetched daily stats: {stats_data}")
+            if self.reconcile_energy:
+                stats_data = {**stats_data, **self.reconcile_energy(stats_data, requested)}
+                _LOGGER.debug(f"Reconciled daily stats with MQTT energy: {stats_data}")
+            if self.energy_statistics.available:
+                self.hass.async_create_background_task(
+                    self.energy_statistics.async_import(stats_data), f"{DOMAIN}_statistics_{self.device_sn}"
+                )
             return stats_data
 
         # Xử lý lỗi
@@ -128,3 +111,18 @@ class LumentreeStatsCoordinator(DataUpdateCoordinator[Dict[str, Optional[float]]
         except Exception as err:
             _LOGGER.exception(f"Unexpected error fetching stats data")
             raise UpdateFailed(f"Unexpected error: {err}") from err
+
+    async def _async_update_curves(self, today: datetime.date, curves: Dict[str, Any]) -> None:
+        """Cache today's curves; re-fetch recent days last seen before midnight to freeze them."""
+        await self.curves.async_load()
+        self.curves.update(today, curves, today)
+        for day in self.curves.days_to_finalize(today):
+            try:
+                totals, day_curves = await self.api_client.get_daily_data(self.device_sn, day.isoformat())
+            except ApiException as err:
+                _LOGGER.debug(f"Could not finalize {day} curves for {self.device_sn}: {err}")
+                break
+            if not totals and not day_curves:
+                _LOGGER.debug(f"No {day} data for {self.device_sn} yet, finalizing later")
+                continue
+            self.curves.update(day, day_curves, today) # Frozen even when the day has no curves
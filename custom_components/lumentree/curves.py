@@ -0,0 +1,191 @@
+# /config/custom_components/lumentree/curves.py
+# Intraday curves from the day-data endpoints: fixed-interval float32 arrays per flow and day, cached in memory and on disk
+
+import base64
+import logging
+import math
+import sys
+from array import array
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import _LOGGER
+
+CURVE_STORAGE_VERSION = 1
+CURVE_STORAGE_KEY_FORMAT = "lumentree_curves_{device_sn}"
+CURVE_SAVE_DELAY_SECONDS = 60
+CURVE_RETENTION_DAYS = 31
+CURVE_FINALIZE_DAYS = 2 # Incomplete past days re-fetched once to freeze their full curve
+CURVE_SERIES_KEYS = ("tableValueInfo", "values", "dataList", "list") # Where the series sits in a day-data item
+CURVE_VALUE_KEYS = ("tableValue", "value", "val")
+CURVE_TIME_KEYS = ("time", "tableKey", "dateTime")
+MINUTES_PER_DAY = 1440
+DEFAULT_CURVE_MINUTES = 5 # Grid of the day-data series (plain lists start at midnight)
+CURVE_POINTS = MINUTES_PER_DAY // DEFAULT_CURVE_MINUTES
+
+Curve = Tuple[int, array] # (interval minutes, float32 values; NaN = no sample)
+
+
+def _number(value: Any) -> float:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return result if math.isfinite(result) else math.nan
+
+
+def _minute_of_day(label: Any) -> Optional[int]:
+    """Minute of day from 'HH:MM' / 'YYYY-MM-DD HH:MM[:SS]' labels."""
+    if not isinstance(label, str) or ":" not in label:
+        return None
+    try:
+        hours, minutes = label.rsplit(" ", 1)[-1].split(":")[:2]
+        minute = int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+    return minute if 0 <= minute < MINUTES_PER_DAY else None
+
+
+def parse_curve(item: Any, partial: bool = False) -> Optional[Curve]:
+    """5-minute array from one day-data item (raw values as reported), None without a usable series.
+
+    Plain value lists are slots from midnight: a finished day must have all 288, a
+    partial (today's) list fills the leading slots and the rest stay NaN. Lists of
+    labelled points are placed by their time.
+    """
+    if not isinstance(item, dict):
+        return None
+    series = next((item[key] for key in CURVE_SERIES_KEYS if isinstance(item.get(key), list)), None)
+    if not series:
+        return None
+    if not isinstance(series[0], dict):
+        if len(series) > CURVE_POINTS or (not partial and len(series) != CURVE_POINTS):
+            _LOGGER.debug(f"Day curve with {len(series)} points does not match the {CURVE_POINTS}-point grid, ignored")
+            return None
+        values = array('f', (_number(v) for v in series))
+        values.extend(array('f', [math.nan]) * (CURVE_POINTS - len(series)))
+        return DEFAULT_CURVE_MINUTES, values
+
+    values = array('f', [math.nan]) * CURVE_POINTS
+    placed = 0
+    for point in series:
+        if not isinstance(point, dict):
+            continue
+        minute = next((m for m in (_minute_of_day(point.get(k)) for k in CURVE_TIME_KEYS) if m is not None), None)
+        value = next((point[k] for k in CURVE_VALUE_KEYS if k in point), None)
+        if minute is None or value is None:
+            continue
+        values[minute // DEFAULT_CURVE_MINUTES] = _number(value)
+        placed += 1
+    return (DEFAULT_CURVE_MINUTES, values) if placed else None
+
+
+def _encode(values: array) -> str:
+    data = values if sys.byteorder == "little" else array('f', values)
+    if data is not values:
+        data.byteswap()
+    return base64.b64encode(data.tobytes()).decode("ascii")
+
+
+def _decode(encoded: str) -> array:
+    values = array('f')
+    values.frombytes(base64.b64decode(encoded))
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+class DailyCurveStore:
+    """Per-day curves of one device; past days are frozen once stored complete."""
+
+    def __init__(self, hass: HomeAssistant, device_sn: str):
+        self.device_sn = device_sn
+        self._store: Store = Store(hass, CURVE_STORAGE_VERSION, CURVE_STORAGE_KEY_FORMAT.format(device_sn=device_sn))
+        self._days: Dict[date, Dict[str, Any]] = {} # day -> {'complete': bool, 'flows': {flow: Curve}}
+        self._loaded = False
+        self.metrics: Dict[str, int] = {"updates": 0, "frozen_skips": 0, "days_finalized": 0}
+
+    async def async_load(self) -> None:
+        """Load cached curves from disk (once)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            stored = await self._store.async_load() or {}
+        except Exception as e:
+            _LOGGER.warning(f"Failed load day curves {self.device_sn}: {e}")
+            stored = {}
+        for day_str, day_data in stored.get("days", {}).items():
+            try:
+                self._days[date.fromisoformat(day_str)] = {
+                    "complete": bool(day_data.get("complete")),
+                    "flows": {flow: (int(minutes), _decode(encoded)) for flow, (minutes, encoded) in day_data.get("flows", {}).items()},
+                }
+            except (ValueError, TypeError) as e:
+                _LOGGER.debug(f"Skipping stored curves of {day_str} for {self.device_sn}: {e}")
+
+    def _data_to_store(self) -> Dict[str, Any]:
+        return {"days": {
+            day.isoformat(): {
+                "complete": day_data["complete"],
+                "flows": {flow: [minutes, _encode(values)] for flow, (minutes, values) in day_data["flows"].items()},
+            }
+            for day, day_data in self._days.items()
+        }}
+
+    def update(self, day: date, curves: Dict[str, Curve], today: date) -> bool:
+        """Store the curves of a day; returns False for frozen days (or nothing to store).
+
+        A past day is frozen even without curves, so it is not fetched again.
+        """
+        stored = self._days.get(day)
+        if stored is not None and stored["complete"]:
+            self.metrics["frozen_skips"] += 1
+            return False
+        complete = day < today
+        if not curves and not complete:
+            return False
+        flows = dict(stored["flows"]) if stored else {}
+        flows.update(curves)
+        self._days[day] = {"complete": complete, "flows": flows}
+        if complete:
+            self.metrics["days_finalized"] += 1
+        self.metrics["updates"] += 1
+        oldest = today - timedelta(days=CURVE_RETENTION_DAYS)
+        for old_day in [d for d in self._days if d < oldest]:
+            del self._days[old_day]
+        self._store.async_delay_save(self._data_to_store, CURVE_SAVE_DELAY_SECONDS)
+        return True
+
+    def days_to_finalize(self, today: date) -> List[date]:
+        """Recent past days still holding a partial curve (last fetched before midnight)."""
+        first = today - timedelta(days=CURVE_FINALIZE_DAYS)
+        return sorted(day for day, day_data in self._days.items() if first <= day < today and not day_data["complete"])
+
+    def get(self, day: date) -> Optional[Dict[str, Curve]]:
+        day_data = self._days.get(day)
+        return dict(day_data["flows"]) if day_data else None
+
+    def as_dict(self, day: date) -> Optional[Dict[str, Any]]:
+        """JSON form of a day (NaN -> None), for services and charts."""
+        day_data = self._days.get(day)
+        if day_data is None:
+            return None
+        return {
+            "date": day.isoformat(),
+            "complete": day_data["complete"],
+            "flows": {
+                flow: {"interval_minutes": minutes, "values": [None if math.isnan(v) else round(v, 3) for v in values]}
+                for flow, (minutes, values) in day_data["flows"].items()
+            },
+        }
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics, "days": len(self._days),
+            "bytes": sum(values.itemsize * len(values) for d in self._days.values() for _, values in d["flows"].values()),
+        }
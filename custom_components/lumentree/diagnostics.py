@@ -0,0 +1,64 @@
+# /config/custom_components/lumentree/diagnostics.py
+# Config entry diagnostics (raw frame capture, write statistics)
+
+from typing import Any, Dict
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .broker_endpoints import DATA_DNS_CACHE
+from .fleet import DATA_FLEET
+from .reconnect import DATA_BREAKERS
+from .state_writer import DATA_STATE_WRITER
+
+TO_REDACT = {"device_id", "token"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> Dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    domain_data = hass.data.get(DOMAIN, {})
+    entry_data = domain_data.get(entry.entry_id, {})
+    diagnostics: Dict[str, Any] = {"entry_data": async_redact_data(dict(entry.data), TO_REDACT)}
+
+    if isinstance(entry_data, dict) and "startup_timing" in entry_data:
+        diagnostics["startup_timing"] = entry_data["startup_timing"]
+
+    mqtt_client = entry_data.get("mqtt_client") if isinstance(entry_data, dict) else None
+    if mqtt_client is not None:
+        diagnostics["mqtt_connected"] = mqtt_client.is_connected
+        diagnostics["commands"] = mqtt_client.command_stats
+        diagnostics["raw_frames"] = mqtt_client.raw_frames.as_dict()
+        if mqtt_client.connect_stats is not None:
+            diagnostics["broker_connect"] = mqtt_client.connect_stats
+        if mqtt_client.republish_stats is not None:
+            diagnostics["republish"] = mqtt_client.republish_stats
+
+    api_client = entry_data.get("api_client") if isinstance(entry_data, dict) else None
+    if api_client is not None:
+        diagnostics["http_latency"] = api_client.latency_stats
+
+    stats_coordinator = entry_data.get("stats_coordinator") if isinstance(entry_data, dict) else None
+    if stats_coordinator is not None and stats_coordinator.energy_statistics is not None:
+        diagnostics["energy_statistics"] = stats_coordinator.energy_statistics.metrics
+    if stats_coordinator is not None:
+        diagnostics["daily_curves"] = stats_coordinator.curves.stats
+
+    writer = domain_data.get(DATA_STATE_WRITER)
+    if writer is not None:
+        diagnostics["state_writes"] = writer.as_dict()
+
+    breakers = domain_data.get(DATA_BREAKERS)
+    if breakers:
+        diagnostics["broker_breakers"] = {host: breaker.as_dict() for host, breaker in breakers.items()}
+
+    dns_cache = domain_data.get(DATA_DNS_CACHE)
+    if dns_cache is not None:
+        diagnostics["dns_cache"] = dns_cache.as_dict()
+
+    fleet = domain_data.get(DATA_FLEET)
+    if fleet is not None:
+        diagnostics["fleet_analytics"] = fleet.engine.as_dict()
+
+    return diagnostics
@@ -0,0 +1,160 @@
+# /config/custom_components/lumentree/energy_statistics.py
+# Imports daily energy totals (and backfilled past days) into the recorder's long-term statistics
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util, slugify
+
+try:
+    from homeassistant.components.recorder import get_instance
+    from homeassistant.components.recorder.statistics import (
+        async_add_external_statistics, get_last_statistics,
+    )
+except ImportError: # Recorder not available: importing is disabled
+    get_instance = None
+try:
+    from homeassistant.components.recorder.models import StatisticMeanType
+    _META_MEAN = {"mean_type": StatisticMeanType.NONE}
+except ImportError: # Older cores only know has_mean
+    _META_MEAN = {}
+
+from .const import DOMAIN, _LOGGER
+
+# Daily stats key -> statistic name
+STATISTIC_KEYS: Dict[str, str] = {
+    "pv_today": "PV Energy",
+    "charge_today": "Battery Charge Energy",
+    "discharge_today": "Battery Discharge Energy",
+    "grid_in_today": "Grid Import Energy",
+    "load_today": "Load Energy",
+}
+BACKFILL_DAYS = 30 # Past days imported when a statistic has no rows yet (or after a gap)
+BACKFILL_CONCURRENCY = 3
+
+
+def statistic_id(device_sn: str, key: str) -> str:
+    """External statistic id, e.g. lumentree:h240101_pv."""
+    return f"{DOMAIN}:{slugify(device_sn)}_{key.removesuffix('_today')}"
+
+
+def _day_start(day: date) -> datetime:
+    """Statistics row start for a local day (UTC, floored to the hour)."""
+    return dt_util.as_utc(dt_util.start_of_local_day(day)).replace(minute=0, second=0, microsecond=0)
+
+
+def _row_day(start: float, today: date, days: int) -> date:
+    """Local day of a stored row, matched against the row starts written for recent days."""
+    for offset in range(days + 1):
+        day = today - timedelta(days=offset)
+        if abs(_day_start(day).timestamp() - start) < 1:
+            return day
+    # Older row: undo the hour floor before converting (half-hour offset zones)
+    return dt_util.as_local(dt_util.utc_from_timestamp(start + 3599)).date()
+
+
+class DailyEnergyStatistics:
+    """One long-term statistic row per flow and day: state = day total, sum = running total.
+
+    The daily-stats endpoint only reports day totals, so rows are daily; today's row
+    is rewritten on every refresh. The previous running total is read back from the
+    recorder (sum - state of today's row, or the sum of the last earlier row).
+    """
+
+    def __init__(self, hass: HomeAssistant, api_client: Any, device_sn: str, backfill_days: int = BACKFILL_DAYS):
+        self.hass = hass
+        self.api_client = api_client
+        self.device_sn = device_sn
+        self.backfill_days = backfill_days
+        self._lock = asyncio.Lock()
+        self.metrics: Dict[str, Any] = {"imports": 0, "rows": 0, "backfilled_days": 0, "last_import": None}
+
+    @property
+    def available(self) -> bool:
+        return get_instance is not None and "recorder" in self.hass.config.components
+
+    async def _async_last_row(self, stat_id: str) -> Optional[Dict[str, Any]]:
+        result = await get_instance(self.hass).async_add_executor_job(
+            get_last_statistics, self.hass, 1, stat_id, True, {"state", "sum"}
+        )
+        rows = result.get(stat_id)
+        return rows[0] if rows else None
+
+    async def _async_fetch_days(self, days: List[date]) -> Dict[date, Dict[str, Optional[float]]]:
+        """Daily totals for past days, a few requests at a time."""
+        semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+
+        async def _fetch(day: date):
+            async with semaphore:
+                try:
+                    return day, await self.api_client.get_daily_stats(self.device_sn, day.isoformat())
+                except Exception as e:
+                    _LOGGER.warning(f"Backfill of {self.device_sn} stats for {day} failed: {e}")
+                    return day, None
+
+        results = await asyncio.gather(*(_fetch(day) for day in days))
+        return {day: stats for day, stats in results if stats}
+
+    async def async_import(self, today_totals: Dict[str, Optional[float]]) -> None:
+        """Write today's totals (and any missing past days) as bulk statistics imports."""
+        if not self.available:
+            return
+        async with self._lock:
+            today = dt_util.now().date()
+            last_rows: Dict[str, Optional[Dict[str, Any]]] = {}
+            last_days: Dict[str, Optional[date]] = {}
+            for key in STATISTIC_KEYS:
+                row = await self._async_last_row(statistic_id(self.device_sn, key))
+                last_rows[key] = row
+                last_days[key] = _row_day(row["start"], today, self.backfill_days) if row else None
+
+            earliest = today - timedelta(days=self.backfill_days)
+            first_missing = min(
+                (max(last + timedelta(days=1), earliest) if last else earliest for last in last_days.values()),
+                default=today,
+            )
+            backfill = [first_missing + timedelta(days=i) for i in range((today - first_missing).days)]
+            past = await self._async_fetch_days(backfill) if backfill else {}
+
+            for key, name in STATISTIC_KEYS.items():
+                rows = self._build_rows(key, last_rows[key], last_days[key], past, today, today_totals.get(key))
+                if not rows:
+                    continue
+                stat_id = statistic_id(self.device_sn, key)
+                metadata = {
+                    "has_mean": False, "has_sum": True, **_META_MEAN,
+                    "name": f"{self.device_sn} {name}", "source": DOMAIN, "statistic_id": stat_id,
+                    "unit_of_measurement": UnitOfEnergy.KILO_WATT_HOUR,
+                }
+                async_add_external_statistics(self.hass, metadata, rows)
+                self.metrics["rows"] += len(rows)
+            self.metrics["imports"] += 1
+            self.metrics["backfilled_days"] += len(past)
+            self.metrics["last_import"] = dt_util.utcnow().isoformat()
+            _LOGGER.debug(f"Imported {self.device_sn} energy statistics ({len(past)} backfilled days)")
+
+    @staticmethod
+    def _build_rows(key: str, last_row: Optional[Dict[str, Any]], last_day: Optional[date],
+                    past: Dict[date, Dict[str, Optional[float]]], today: date,
+                    today_value: Optional[float]) -> List[Dict[str, Any]]:
+        """Statistic rows after the last stored day, continuing its running sum."""
+        if last_row is None:
+            running = 0.0
+        elif last_day == today:
+            running = (last_row.get("sum") or 0.0) - (last_row.get("state") or 0.0) # Rewrite today's row
+        else:
+            running = last_row.get("sum") or 0.0
+        rows: List[Dict[str, Any]] = []
+        for day in sorted(past):
+            value = past[day].get(key)
+            if value is None or (last_day is not None and day <= last_day):
+                continue
+            running += value
+            rows.append({"start": _day_start(day), "state": value, "sum": running})
+        if today_value is not None:
+            rows.append({"start": _day_start(today), "state": today_value, "sum": running + today_value})
+        return rows
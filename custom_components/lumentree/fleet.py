@@ -0,0 +1,315 @@
+# /config/custom_components/lumentree/fleet.py
+# Fleet analytics: all devices' metrics in shared column arrays; aggregates, trends and built-in alerts in one pass per tick
+
+import logging
+import math
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DOMAIN, _LOGGER, SIGNAL_UPDATE_FORMAT, DEFAULT_POLLING_INTERVAL,
+    KEY_PV_POWER, KEY_LOAD_POWER, KEY_BATTERY_TEMP, KEY_INVERTER_TEMP, KEY_DEVICE_TEMP,
+    KEY_SYSTEM_EFFICIENCY, KEY_BATTERY_SOC, KEY_BATTERY_VOLTAGE, KEY_FAULT_CODE,
+    ALERT_HIGH_TEMP, ALERT_LOW_BATTERY, ALERT_HIGH_VOLTAGE, ALERT_LOW_VOLTAGE,
+)
+
+from .analytics import _load_numpy
+
+DATA_FLEET = "fleet"
+EVENT_FLEET_ALERTS = f"{DOMAIN}_fleet_alerts"
+
+# Column layout of the shared arrays
+COL_PV, COL_LOAD, COL_TEMP, COL_EFFICIENCY, COL_SOC, COL_VOLTAGE, COL_FAULT = range(7)
+FLEET_COLUMNS = (
+    KEY_PV_POWER, KEY_LOAD_POWER, "max_temperature", KEY_SYSTEM_EFFICIENCY,
+    KEY_BATTERY_SOC, KEY_BATTERY_VOLTAGE, "fault",
+)
+TEMPERATURE_KEYS = (KEY_BATTERY_TEMP, KEY_INVERTER_TEMP, KEY_DEVICE_TEMP)
+_NUMERIC_COLUMNS = (
+    (COL_PV, KEY_PV_POWER), (COL_LOAD, KEY_LOAD_POWER), (COL_EFFICIENCY, KEY_SYSTEM_EFFICIENCY),
+    (COL_SOC, KEY_BATTERY_SOC), (COL_VOLTAGE, KEY_BATTERY_VOLTAGE),
+)
+# Register values the fleet step needs (read even when their entities are disabled)
+FLEET_INPUT_KEYS = (*(key for _col, key in _NUMERIC_COLUMNS), *TEMPERATURE_KEYS, KEY_FAULT_CODE)
+ALERT_KEYS = ("high_temperature_alert", "low_battery_alert", "voltage_alert", "system_fault_alert")
+
+FLEET_TICK_SECONDS = DEFAULT_POLLING_INTERVAL
+FLEET_WINDOW_TICKS = 10 # Samples in the rolling averages
+FLEET_TREND_TICKS = 5 # Span of the trend indicators
+INITIAL_CAPACITY = 8
+NAN = float("nan")
+
+
+class FleetAnalytics:
+    """Windowed aggregates, trends and built-in alerts for every device in one pass per tick.
+
+    Frames only overwrite the device's row of the ``latest`` table; each tick
+    appends that table to a (window, devices, columns) ring and reduces it along
+    the window axis. Rows without a frame since the previous tick get NaN.
+    Sensor values and alerts are then derived column-wise for all rows at once;
+    alerts use the latest held values.
+    """
+
+    def __init__(self, window: int = FLEET_WINDOW_TICKS, use_numpy: bool = True):
+        self.window = window
+        self._np = _load_numpy() if use_numpy else None
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._capacity = 0
+        self._latest: List[List[float]] = []
+        self._fresh: List[bool] = []
+        self._ring: Any = None
+        self._pos = 0
+        self._last_sent: Dict[str, Dict[str, Any]] = {}
+        self.metrics: Dict[str, Any] = {
+            "backend": "numpy" if self._np else "python", "ticks": 0, "last_step_ms": 0.0,
+        }
+        self._grow(INITIAL_CAPACITY)
+
+    def _grow(self, capacity: int) -> None:
+        """Reallocate the tables for more device rows (doubling), keeping existing data."""
+        ncols = len(FLEET_COLUMNS)
+        self._latest.extend([NAN] * ncols for _ in range(capacity - self._capacity))
+        self._fresh.extend([False] * (capacity - self._capacity))
+        if self._np:
+            ring = self._np.full((self.window, capacity, ncols), NAN)
+            if self._ring is not None:
+                ring[:, :self._capacity] = self._ring
+        else:
+            ring = [[[NAN] * ncols for _ in range(capacity)] for _ in range(self.window)]
+            if self._ring is not None:
+                for tick, old in zip(ring, self._ring):
+                    tick[:self._capacity] = old
+        self._ring = ring
+        self._capacity = capacity
+
+    def _clear_row(self, row: int) -> None:
+        self._latest[row] = [NAN] * len(FLEET_COLUMNS)
+        self._fresh[row] = False
+        if self._np:
+            self._ring[:, row] = NAN
+        else:
+            for tick in self._ring:
+                tick[row] = [NAN] * len(FLEET_COLUMNS)
+
+    def register(self, device_sn: str) -> int:
+        row = self._rows.get(device_sn)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self._rows)
+                if row >= self._capacity:
+                    self._grow(self._capacity * 2)
+            self._clear_row(row)
+            self._rows[device_sn] = row
+        return row
+
+    def unregister(self, device_sn: str) -> None:
+        row = self._rows.pop(device_sn, None)
+        if row is not None:
+            self._clear_row(row)
+            self._free.append(row)
+        self._last_sent.pop(device_sn, None)
+
+    @property
+    def device_count(self) -> int:
+        return len(self._rows)
+
+    def record(self, device_sn: str, data: Dict[str, Any]) -> None:
+        """Store a frame's metrics in the device row (values missing from the frame are held)."""
+        row = self._rows.get(device_sn)
+        if row is None:
+            return
+        values = self._latest[row]
+        for col, key in _NUMERIC_COLUMNS:
+            value = data.get(key)
+            if isinstance(value, (int, float)):
+                values[col] = float(value)
+        temps = [t for t in (data.get(k) for k in TEMPERATURE_KEYS) if isinstance(t, (int, float))]
+        if temps:
+            values[COL_TEMP] = float(max(temps))
+        fault = data.get(KEY_FAULT_CODE)
+        if fault is not None:
+            values[COL_FAULT] = 0.0 if fault in (0, "No Fault") else 1.0
+        self._fresh[row] = True
+
+    def step(self) -> Dict[str, Dict[str, Any]]:
+        """Advance one tick and return the aggregates and built-in alerts of every registered device."""
+        started = time.perf_counter()
+        newest = self._pos
+        oldest_trend = (self._pos - FLEET_TREND_TICKS + 1) % self.window
+        self._pos = (self._pos + 1) % self.window
+        if self._np:
+            columns = self._step_numpy(newest, oldest_trend)
+        else:
+            columns = self._step_python(newest, oldest_trend)
+        self._fresh = [False] * self._capacity
+        results: Dict[str, Dict[str, Any]] = {}
+        for device_sn, row in self._rows.items():
+            results[device_sn] = {key: values[row] for key, (valid, values) in columns.items() if valid[row]}
+        self.metrics["ticks"] += 1
+        self.metrics["last_step_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return results
+
+    def _step_numpy(self, newest: int, oldest_trend: int) -> Dict[str, Any]:
+        """All rows at once: output key -> (valid mask, values) lists indexed by row."""
+        np = self._np
+        held = np.asarray(self._latest, dtype=float)
+        latest = held.copy()
+        latest[~np.asarray(self._fresh)] = np.nan
+        ring = self._ring
+        ring[newest] = latest
+        valid = ~np.isnan(ring)
+        counts = valid.sum(axis=0)
+        sums = np.where(valid, ring, 0.0).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+            trends = ring[newest] - ring[oldest_trend]
+            avg_pv, avg_load = means[:, COL_PV], means[:, COL_LOAD]
+            has_pv, has_load = counts[:, COL_PV] > 1, counts[:, COL_LOAD] > 1
+            sufficiency = np.where(avg_load > 0, np.minimum(100.0, avg_pv / avg_load * 100.0), 100.0)
+            temp_trend, pv_trend = trends[:, COL_TEMP], trends[:, COL_PV]
+            temp, soc, voltage, fault = (held[:, col] for col in (COL_TEMP, COL_SOC, COL_VOLTAGE, COL_FAULT))
+            columns = {
+                "avg_pv_power_10min": (has_pv, np.round(avg_pv, 1)),
+                "avg_load_power_10min": (has_pv & has_load, np.round(avg_load, 1)),
+                "energy_self_sufficiency": (has_pv & has_load & (avg_pv > 0), np.round(sufficiency, 1)),
+                "avg_efficiency_10min": (counts[:, COL_EFFICIENCY] > 1, np.round(means[:, COL_EFFICIENCY], 1)),
+                "temperature_trend": (
+                    (counts[:, COL_TEMP] >= FLEET_TREND_TICKS) & ~np.isnan(temp_trend),
+                    np.select([temp_trend > 2, temp_trend < -2], ["rising", "falling"], "stable"),
+                ),
+                "power_trend": (
+                    (counts[:, COL_PV] >= FLEET_TREND_TICKS) & ~np.isnan(pv_trend),
+                    np.select([pv_trend > 50, pv_trend < -50], ["increasing", "decreasing"], "stable"),
+                ),
+                "high_temperature_alert": (~np.isnan(temp), temp > ALERT_HIGH_TEMP),
+                "low_battery_alert": (~np.isnan(soc), soc < ALERT_LOW_BATTERY),
+                "voltage_alert": (~np.isnan(voltage), (voltage > ALERT_HIGH_VOLTAGE) | (voltage < ALERT_LOW_VOLTAGE)),
+                "system_fault_alert": (~np.isnan(fault), fault > 0),
+            }
+        return {key: (mask.tolist(), values.tolist()) for key, (mask, values) in columns.items()}
+
+    def _step_python(self, newest: int, oldest_trend: int) -> Dict[str, Any]:
+        """Pure Python fallback of _step_numpy, one list comprehension per output column."""
+        ncols = len(FLEET_COLUMNS)
+        self._ring[newest] = [
+            list(values) if fresh else [NAN] * ncols for values, fresh in zip(self._latest, self._fresh)
+        ]
+        ring, rows = self._ring, range(self._capacity)
+
+        def _column(col: int):
+            counts, means = [], []
+            for row in rows:
+                samples = [tick[row][col] for tick in ring if not math.isnan(tick[row][col])]
+                counts.append(len(samples))
+                means.append(sum(samples) / len(samples) if samples else NAN)
+            trends = [ring[newest][row][col] - ring[oldest_trend][row][col] for row in rows]
+            return counts, means, trends
+
+        def _trend(counts, trends, threshold: float, up: str, down: str):
+            valid = [n >= FLEET_TREND_TICKS and not math.isnan(d) for n, d in zip(counts, trends)]
+            return valid, [up if d > threshold else down if d < -threshold else "stable" for d in trends]
+
+        pv_n, avg_pv, pv_trend = _column(COL_PV)
+        load_n, avg_load, _ = _column(COL_LOAD)
+        temp_n, _, temp_trend = _column(COL_TEMP)
+        eff_n, avg_eff, _ = _column(COL_EFFICIENCY)
+        has_pv = [n > 1 for n in pv_n]
+        has_both = [p and n > 1 for p, n in zip(has_pv, load_n)]
+        held = self._latest
+        temp, soc, voltage, fault = ([values[col] for values in held] for col in (COL_TEMP, COL_SOC, COL_VOLTAGE, COL_FAULT))
+
+        def known(column):
+            return [not math.isnan(v) for v in column]
+
+        return {
+            "avg_pv_power_10min": (has_pv, [round(v, 1) for v in avg_pv]),
+            "avg_load_power_10min": (has_both, [round(v, 1) for v in avg_load]),
+            "energy_self_sufficiency": (
+                [b and p > 0 for b, p in zip(has_both, avg_pv)],
+                [round(min(100.0, p / l * 100.0), 1) if l > 0 else 100.0 for p, l in zip(avg_pv, avg_load)],
+            ),
+            "avg_efficiency_10min": ([n > 1 for n in eff_n], [round(v, 1) for v in avg_eff]),
+            "temperature_trend": _trend(temp_n, temp_trend, 2, "rising", "falling"),
+            "power_trend": _trend(pv_n, pv_trend, 50, "increasing", "decreasing"),
+            "high_temperature_alert": (known(temp), [v > ALERT_HIGH_TEMP for v in temp]),
+            "low_battery_alert": (known(soc), [v < ALERT_LOW_BATTERY for v in soc]),
+            "voltage_alert": (known(voltage), [v > ALERT_HIGH_VOLTAGE or v < ALERT_LOW_VOLTAGE for v in voltage]),
+            "system_fault_alert": (known(fault), [v > 0 for v in fault]),
+        }
+
+    def changed_results(self, results: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Only the values that differ from what was last sent per device."""
+        changed: Dict[str, Dict[str, Any]] = {}
+        for device_sn, values in results.items():
+            last = self._last_sent.setdefault(device_sn, {})
+            diff = {k: v for k, v in values.items() if last.get(k) != v}
+            if diff:
+                last.update(diff)
+                changed[device_sn] = diff
+        return changed
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**self.metrics, "devices": self.device_count, "capacity": self._capacity, "window": self.window}
+
+
+class FleetAnalyticsManager:
+    """Owns the shared fleet engine and its tick timer (runs while any device is registered)."""
+
+    def __init__(self, hass: HomeAssistant, tick_seconds: float = FLEET_TICK_SECONDS):
+        self.hass = hass
+        self.tick_seconds = tick_seconds
+        self.engine = FleetAnalytics()
+        self._unsub_tick: Optional[Callable] = None
+
+    @callback
+    def async_register(self, device_sn: str) -> None:
+        self.engine.register(device_sn)
+        if self._unsub_tick is None:
+            self._unsub_tick = async_track_time_interval(
+                self.hass, self._async_tick, timedelta(seconds=self.tick_seconds)
+            )
+            _LOGGER.debug(f"Fleet analytics started ({self.engine.metrics['backend']}, tick {self.tick_seconds}s)")
+
+    @callback
+    def async_unregister(self, device_sn: str) -> None:
+        self.engine.unregister(device_sn)
+        if not self.engine.device_count and self._unsub_tick:
+            self._unsub_tick()
+            self._unsub_tick = None
+            _LOGGER.debug("Fleet analytics stopped (no devices)")
+
+    @callback
+    def async_record(self, device_sn: str, data: Dict[str, Any]) -> None:
+        self.engine.record(device_sn, data)
+
+    @callback
+    def _async_tick(self, _now=None) -> None:
+        """One step for all devices; changed alerts of the whole fleet go out as one event."""
+        changed = self.engine.changed_results(self.engine.step())
+        alerts = {
+            device_sn: {key: values[key] for key in ALERT_KEYS if key in values}
+            for device_sn, values in changed.items()
+        }
+        alerts = {device_sn: states for device_sn, states in alerts.items() if states}
+        if alerts:
+            self.hass.bus.async_fire(EVENT_FLEET_ALERTS, {"devices": alerts})
+        for device_sn, values in changed.items():
+            async_dispatcher_send(self.hass, SIGNAL_UPDATE_FORMAT.format(device_sn=device_sn), values)
+
+
+@callback
+def async_get_fleet(hass: HomeAssistant) -> FleetAnalyticsManager:
+    """Return the integration-wide fleet analytics manager."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    fleet = domain_data.get(DATA_FLEET)
+    if fleet is None:
+        fleet = domain_data[DATA_FLEET] = FleetAnalyticsManager(hass)
+    return fleet
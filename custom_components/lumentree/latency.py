@@ -0,0 +1,99 @@
+# /config/custom_components/lumentree/latency.py
+# Rolling per-endpoint HTTP latency, adaptive timeouts and a capped budget for hedged requests
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+LATENCY_SAMPLES = 100 # Rolling window per endpoint
+LATENCY_MIN_SAMPLES = 10 # Below this, the fixed default timeout is used and nothing is hedged
+TIMEOUT_P99_MULTIPLIER = 3.0
+TIMEOUT_MIN_SECONDS = 5.0
+TIMEOUT_MAX_SECONDS = 30.0 # Previous fixed timeout
+HEDGE_MIN_DELAY_SECONDS = 0.2
+HEDGE_MAX_FRACTION = 0.05 # At most ~5% of requests get a hedged duplicate
+HEDGE_WINDOW = 200 # Requests the hedge fraction is measured over
+
+
+class EndpointLatency:
+    """Latency distribution of one endpoint (successful requests, plus timeouts as censored samples)."""
+
+    def __init__(self, max_samples: int = LATENCY_SAMPLES):
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+        self._sorted: Optional[List[float]] = None
+        self.requests = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def record_timeout(self, seconds: float) -> None:
+        """Censored sample: a request that ran into its timeout took at least that long.
+
+        It lands in the top of the window, so the next timeout is about 3x wider
+        and a service that slowed down beyond the learned timeout is reached again.
+        """
+        self.record(seconds)
+        self.timeouts += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self._samples) < LATENCY_MIN_SAMPLES:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return self._sorted[min(int(len(self._sorted) * q), len(self._sorted) - 1)]
+
+    def timeout(self) -> float:
+        """Total timeout: 3x p99, clamped to [5, 30] s; 30 s until enough samples exist."""
+        p99 = self.quantile(0.99)
+        if p99 is None:
+            return TIMEOUT_MAX_SECONDS
+        return min(max(p99 * TIMEOUT_P99_MULTIPLIER, TIMEOUT_MIN_SECONDS), TIMEOUT_MAX_SECONDS)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Send the duplicate once the request is slower than p95."""
+        p95 = self.quantile(0.95)
+        return None if p95 is None else max(p95, HEDGE_MIN_DELAY_SECONDS)
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "requests": self.requests, "timeouts": self.timeouts, "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins, "timeout_s": round(self.timeout(), 2),
+        }
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            value = self.quantile(q)
+            if value is not None:
+                stats[f"{name}_ms"] = round(value * 1000, 1)
+        return stats
+
+
+class HedgeBudget:
+    """Allows a hedge only while hedges stay below a fraction of recent requests."""
+
+    def __init__(self, max_fraction: float = HEDGE_MAX_FRACTION, window: int = HEDGE_WINDOW):
+        self.max_fraction = max_fraction
+        self._events: Deque[bool] = deque(maxlen=window) # True = hedge, False = request
+        self._hedges = 0
+        self.denied = 0
+
+    def _append(self, hedge: bool) -> None:
+        if len(self._events) == self._events.maxlen and self._events[0]:
+            self._hedges -= 1
+        self._events.append(hedge)
+        self._hedges += hedge
+
+    def record_request(self) -> None:
+        self._append(False)
+
+    def try_acquire(self) -> bool:
+        requests = len(self._events) - self._hedges
+        if self._hedges + 1 > max(1.0, self.max_fraction * requests):
+            self.denied += 1
+            return False
+        self._append(True)
+        return True
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"hedges_in_window": self._hedges, "window": len(self._events), "denied": self.denied}
@@ -0,0 +1,180 @@
+# /config/custom_components/lumentree/modbus_tcp.py
+# Local transport: Modbus TCP or RTU-over-TCP gateway on a persistent, pipelined socket (no cloud broker)
+
+import asyncio
+import logging
+import socket
+import struct
+from typing import Optional, Tuple
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST, CONF_PORT
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    _LOGGER, CONF_TRANSPORT, CONF_SLAVE_ID, TRANSPORT_MODBUS_TCP, TRANSPORT_RTU_OVER_TCP,
+    DEFAULT_MODBUS_PORT,
+)
+
+from .command_queue import ModbusCommandQueue
+from .mqtt import LumentreeMqttClient, CONNECT_TIMEOUT
+from .parser import crc16_modbus
+
+LOCAL_TRANSPORTS = (TRANSPORT_MODBUS_TCP, TRANSPORT_RTU_OVER_TCP)
+MBAP_HEADER = struct.Struct(">HHHB") # transaction id, protocol id (0), length, unit id
+MAX_RTU_FRAME = 256
+MAX_MBAP_LENGTH = 254 # Unit id + PDU (253 bytes max)
+RTU_RESYNC_QUIET_SECONDS = 0.05 # Lost RTU framing: discard input until the line is quiet this long
+RTU_RESYNC_MAX_READS = 16
+
+
+def rtu_to_mbap(rtu_frame: bytes, transaction_id: int) -> bytes:
+    """Wrap an RTU request (addr, PDU, CRC) into a Modbus TCP ADU."""
+    pdu = rtu_frame[1:-2]
+    return MBAP_HEADER.pack(transaction_id & 0xFFFF, 0, len(pdu) + 1, rtu_frame[0]) + pdu
+
+
+def pdu_to_rtu(unit_id: int, pdu: bytes) -> bytes:
+    """Build the RTU frame (with CRC) the parser expects from a unit id and PDU."""
+    frame = bytes((unit_id,)) + pdu
+    return frame + crc16_modbus(frame).to_bytes(2, "little")
+
+
+class LumentreeModbusTcpClient(LumentreeMqttClient):
+    """Reads registers from a local gateway instead of the cloud broker.
+
+    Read commands are written back to back on one socket (the command queue keeps
+    up to four in flight); every response is converted to an RTU frame and goes
+    through the same parse/analytics/dispatch path as MQTT frames.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, device_sn: str, device_id: str):
+        super().__init__(hass, entry, device_sn, device_id)
+        self._host: str = entry.data.get(CONF_HOST)
+        self._port: int = entry.data.get(CONF_PORT, DEFAULT_MODBUS_PORT)
+        self._mbap = entry.data.get(CONF_TRANSPORT) == TRANSPORT_MODBUS_TCP
+        self._broker_host = f"{self._host}:{self._port}"
+        self._client_id = f"modbus-{self._broker_host}"
+        self._commands = ModbusCommandQueue(self._publish_command, slave_id=entry.data.get(CONF_SLAVE_ID, 1))
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        """Open the persistent socket to the gateway."""
+        await self._async_prepare_connect()
+        async with self._connect_lock:
+            if self._is_connected:
+                return
+            self._stopping = False
+            _LOGGER.info(f"Modbus connect: {self._broker_host} ({'TCP' if self._mbap else 'RTU over TCP'}) for SN: {self._device_sn}")
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self._host, self._port), timeout=CONNECT_TIMEOUT
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                raise ConnectionRefusedError(f"Modbus gateway {self._broker_host} unreachable: {e!r}") from e
+            sock = writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._reader, self._writer = reader, writer
+            self._is_connected = True
+            self._reconnect_attempts = 0
+            self._read_task = self.hass.async_create_background_task(
+                self._async_read_loop(reader), f"lumentree_modbus_read_{self._device_sn}"
+            )
+
+    async def _async_read_frame(self, reader: asyncio.StreamReader) -> Tuple[Optional[int], Optional[bytes]]:
+        """Next response as (transaction id, RTU frame); the id is None for RTU, the frame None for exception responses and corrupt frames."""
+        if self._mbap:
+            tid, protocol, length, unit = MBAP_HEADER.unpack(await reader.readexactly(MBAP_HEADER.size))
+            if not 2 <= length <= MAX_MBAP_LENGTH:
+                # No way to find the next header in the stream: reconnect to resync
+                raise ConnectionError(f"Invalid MBAP length {length}")
+            pdu = await reader.readexactly(length - 1)
+            if protocol != 0 or not pdu or pdu[0] & 0x80:
+                _LOGGER.warning(f"Modbus exception/invalid response {self._client_id}: {pdu.hex()}")
+                return tid, None
+            return tid, pdu_to_rtu(unit, pdu)
+
+        header = await reader.readexactly(3)
+        if header[1] & 0x80: # Exception response: addr, fc|0x80, code, crc
+            await reader.readexactly(2)
+            _LOGGER.warning(f"Modbus exception {header[2]} for fc {header[1] & 0x7F} {self._client_id}")
+            return None, None
+        if header[1] not in (3, 4) or header[2] + 5 > MAX_RTU_FRAME:
+            # Lost framing: drop input until the line is quiet, the pending read will time out and retry
+            await self._async_drain(reader)
+            _LOGGER.warning(f"Modbus framing lost {self._client_id} ({header.hex()}), resyncing")
+            return None, None
+        frame = header + await reader.readexactly(header[2] + 2)
+        if crc16_modbus(frame[:-2]) != int.from_bytes(frame[-2:], "little"):
+            _LOGGER.warning(f"Modbus CRC mismatch {self._client_id}: {frame.hex()}")
+            return None, None
+        return None, frame
+
+    @staticmethod
+    async def _async_drain(reader: asyncio.StreamReader) -> None:
+        """Discard buffered input without waiting for the next response."""
+        try:
+            for _ in range(RTU_RESYNC_MAX_READS):
+                if not await asyncio.wait_for(reader.read(MAX_RTU_FRAME * 4), RTU_RESYNC_QUIET_SECONDS):
+                    return
+        except asyncio.TimeoutError:
+            pass
+
+    async def _async_read_loop(self, reader: asyncio.StreamReader) -> None:
+        """Feed every response into the shared message path until the socket closes."""
+        try:
+            while True:
+                transaction_id, frame = await self._async_read_frame(reader)
+                if frame is not None:
+                    self._handle_message(self._topic_sub, frame, transaction_id)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            if not self._stopping:
+                _LOGGER.warning(f"Modbus connection lost {self._client_id}: {e!r}")
+        finally:
+            if reader is self._reader:
+                self._connection_lost()
+
+    @callback
+    def _connection_lost(self) -> None:
+        if self._writer:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._is_connected = False
+        self._set_offline()
+        if not self._stopping:
+            self.async_schedule_reconnect()
+
+    async def _publish_command(self, command_hex: str, transaction_id: Optional[int] = None) -> bool:
+        """Write one read request (does not wait for the response); Modbus TCP carries the queue's transaction id."""
+        if not self._is_connected or not self._writer:
+            _LOGGER.error(f"Modbus not conn {self._client_id}, cannot send.")
+            return False
+        try:
+            frame = bytes.fromhex(command_hex)
+            if self._mbap:
+                frame = rtu_to_mbap(frame, transaction_id or 0)
+            self._writer.write(frame)
+            await self._writer.drain()
+            return True
+        except (ValueError, ConnectionError, OSError) as e:
+            _LOGGER.error(f"Failed Modbus send {self._client_id}: {e!r}")
+            return False
+
+    async def disconnect(self) -> None:
+        """Close the socket and clean up."""
+        await super().disconnect()
+        read_task, self._read_task = self._read_task, None
+        writer, self._writer = self._writer, None
+        self._reader = None
+        if read_task and not read_task.done():
+            read_task.cancel()
+        if writer:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        _LOGGER.info(f"Modbus client disconnected {self._client_id}.")
@@ -3,47 +3,71 @@
 
 import asyncio
 import json
-import ssl
+import random
 import time
 import logging
-from typing import Any, Dict, Optional, Callable
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Optional, Callable
+from collections import ChainMap
 from functools import partial
 
-import paho.mqtt.client as paho
-from paho.mqtt.client import MQTTMessage
+if TYPE_CHECKING:
+    from paho.mqtt.client import MQTTMessage
+
+paho: Any = None # paho.mqtt.client, imported on first connect
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_send
-from homeassistant.helpers.event import async_call_later
-
-try:
-    from .const import (
-        DOMAIN, _LOGGER, MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD,
-        MQTT_SUB_TOPIC_FORMAT, MQTT_PUB_TOPIC_FORMAT,
-        SIGNAL_UPDATE_FORMAT, # Removed INITIAL signal
-        CONF_DEVICE_SN, CONF_DEVICE_ID,
-        MQTT_CLIENT_ID_FORMAT, MQTT_KEEPALIVE, KEY_ONLINE_STATUS,
-        KEY_LAST_RAW_MQTT, DEFAULT_POLLING_INTERVAL,
-        REG_ADDR_CELL_START, REG_ADDR_CELL_COUNT
-    )
-    from .parser import parse_mqtt_payload, generate_modbus_read_command
-    from .analytics import LumentreeAnalytics # Import LumentreeAnalytics
-except ImportError:
-    _LOGGER = logging.getLogger(__name__); _LOGGER.warning("ImportError mqtt.py")
-    DOMAIN = "lumentree"; MQTT_BROKER = "lesvr.suntcn.com"; MQTT_PORT = 1886; MQTT_USERNAME = "appuser"; MQTT_PASSWORD = "app666"; MQTT_KEEPALIVE = 20; MQTT_SUB_TOPIC_FORMAT = "reportApp/{device_sn}"; MQTT_PUB_TOPIC_FORMAT = "listenApp/{device_sn}"; SIGNAL_UPDATE_FORMAT = f"{DOMAIN}_mqtt_update_{{device_sn}}"; CONF_DEVICE_SN = "device_sn"; CONF_DEVICE_ID = "device_id"; MQTT_CLIENT_ID_FORMAT = "android-{device_id}-{timestamp}"; KEY_ONLINE_STATUS="online_status"; KEY_LAST_RAW_MQTT = "last_raw_mqtt_hex"; DEFAULT_POLLING_INTERVAL=5; REG_ADDR_CELL_START=250; REG_ADDR_CELL_COUNT=50;
-    def parse_mqtt_payload(ph:str)->Optional[Dict[str,Any]]: return None
-    def generate_modbus_read_command(sid:int,fc:int,addr:int,num:int)->Optional[str]: return None
-    def async_call_later(hass, delay, target): pass
-    class LumentreeAnalytics: # Mock class if import fails
-        def __init__(self): pass
-        def update_data(self, data): return {}
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN, _LOGGER, MQTT_BROKER, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD,
+    MQTT_SUB_TOPIC_FORMAT, MQTT_PUB_TOPIC_FORMAT,
+    SIGNAL_UPDATE_FORMAT,
+    CONF_DEVICE_SN, CONF_DEVICE_ID,
+    MQTT_CLIENT_ID_FORMAT, MQTT_KEEPALIVE, KEY_ONLINE_STATUS,
+    DEFAULT_POLLING_INTERVAL,
+    REG_ADDR_CELL_START, REG_ADDR_CELL_COUNT
+)
+from .parser import parse_mqtt_payload, generate_modbus_read_command, KEY_BATTERY_CELLS, ParsedFrame, modbus_response_register_count, merge_frames
+from .command_queue import ModbusCommandQueue, CommandTimeout, CommandPublishError
+from .analytics import LumentreeAnalytics
+from .alert_rules import CONF_ALERT_RULES
+from .capture import RawFrameBuffer, FrameRecorder, async_replay_frames
+from .read_planner import ModbusReadPlanner
+from .watchdog import async_get_watchdog, OFFLINE_TIMEOUT_SECONDS
+from .reconnect import async_get_breaker, full_jitter_delay
+from .fleet import FLEET_INPUT_KEYS, async_get_fleet
+from .republish import FrameRepublisher, CONF_REPUBLISH_MODE, CONF_REPUBLISH_PREFIX, REPUBLISH_OFF, DEFAULT_REPUBLISH_PREFIX
+from .broker_endpoints import CONF_BROKER_ENDPOINTS, ConnectStats, async_race_connect, parse_endpoints
 
 RECONNECT_DELAY_SECONDS = 5
-MAX_RECONNECT_ATTEMPTS = 10
+RECONNECT_MAX_DELAY_SECONDS = 60
+MAX_RECONNECT_ATTEMPTS = 10 # Fast (jittered exponential) attempts before switching to slow retries
+SLOW_RETRY_SECONDS = 300 # Slow retries continue indefinitely (jittered 50-100%)
 CONNECT_TIMEOUT = 20
-OFFLINE_TIMEOUT_SECONDS = DEFAULT_POLLING_INTERVAL * 2.5
 NUM_MAIN_REGISTERS_TO_READ = 95 # Read registers 0-94
+ENERGY_STORAGE_VERSION = 1
+ENERGY_STORAGE_KEY_FORMAT = "lumentree_energy_{device_sn}"
+ENERGY_SAVE_DELAY_SECONDS = 60
+CONNACK_ERRORS = {1: "Proto", 2: "ID Rej", 3: "Srv Unavail", 4: "Bad User/Pass", 5: "No Auth"}
+
+def _import_paho():
+    """Import paho (blocking, run in an executor)."""
+    import paho.mqtt.client as paho_client
+    return paho_client
+
+
+def _close_client(client) -> None:
+    """Stop a paho client's loop and disconnect it (blocking, run in an executor)."""
+    try:
+        client.loop_stop()
+        client.disconnect()
+    except Exception as e:
+        _LOGGER.debug(f"Error closing MQTT client: {e}")
+
 
 class LumentreeMqttClient:
     """Manages MQTT connection, messages, and online status."""
@@ -54,8 +78,9 @@ class LumentreeMqttClient:
         self.entry = entry
         self._device_sn = device_sn
         self._device_id = device_id
-        self._mqttc: Optional[paho.Client] = None
+        self._mqttc = None # paho.Client
         timestamp = int(time.time())
+        self._client_timestamp = timestamp
         try:
             self._client_id = MQTT_CLIENT_ID_FORMAT.format(device_id=self._device_id, timestamp=timestamp)
         except KeyError:
@@ -65,90 +90,229 @@ class LumentreeMqttClient:
         self._signal_update = SIGNAL_UPDATE_FORMAT.format(device_sn=self._device_sn)
         self._topic_sub = MQTT_SUB_TOPIC_FORMAT.format(device_sn=self._device_sn)
         self._topic_pub = MQTT_PUB_TOPIC_FORMAT.format(device_sn=self._device_sn)
+        # Broker endpoints raced on connect (options: cloud broker plus e.g. a local bridge); default = cloud broker
+        try:
+            self._endpoints = parse_endpoints(entry.options.get(CONF_BROKER_ENDPOINTS) or f"{MQTT_BROKER}:{MQTT_PORT}", MQTT_PORT)
+        except ValueError as e:
+            _LOGGER.error(f"Invalid broker endpoints, using {MQTT_BROKER}: {e}")
+            self._endpoints = parse_endpoints(f"{MQTT_BROKER}:{MQTT_PORT}", MQTT_PORT)
+        self._connect_stats = ConnectStats()
+        # Circuit breaker key (shared by all clients of the same endpoint list)
+        self._broker_host = ",".join(str(ep) for ep in self._endpoints) or MQTT_BROKER
         self._connect_lock = asyncio.Lock()
         self._reconnect_attempts = 0
         self._is_connected = False
         self._stopping = False
         self._connected_event = asyncio.Event()
         self._online: bool = False
-        self._offline_timer_unsub: Optional[Callable] = None
+        self.last_seen: float = 0.0 # time.monotonic() of the last parsed frame (checked by the shared watchdog)
         self._reconnect_task: Optional[asyncio.Task] = None
         self._shutdown = False
-        self._analytics = LumentreeAnalytics() if 'LumentreeAnalytics' in globals() else None
+        # Trends and built-in alerts come from the shared fleet step, not per device
+        self._analytics = LumentreeAnalytics(
+            alert_rules=entry.options.get(CONF_ALERT_RULES), trends=False, builtin_alerts=False
+        )
+        self._energy_store: Store = Store(hass, ENERGY_STORAGE_VERSION, ENERGY_STORAGE_KEY_FORMAT.format(device_sn=self._device_sn))
+        self._energy_restored = False
+        self._raw_frames = RawFrameBuffer()
+        self._recorder: Optional[FrameRecorder] = None
+        self._fleet = async_get_fleet(hass)
+        self._read_planner = ModbusReadPlanner(extra_keys={*self._analytics.alerts.input_keys, *FLEET_INPUT_KEYS})
+        self._last_frames: Dict[int, ParsedFrame] = {} # Previous ParsedFrame per read range start, for change detection
+        self._commands = ModbusCommandQueue(self._publish_command)
+        republish_mode = entry.options.get(CONF_REPUBLISH_MODE, REPUBLISH_OFF)
+        self._republisher = FrameRepublisher(
+            hass, self._device_sn, republish_mode, entry.options.get(CONF_REPUBLISH_PREFIX, DEFAULT_REPUBLISH_PREFIX)
+        ) if republish_mode != REPUBLISH_OFF else None
+        self._read_planner_unsub: Optional[Callable] = None
 
     @property
     def is_connected(self) -> bool:
         return self._is_connected
 
-    def _cancel_offline_timer(self):
-        """Cancel the offline timer if it's active."""
-        if self._offline_timer_unsub:
-            _LOGGER.debug(f"Cancelling offline timer {self._client_id}")
-            try:
-                self._offline_timer_unsub()
-            except Exception as e:
-                 _LOGGER.warning(f"Error cancelling timer {self._client_id}: {e}")
-            self._offline_timer_unsub = None
+    @property
+    def analytics(self) -> Optional[LumentreeAnalytics]:
+        return self._analytics
+
+    @property
+    def raw_frames(self) -> RawFrameBuffer:
+        """Recent raw frames, for diagnostics only."""
+        return self._raw_frames
+
+    async def async_restore_energy(self) -> None:
+        """Load persisted daily energy totals (once per client)."""
+        if self._energy_restored or not self._analytics:
+            return
+        self._energy_restored = True
+        try:
+            stored = await self._energy_store.async_load()
+        except Exception as e:
+            _LOGGER.warning(f"Failed load energy totals {self._device_sn}: {e}")
+            stored = None
+        self._analytics.energy.restore(stored, dt_util.now())
+
+    @callback
+    def async_start_recording(self, path: str) -> None:
+        """Start recording incoming frames to a binary frame log."""
+        self._recorder = FrameRecorder(path)
+        _LOGGER.info(f"Recording MQTT frames {self._device_sn} -> {path}")
+
+    async def async_stop_recording(self) -> int:
+        """Stop recording, flush the log and return the number of recorded frames."""
+        recorder, self._recorder = self._recorder, None
+        if not recorder:
+            return 0
+        await self.hass.async_add_executor_job(recorder.flush)
+        _LOGGER.info(f"Recorded {recorder.frames} MQTT frames {self._device_sn} -> {recorder.path}")
+        return recorder.frames
+
+    async def async_replay(self, path: str, speed: Optional[float] = None) -> Dict[str, Any]:
+        """Replay a frame log through parser, a fresh analytics instance and dispatch.
+
+        Results go to the replay signal ({signal}_replay), never to the live entities.
+        """
+        return await async_replay_frames(
+            path, parse_mqtt_payload, LumentreeAnalytics(),
+            partial(async_dispatcher_send, self.hass, f"{self._signal_update}_replay"), speed,
+        )
+
+    @callback
+    def async_reconcile_energy(
+        self, http_totals: Dict[str, Optional[float]], sample_time: Optional[datetime] = None
+    ) -> Dict[str, float]:
+        """Reconcile integrated energy with HTTP daily totals (requested at sample_time) and dispatch the result."""
+        if not self._analytics:
+            return {k: v for k, v in http_totals.items() if v is not None}
+        totals = self._analytics.energy.reconcile(http_totals, dt_util.now(), sample_time)
+        self._energy_store.async_delay_save(self._analytics.energy.as_dict, ENERGY_SAVE_DELAY_SECONDS)
+        async_dispatcher_send(self.hass, self._signal_update, dict(totals))
+        return totals
 
     @callback
     def _set_offline(self, *args):
         """Set status to offline and dispatch update."""
         _LOGGER.info(f"MQTT data timeout or disconnect {self._client_id}. Offline.")
-        self._cancel_offline_timer()
         if self._online:
             self._online = False
             async_dispatcher_send(self.hass, self._signal_update, {KEY_ONLINE_STATUS: False})
 
-    def _start_offline_timer(self):
-        """Start or restart the offline timer."""
-        self._cancel_offline_timer()
-        _LOGGER.debug(f"Start offline timer ({OFFLINE_TIMEOUT_SECONDS}s) {self._client_id}")
-        self._offline_timer_unsub = async_call_later(
-            self.hass, OFFLINE_TIMEOUT_SECONDS, self._set_offline
-        )
+    @property
+    def online(self) -> bool:
+        return self._online
+
+    @property
+    def command_stats(self) -> Dict[str, Any]:
+        """Read pipeline metrics (requests, timeouts, retries, round-trip latency)."""
+        return self._commands.as_dict()
+
+    @property
+    def connect_stats(self) -> Optional[Dict[str, Any]]:
+        """Broker race results: connect times and chosen endpoints."""
+        return self._connect_stats.as_dict()
+
+    @property
+    def republish_stats(self) -> Optional[Dict[str, int]]:
+        return self._republisher.metrics if self._republisher else None
+
+    @property
+    def read_planner(self) -> ModbusReadPlanner:
+        return self._read_planner
+
+    async def _async_prepare_connect(self) -> None:
+        """Restore state and register with the shared planner/watchdog/fleet (idempotent)."""
+        await self.async_restore_energy()
+        if self._read_planner_unsub is None:
+            self._read_planner_unsub = self._read_planner.async_track_registry(self.hass, self.entry)
+        async_get_watchdog(self.hass).async_register(self._device_sn, self)
+        self._fleet.async_register(self._device_sn)
 
     async def connect(self) -> None:
         """Establish MQTT connection."""
+        await self._async_prepare_connect()
         async with self._connect_lock:
             if self._is_connected:
                 _LOGGER.debug(f"MQTT connected {self._device_sn}.")
                 return
             self._stopping = False
             self._connected_event.clear()
-            self._mqttc = paho.Client(client_id=self._client_id, protocol=paho.MQTTv311, callback_api_version=paho.CallbackAPIVersion.VERSION1)
-            self._mqttc.username_pw_set(username=MQTT_USERNAME, password=MQTT_PASSWORD)
-            self._mqttc.on_connect=self._on_connect
-            self._mqttc.on_disconnect=self._on_disconnect
-            self._mqttc.on_message=self._on_message
-            _LOGGER.info(f"MQTT connect: {MQTT_BROKER}:{MQTT_PORT} (Client: {self._client_id}) for SN: {self._device_sn}")
+            global paho
+            if paho is None:
+                paho = await self.hass.async_add_executor_job(_import_paho)
             try:
-                await self.hass.async_add_executor_job(self._mqttc.connect, MQTT_BROKER, MQTT_PORT, MQTT_KEEPALIVE)
-                self._mqttc.loop_start()
-                _LOGGER.info(f"MQTT loop started {self._client_id}. Wait CONNACK {CONNECT_TIMEOUT}s.")
-                try:
-                    await asyncio.wait_for(self._connected_event.wait(), timeout=CONNECT_TIMEOUT)
-                    if not self._is_connected:
-                        raise ConnectionRefusedError("MQTT refused.")
-                    _LOGGER.info(f"MQTT connected {self._client_id}.")
-                except asyncio.TimeoutError:
-                    _LOGGER.error(f"MQTT timeout {self._client_id}.")
-                    await self.disconnect()
-                    raise ConnectionRefusedError("MQTT timeout.")
+                _LOGGER.info(f"MQTT connect: {self._broker_host} (Client: {self._client_id}) for SN: {self._device_sn}")
+                result, endpoint, _address = await async_race_connect(
+                    self.hass, self._endpoints, self._connect_stats,
+                    lambda ep, address, index: self._async_connect_candidate(address, ep.port, index, ep.username, ep.password),
+                    self._discard_candidate, CONNECT_TIMEOUT,
+                )
+                self._adopt_client(*result)
+                _LOGGER.info(f"MQTT connected {self._client_id} via {endpoint}.")
             except Exception as e:
                 _LOGGER.error(f"Failed MQTT connect {self._client_id}: {e}")
-                if self._mqttc:
-                    try:
-                        self._mqttc.loop_stop()
-                        _LOGGER.debug(f"MQTT loop stopped after failure {self._client_id}.")
-                    except Exception as se:
-                        _LOGGER.warning(f"Loop stop err: {se}")
                 self._mqttc = None
                 self._is_connected = False
                 self._connected_event.set()
                 if isinstance(e, ConnectionRefusedError):
                     raise
+                if isinstance(e, asyncio.TimeoutError):
+                    raise ConnectionRefusedError("MQTT timeout.") from e
                 raise ConnectionRefusedError(f"MQTT setup error: {e}") from e
 
+    async def _async_connect_candidate(self, host: str, port: int, index: int,
+                                       username: Optional[str] = None, password: Optional[str] = None):
+        """Connect one paho client to one address and wait for CONNACK; returns (client, client_id)."""
+        client_id = self._client_id
+        if index:
+            try: # Parallel attempts need distinct IDs or the broker drops the earlier session
+                client_id = MQTT_CLIENT_ID_FORMAT.format(device_id=self._device_id, timestamp=self._client_timestamp + index)
+            except KeyError:
+                client_id = f"{self._client_id}-{index}"
+        client = paho.Client(client_id=client_id, protocol=paho.MQTTv311, callback_api_version=paho.CallbackAPIVersion.VERSION1)
+        client.username_pw_set(username=username or MQTT_USERNAME, password=password if username else MQTT_PASSWORD)
+        connack: asyncio.Future = self.hass.loop.create_future()
+
+        def _set_connack(rc: int) -> None:
+            if not connack.done():
+                connack.set_result(rc)
+
+        client.on_connect = lambda c, userdata, flags, rc, properties=None: self.hass.loop.call_soon_threadsafe(_set_connack, rc)
+        client.on_disconnect = lambda c, userdata, rc, properties=None: self.hass.loop.call_soon_threadsafe(_set_connack, rc or -1)
+        connect_job = self.hass.async_add_executor_job(client.connect, host, port, MQTT_KEEPALIVE)
+        try:
+            await asyncio.shield(connect_job) # A blocking connect cannot be interrupted; close it once it returns
+            client.loop_start()
+            rc = await connack
+        except asyncio.CancelledError:
+            connect_job.add_done_callback(lambda _job: self.hass.async_add_executor_job(_close_client, client))
+            raise
+        except Exception:
+            self.hass.async_add_executor_job(_close_client, client)
+            raise
+        if rc != paho.CONNACK_ACCEPTED:
+            self.hass.async_add_executor_job(_close_client, client)
+            raise ConnectionRefusedError(f"MQTT refused by {host}:{port} (rc={rc}): {CONNACK_ERRORS.get(rc, 'Unk')}")
+        return client, client_id
+
+    def _discard_candidate(self, result) -> None:
+        """Close a candidate that connected after another one already won."""
+        self.hass.async_add_executor_job(_close_client, result[0])
+
+    def _adopt_client(self, client, client_id: str) -> None:
+        """Make the race winner the active client: attach the callbacks and subscribe."""
+        client.on_message = self._on_message
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        if not client.is_connected():
+            self.hass.async_add_executor_job(_close_client, client)
+            raise ConnectionRefusedError("MQTT connection lost right after CONNACK.")
+        self._mqttc = client
+        self._client_id = client_id
+        self._reconnect_attempts = 0
+        self._is_connected = True
+        result, mid = client.subscribe(self._topic_sub, 0)
+        _LOGGER.debug(f"Sub {'OK' if result==0 else 'Fail'} {self._topic_sub} (mid={mid})")
+        self._connected_event.set()
+
     def _on_connect(self, client, userdata, flags, rc, properties=None):
         """Callback when connection is established."""
         if rc == paho.CONNACK_ACCEPTED:
@@ -163,8 +327,7 @@ class LumentreeMqttClient:
             finally:
                 self.hass.loop.call_soon_threadsafe(self._connected_event.set)
         else:
-            err_map={1:"Proto",2:"ID Rej",3:"Srv Unavail",4:"Bad User/Pass",5:"No Auth"}
-            err=err_map.get(rc,'Unk')
+            err=CONNACK_ERRORS.get(rc,'Unk')
             _LOGGER.error(f"MQTT refused {self._client_id} (rc={rc}): {err}.")
             self._is_connected = False
             self.hass.loop.call_soon_threadsafe(self._connected_event.set)
@@ -176,8 +339,7 @@ class LumentreeMqttClient:
         """Callback when disconnected."""
         was_online = self._online
         self._is_connected = False
-        self._cancel_offline_timer()
-        self._set_offline()
+        self.hass.loop.call_soon_threadsafe(self._set_offline)
         if rc == 0:
             _LOGGER.info(f"MQTT disconnect OK {self._client_id}.")
         else:
@@ -186,36 +348,82 @@ class LumentreeMqttClient:
             self._schedule_reconnect()
 
     def _schedule_reconnect(self):
-        """Schedules an asynchronous reconnection attempt with exponential backoff."""
-        if self._reconnect_attempts < MAX_RECONNECT_ATTEMPTS:
+        """Schedule reconnection from a paho thread."""
+        self.hass.loop.call_soon_threadsafe(self.async_schedule_reconnect)
+
+    @callback
+    def async_schedule_reconnect(self):
+        """Start the reconnect loop unless it is already running."""
+        if self._stopping or (self._reconnect_task and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = self.hass.async_create_background_task(
+            self._async_reconnect_loop(), f"lumentree_mqtt_reconnect_{self._device_sn}"
+        )
+
+    async def _async_reconnect_loop(self):
+        """Full-jitter backoff, gated by the broker's shared circuit breaker; retries indefinitely."""
+        breaker = async_get_breaker(self.hass, self._broker_host)
+        while not self._stopping and not self._is_connected:
             self._reconnect_attempts += 1
-            delay = min(RECONNECT_DELAY_SECONDS * (2 ** (self._reconnect_attempts - 1)), 60)
-            _LOGGER.info(f"Schedule MQTT reconn {self._reconnect_attempts}/{MAX_RECONNECT_ATTEMPTS} {self._client_id} in {delay}s.")
-            self.hass.async_create_task(self._async_reconnect(delay))
-        else:
-            _LOGGER.error(f"MQTT reconn failed {self._client_id}.")
-            self.hass.loop.call_soon_threadsafe(async_dispatcher_send, self.hass, self._signal_update, {"error": "MQTT_reconnect_failed"})
-
-    async def _async_reconnect(self, delay: float):
-        """Waits for the delay and attempts reconnection."""
-        await asyncio.sleep(delay)
-        if not self.is_connected and not self._stopping and self._mqttc:
-             _LOGGER.debug(f"Try MQTT reconn job {self._client_id}...")
-             try:
-                 await self.hass.async_add_executor_job(self._mqttc.reconnect)
-             except Exception as e:
-                 _LOGGER.warning(f"MQTT reconn job fail {self._client_id}: {e}")
-
-    def _on_message(self, client, userdata, msg: MQTTMessage):
-        """Callback when a message is received."""
-        topic = msg.topic
+            if self._reconnect_attempts <= MAX_RECONNECT_ATTEMPTS:
+                delay = full_jitter_delay(self._reconnect_attempts, RECONNECT_DELAY_SECONDS, RECONNECT_MAX_DELAY_SECONDS)
+            else:
+                if self._reconnect_attempts == MAX_RECONNECT_ATTEMPTS + 1:
+                    _LOGGER.error(f"MQTT reconn failed {MAX_RECONNECT_ATTEMPTS}x {self._client_id}, slow retries every ~{SLOW_RETRY_SECONDS}s.")
+                    async_dispatcher_send(self.hass, self._signal_update, {"error": "MQTT_reconnect_failed"})
+                delay = random.uniform(SLOW_RETRY_SECONDS / 2, SLOW_RETRY_SECONDS)
+            _LOGGER.info(f"Schedule MQTT reconn {self._reconnect_attempts} {self._client_id} in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            if self._stopping or self._is_connected:
+                break
+            probe = await breaker.async_acquire()
+            if self._stopping or self._is_connected:
+                breaker.record_success(probe)
+                break
+            try:
+                await self._async_reconnect_once()
+            except asyncio.CancelledError:
+                breaker.release(probe) # Unloading mid-attempt must not leave the breaker waiting on a lost probe
+                raise
+            except Exception as e:
+                _LOGGER.warning(f"MQTT reconn fail {self._client_id}: {e}")
+                breaker.record_failure(probe)
+            else:
+                breaker.record_success(probe)
+
+    async def _async_reconnect_once(self):
+        """One reconnect attempt: drop the old client and race the endpoints again (last winner first)."""
+        old_client, self._mqttc = self._mqttc, None
+        if old_client:
+            _LOGGER.debug(f"Try MQTT reconn race {self._client_id}...")
+            old_client.on_connect = old_client.on_disconnect = old_client.on_message = None
+            await self.hass.async_add_executor_job(_close_client, old_client)
+        await self.connect()
+
+    def _on_message(self, client, userdata, msg: "MQTTMessage"):
+        """Callback when a message is received (paho thread)."""
+        self.hass.loop.call_soon_threadsafe(self._handle_message, msg.topic, msg.payload)
+
+    @callback
+    def _handle_message(self, topic: str, payload_bytes: bytes, transaction_id: Optional[int] = None):
+        """Process a received message in the event loop (transaction_id: echoed by Modbus TCP gateways)."""
         try:
-            payload_bytes = msg.payload
-            payload_hex = ''.join(f'{b:02x}' for b in payload_bytes) if payload_bytes else ""
-            _LOGGER.debug(f"MQTT msg recv {self._client_id}: T='{topic}', P='{payload_hex[:60]}...' (Len: {len(payload_bytes)})")
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug(f"MQTT msg recv {self._client_id}: T='{topic}', P='{payload_bytes[:30].hex()}...' (Len: {len(payload_bytes)})")
 
             if topic == self._topic_sub:
-                parsed_data = parse_mqtt_payload(payload_hex)
+                self._raw_frames.append(payload_bytes)
+                register_count = modbus_response_register_count(payload_bytes)
+                pending = self._commands.match_response(register_count, transaction_id)
+                if register_count is not None and pending is None:
+                    # Late (timed out) or foreign response: its start register is unknown
+                    _LOGGER.debug(f"Unmatched read response {self._client_id} ({register_count} registers), dropped")
+                    return
+                if self._recorder and self._recorder.record(topic, payload_bytes, start_address=pending.start if pending else 0):
+                    self.hass.async_add_executor_job(self._recorder.flush)
+                parsed_data = parse_mqtt_payload(payload_bytes, pending.start if pending else 0)
+                if pending:
+                    self._commands.complete(pending, parsed_data)
                 if parsed_data:
                     _LOGGER.debug(f"Parsed data {topic} ({self._client_id}): {parsed_data}")
 
@@ -225,44 +433,61 @@ class LumentreeMqttClient:
                         self._online = True
                         parsed_data[KEY_ONLINE_STATUS] = True # Send True on first successful parse
                         send_online_true = True
-                    self._start_offline_timer()
-
-                    # Add raw hex data if needed
-                    try:
-                        parsed_data[KEY_LAST_RAW_MQTT] = payload_hex[:255]
-                    except NameError:
-                        pass
-
-                    # Add analytics data
-                    if self._analytics:
-                        analytics_data = await self.hass.async_add_executor_job(
-                            self._analytics.update_data, parsed_data
-                        )
-                        parsed_data.update(analytics_data)
-                        _LOGGER.debug(f"Added analytics data: {list(analytics_data.keys())}")
-
-                    _LOGGER.info(f"📊 Parsed {len(parsed_data)} data points for {self._device_sn}")
-                    self.hass.bus.fire(f"{DOMAIN}_data_received", {"device_sn": self._device_sn, "data": parsed_data})
-                    async_dispatcher_send(self.hass, self._signal_update, parsed_data)
+                    self.last_seen = time.monotonic()
+
+                    # Battery cell frame: replace the raw cell array by its statistics
+                    cells = parsed_data.pop(KEY_BATTERY_CELLS, None)
+                    if cells is not None and self._analytics:
+                        parsed_data.update(self._analytics.update_cells(cells))
+                        parsed_data["battery_cell_info"] = f"{len(cells)} cells"
+                    # Main frames: analytics run once per poll on the merged sample (async_request_data)
+
+                    if isinstance(parsed_data, ParsedFrame):
+                        changed = parsed_data.changed_since(self._last_frames.get(parsed_data.start_address))
+                        self._last_frames[parsed_data.start_address] = parsed_data
+                    else:
+                        changed = set(parsed_data)
+                    _LOGGER.debug(f"📊 Parsed frame for {self._device_sn}: {len(changed)} changed keys")
+                    self._async_publish_update(parsed_data, changed)
 
             else:
                 _LOGGER.warning(f"Unexpected topic {self._client_id}: {topic}")
         except Exception as e:
             _LOGGER.exception(f"Error proc MQTT msg {topic} {self._client_id}")
 
-    async def _publish_command(self, command_hex: str) -> bool:
-        """Internal helper to publish a hex command."""
+    @callback
+    def _async_publish_update(self, data: Dict[str, Any], changed) -> None:
+        """Republish and fire the changed keys, then dispatch the update to the entities."""
+        if changed and self._republisher:
+            self._republisher.async_add({k: data[k] for k in changed})
+        if changed:
+            self.hass.bus.async_fire(f"{DOMAIN}_data_received", {"device_sn": self._device_sn, "data": {k: data[k] for k in changed}})
+        async_dispatcher_send(self.hass, self._signal_update, data)
+
+    @callback
+    def _async_process_sample(self, sample: ChainMap) -> None:
+        """Run analytics (incl. integrated daily energy) once on the merged frames of one poll."""
+        if not self._analytics:
+            return
+        analytics_data = self._analytics.update_data(sample, dt_util.now())
+        self._fleet.async_record(self._device_sn, sample)
+        self._energy_store.async_delay_save(self._analytics.energy.as_dict, ENERGY_SAVE_DELAY_SECONDS)
+        sample.maps[0].update(analytics_data)
+        _LOGGER.debug(f"Added analytics data: {list(analytics_data.keys())}")
+        self._async_publish_update(sample.maps[0], set(sample.maps[0]))
+
+    async def _publish_command(self, command_hex: str, transaction_id: Optional[int] = None) -> bool:
+        """Internal helper to publish a hex command (paho publish only queues, no executor hop; no transaction ids)."""
         if not self.is_connected or not self._mqttc:
             _LOGGER.error(f"MQTT not conn {self._client_id}, cannot pub.")
             return False
         _LOGGER.debug(f"Pub to {self._topic_pub} ({self._client_id}): {command_hex}")
         try:
             payload_bytes = bytes.fromhex(command_hex)
-            publish_task = partial(self._mqttc.publish, self._topic_pub, payload=payload_bytes, qos=0)
-            msg_info = await self.hass.async_add_executor_job(publish_task)
+            msg_info = self._mqttc.publish(self._topic_pub, payload=payload_bytes, qos=0)
 
             if msg_info is None or msg_info.rc != paho.MQTT_ERR_SUCCESS:
-                 _LOGGER.error(f"MQTT pub fail {self._client_id} RC: {msg_info.rc if msg_info else 'Executor Error'}")
+                 _LOGGER.error(f"MQTT pub fail {self._client_id} RC: {msg_info.rc if msg_info else 'None'}")
                  return False
             else:
                  _LOGGER.debug(f"Pub OK (mid={msg_info.mid}) {self._client_id}")
@@ -274,34 +499,59 @@ class LumentreeMqttClient:
             _LOGGER.error(f"Failed MQTT pub {self._client_id}: {e}")
             return False
 
-    async def async_request_data(self):
-        """Requests the main device data (registers 0-94)."""
-        start_address = 0
-        num_registers = NUM_MAIN_REGISTERS_TO_READ # Should be 95
-        slave_id = 1
-        func_code = 3
-        command_hex = generate_modbus_read_command(slave_id, func_code, start_address, num_registers)
-        if command_hex:
-            await self._publish_command(command_hex)
-        else:
-            _LOGGER.error(f"Failed gen Modbus read (0-{num_registers-1}) {self._client_id}.")
-
-    async def async_request_battery_cells(self):
-        """Requests the battery cell data."""
-        start, count, sid, fc = REG_ADDR_CELL_START, REG_ADDR_CELL_COUNT, 1, 3
-        command_hex = generate_modbus_read_command(sid, fc, start, count)
-        if command_hex:
-            await self._publish_command(command_hex)
-        else:
-            _LOGGER.error(f"Failed gen Modbus read ({start}-{start+count-1}) {self._client_id}.")
+    async def async_request_data(self) -> Optional[ChainMap]:
+        """Requests the main device data (planned ranges within 0-94, pipelined).
+
+        Returns the decoded frames as one mapping (with derived and analytics keys), or None
+        if no range was answered.
+        """
+        ranges = self._read_planner.main_ranges
+        results = await asyncio.gather(
+            *(self._commands.async_read(start, count) for start, count in ranges), return_exceptions=True
+        )
+        frames = []
+        for (start, count), result in zip(ranges, results):
+            if isinstance(result, BaseException):
+                _LOGGER.warning(f"Modbus read ({start}-{start+count-1}) {self._client_id} failed: {result!r}")
+            elif result:
+                frames.append(result)
+        if not frames:
+            return None
+        sample = merge_frames(frames)
+        self._async_process_sample(sample)
+        return sample
+
+    async def async_request_battery_cells(self) -> Optional[Dict[str, Any]]:
+        """Requests the battery cell data (skipped when no cell entity is enabled)."""
+        cell_range = self._read_planner.cell_range
+        if not cell_range:
+            _LOGGER.debug(f"No battery cell entities enabled, skip cell read {self._client_id}.")
+            return None
+        start, count = cell_range
+        try:
+            return await self._commands.async_read(start, count)
+        except (CommandTimeout, CommandPublishError, ValueError) as e:
+            _LOGGER.warning(f"Modbus read ({start}-{start+count-1}) {self._client_id} failed: {e}")
+            return None
 
     async def disconnect(self) -> None:
         """Disconnects the MQTT client and cleans up timers."""
         _LOGGER.info(f"Disconnect MQTT req {self._client_id}.")
+        await self.async_stop_recording()
         self._stopping = True
+        if self._reconnect_task and not self._reconnect_task.done():
+            self._reconnect_task.cancel()
+        self._reconnect_task = None
+        self._commands.cancel_all()
+        if self._republisher:
+            self._republisher.async_stop()
+        if self._read_planner_unsub:
+            self._read_planner_unsub()
+            self._read_planner_unsub = None
         self._reconnect_attempts = MAX_RECONNECT_ATTEMPTS
         self._connected_event.set()
-        self._cancel_offline_timer()
+        async_get_watchdog(self.hass).async_unregister(self._device_sn)
+        self._fleet.async_unregister(self._device_sn)
         self._set_offline()
 
         mqttc_to_disconnect = None
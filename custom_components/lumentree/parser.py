@@ -2,32 +2,57 @@
 """Parser for Lumentree MQTT data."""
 import logging
 import struct
-from typing import Dict, Any, Optional
+from array import array
+from collections import ChainMap
+from collections.abc import Iterable, Mapping, MutableMapping
+import sys
+from typing import Dict, Any, Iterator, Optional, Set, Tuple, Union
 
 _LOGGER = logging.getLogger(__name__)
 
-try:
-    import crcmod.predefined
-    CRC_AVAILABLE = True
-    _LOGGER.info("crcmod module loaded successfully")
-except ImportError as e:
-    CRC_AVAILABLE = False
-    _LOGGER.error(f"ImportError parser.py: {e}")
-    _LOGGER.error("Please install crcmod: pip install crcmod")
+from .const import REG_ADDR_CELL_START, REG_ADDR_CELL_COUNT
 
-def verify_crc(data: bytes) -> bool:
-    """Verify CRC of the data."""
-    if not CRC_AVAILABLE:
-        _LOGGER.warning("CRC verification skipped - crcmod not available")
-        return True
-    
-    try:
-        crc_func = crcmod.predefined.mkCrcFun('crc-16')
-        # Implementation depends on your specific CRC requirements
-        return True
-    except Exception as e:
-        _LOGGER.error(f"CRC verification failed: {e}")
-        return False
+KEY_BATTERY_CELLS = "battery_cells"
+
+# Main block fields: key -> (register, register count, scale, signed). Count 5 = ASCII string, 2 = uint32
+REGISTER_FIELDS: Dict[str, Tuple[int, int, float, bool]] = {
+    "mqtt_device_sn": (3, 5, 1, False),
+    "battery_voltage": (11, 1, 0.01, False),
+    "battery_current": (12, 1, 0.01, True),
+    "ac_output_voltage": (13, 1, 0.1, False),
+    "grid_voltage": (15, 1, 0.1, False),
+    "ac_output_frequency": (16, 1, 0.01, False),
+    "ac_output_power": (18, 1, 1, False),
+    "pv1_voltage": (20, 1, 0.1, False),
+    "pv1_power": (22, 1, 1, False),
+    "device_temperature": (24, 1, 0.1, True),
+    "battery_temperature": (25, 1, 0.1, True),
+    "inverter_temperature": (26, 1, 0.1, True),
+    "battery_status": (37, 1, 1, False),
+    "grid_status": (38, 1, 1, False),
+    "fault_code": (39, 2, 1, False),
+    "battery_soc": (50, 1, 1, False),
+    "ac_input_voltage": (53, 1, 0.1, False),
+    "ac_input_frequency": (54, 1, 0.01, False),
+    "ac_input_power": (55, 1, 1, False),
+    "ac_output_va": (58, 1, 1, False),
+    "grid_power": (59, 1, 1, True),
+    "battery_power": (61, 1, 1, True),
+    "load_power": (67, 1, 1, False),
+    "is_ups_mode": (68, 1, 1, False),
+    "pv2_voltage": (72, 1, 0.1, False),
+    "pv2_power": (74, 1, 1, False),
+    "battery_type": (80, 1, 1, False),
+    "battery_mode": (81, 1, 1, False),
+    "work_mode": (82, 1, 1, False),
+    "master_slave_status": (83, 1, 1, False),
+    "beep_mode": (85, 1, 1, False),
+    "backlight_mode": (86, 1, 1, False),
+}
+# Derived keys -> source keys (summed)
+DERIVED_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "pv_power": ("pv1_power", "pv2_power"),
+}
 
 def _read_register(data: bytes, offset: int, length: int = 2) -> int:
     """Read register value from data."""
@@ -47,17 +72,224 @@ def _read_register(data: bytes, offset: int, length: int = 2) -> int:
         _LOGGER.error(f"Error reading register: {e}")
         return 0
 
-def parse_mqtt_payload(payload: bytes) -> Dict[str, Any]:
+def _modbus_read_data(payload: bytes) -> Optional[memoryview]:
+    """Return the register data of a Modbus read response (addr, fc, len, data, crc) as a view of the payload."""
+    if len(payload) >= 5 and payload[1] in (3, 4) and payload[2] == len(payload) - 5:
+        return memoryview(payload)[3:3 + payload[2]]
+    return None
+
+def modbus_response_register_count(payload: bytes) -> Optional[int]:
+    """Number of registers carried by a Modbus read response, None for other frames."""
+    data = _modbus_read_data(payload)
+    return len(data) // 2 if data is not None else None
+
+def _build_crc16_modbus_table() -> Tuple[int, ...]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+_CRC16_MODBUS_TABLE = _build_crc16_modbus_table()
+
+def crc16_modbus(data: bytes) -> int:
+    """CRC-16/MODBUS (no crcmod needed)."""
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC16_MODBUS_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+def verify_crc(data: bytes) -> bool:
+    """Check the trailing CRC-16/MODBUS (little-endian) of an RTU frame."""
+    return len(data) >= 4 and crc16_modbus(data[:-2]) == int.from_bytes(data[-2:], "little")
+
+def generate_modbus_read_command(slave_id: int, func_code: int, address: int, count: int) -> Optional[str]:
+    """Build a Modbus RTU read command (hex string, CRC little-endian)."""
+    try:
+        frame = struct.pack('>BBHH', slave_id, func_code, address, count)
+    except struct.error as e:
+        _LOGGER.error(f"Invalid Modbus read command ({slave_id}, {func_code}, {address}, {count}): {e}")
+        return None
+    return (frame + struct.pack('<H', crc16_modbus(frame))).hex()
+
+def decode_battery_cells(data: Union[bytes, memoryview], count: int = REG_ADDR_CELL_COUNT) -> array:
+    """Decode the cell register block in one shot into a compact array of mV (unused cells dropped)."""
+    usable = min(count, len(data) // 2)
+    cells = array('H')
+    cells.frombytes(data[:usable * 2])
+    if sys.byteorder == 'little':
+        cells.byteswap() # Registers are big-endian
+    # Unpopulated cell slots read as 0 (or 0xFFFF); packs fill cells from index 0
+    end = len(cells)
+    while end and cells[end - 1] in (0, 0xFFFF):
+        end -= 1
+    return cells[:end]
+
+_MISSING = object()
+
+def _decode_field(view: memoryview, offset: int, count: int, scale: float, signed: bool) -> Any:
+    """Decode one field starting at byte offset of a register block."""
+    if count == 5:
+        return bytes(view[offset:offset + 10]).decode("ascii", "ignore").strip("\x00 ")
+    if count == 2:
+        value = struct.unpack_from(">i" if signed else ">I", view, offset)[0]
+    else:
+        value = struct.unpack_from(">h" if signed else ">H", view, offset)[0]
+    if scale == 1:
+        return value
+    return round(value * scale, 3)
+
+class ParsedFrame(MutableMapping):
+    """Lazy view of a register block: fields are decoded on first access and cached.
+
+    The block is a memoryview of the received payload (no copy is made).
+
+    Behaves like the dict previously returned by parse_mqtt_payload; keys added by
+    consumers (online status, analytics) live in a small overlay dict.
+    """
+
+    __slots__ = ("_view", "_start", "_end", "_cache", "_extra")
+
+    def __init__(self, data: Union[bytes, memoryview], start_address: int = 0):
+        self._view = memoryview(data)
+        self._start = start_address
+        self._end = start_address + len(self._view) // 2
+        self._cache: Dict[str, Any] = {}
+        self._extra: Dict[str, Any] = {}
+
+    @property
+    def start_address(self) -> int:
+        return self._start
+
+    def _has_field(self, key: str) -> bool:
+        spec = REGISTER_FIELDS.get(key)
+        if spec is not None:
+            return self._start <= spec[0] and spec[0] + spec[1] <= self._end
+        sources = DERIVED_FIELDS.get(key)
+        return sources is not None and all(self._has_field(src) for src in sources)
+
+    def _raw(self, key: str) -> Optional[memoryview]:
+        spec = REGISTER_FIELDS.get(key)
+        if spec is None or not self._has_field(key):
+            return None
+        offset = (spec[0] - self._start) * 2
+        return self._view[offset:offset + spec[1] * 2]
+
+    def _decode(self, key: str) -> Any:
+        spec = REGISTER_FIELDS.get(key)
+        if spec is not None:
+            if not self._has_field(key):
+                return _MISSING
+            address, count, scale, signed = spec
+            return _decode_field(self._view, (address - self._start) * 2, count, scale, signed)
+        sources = DERIVED_FIELDS.get(key)
+        if sources is not None:
+            return sum(self[src] for src in sources) if self._has_field(key) else _MISSING
+        return _MISSING
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._extra:
+            return self._extra[key]
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._decode(key)
+            if value is _MISSING:
+                raise KeyError(key)
+            self._cache[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in self._extra:
+            del self._extra[key]
+        elif self._has_field(key):
+            raise KeyError(f"Register field {key} is read-only")
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._extra or (isinstance(key, str) and self._has_field(key))
+
+    def _field_keys(self) -> Iterator[str]:
+        for key in REGISTER_FIELDS:
+            if self._has_field(key) and key not in self._extra:
+                yield key
+        for key in DERIVED_FIELDS:
+            if self._has_field(key) and key not in self._extra:
+                yield key
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._field_keys()
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._field_keys()) + len(self._extra)
+
+    def __bool__(self) -> bool:
+        return self._end > self._start or bool(self._extra)
+
+    def changed_since(self, previous: Optional["ParsedFrame"]) -> Set[str]:
+        """Keys whose raw registers (or overlay values) differ from the previous frame of the same range."""
+        if previous is None or (previous._start, previous._end) != (self._start, self._end):
+            return set(self)
+        changed: Set[str] = set()
+        for key in REGISTER_FIELDS:
+            raw = self._raw(key)
+            if raw is not None and raw != previous._raw(key):
+                changed.add(key)
+        for key, sources in DERIVED_FIELDS.items():
+            if not changed.isdisjoint(sources):
+                changed.add(key)
+        for key, value in self._extra.items():
+            if previous._extra.get(key, _MISSING) != value:
+                changed.add(key)
+        return changed
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Fully decoded copy."""
+        return {key: self[key] for key in self}
+
+    def __repr__(self) -> str:
+        return f"ParsedFrame(start={self._start}, registers={self._end - self._start}, decoded={len(self._cache)}, extra={list(self._extra)})"
+
+def derived_fields(data: Mapping[str, Any]) -> Dict[str, Any]:
+    """Derived keys computable from a mapping (e.g. the frames of one poll merged); all sources required."""
+    return {
+        key: sum(data[src] for src in sources)
+        for key, sources in DERIVED_FIELDS.items() if all(src in data for src in sources)
+    }
+
+def merge_frames(frames: Iterable[Mapping[str, Any]]) -> ChainMap:
+    """Frames of one poll as one mapping; derived keys (and later analytics) sit in a writable front map."""
+    sample: ChainMap = ChainMap({}, *frames)
+    sample.maps[0].update(derived_fields(sample))
+    return sample
+
+def parse_mqtt_payload(payload: Union[bytes, str], start_address: int = 0) -> Union[ParsedFrame, Dict[str, Any]]:
     """Parse MQTT payload from Lumentree device."""
     if not payload:
         _LOGGER.error("Empty payload received")
         return {}
     
     try:
-        # Verify CRC if available
-        if not verify_crc(payload):
-            _LOGGER.warning("CRC verification failed")
-        
+        if isinstance(payload, str):
+            payload = bytes.fromhex(payload)
+
+        # Battery cell block response (by the requested start, not the length): decode cells only
+        register_data = _modbus_read_data(payload)
+        if register_data is not None and not verify_crc(payload):
+            _LOGGER.warning(f"CRC mismatch in Modbus response ({len(payload)} bytes), frame dropped")
+            return {}
+        if register_data is not None and start_address == REG_ADDR_CELL_START:
+            return {KEY_BATTERY_CELLS: decode_battery_cells(register_data)}
+        # Main block response: lazy frame view over the register data
+        if register_data is not None:
+            return ParsedFrame(register_data, start_address)
+
         # Parse the payload based on Lumentree protocol
         parsed_data = {}
         
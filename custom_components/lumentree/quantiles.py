@@ -0,0 +1,162 @@
+# /config/custom_components/lumentree/quantiles.py
+# Mergeable fixed-memory quantile sketches (KLL) and hourly sketch windows for percentile statistics
+
+import math
+import random
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+QUANTILE_SKETCH_K = 100 # Top-level compactor size; rank error ~1.7% at k=100, memory ~3 * k (~300) values
+QUANTILE_WINDOW_SECONDS = 3600
+QUANTILE_WINDOWS = 24 # Hourly sketches kept (merged on query)
+QUANTILE_REPORTED = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+_COMPACTOR_DECAY = 2.0 / 3.0
+
+
+class KllSketch:
+    """KLL quantile sketch: bounded memory for any number of samples, mergeable.
+
+    Level h holds values of weight 2**h. A full level is sorted and every other value
+    (random offset) is promoted to the next level, so memory stays about 3 * k values
+    regardless of how many samples were added.
+    """
+
+    def __init__(self, k: int = QUANTILE_SKETCH_K, rng: Optional[random.Random] = None):
+        self.k = k
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._rng = rng or random.Random()
+        self._levels: List[array] = [array('d')]
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - level - 1
+        return max(2, int(math.ceil(self.k * _COMPACTOR_DECAY ** depth)))
+
+    def _grow(self) -> None:
+        self._levels.append(array('d'))
+        self._max_size = sum(self._capacity(level) for level in range(len(self._levels)))
+
+    def _compress(self) -> None:
+        for level in range(len(self._levels)):
+            if len(self._levels[level]) < self._capacity(level):
+                continue
+            if level + 1 == len(self._levels):
+                self._grow()
+            ordered = sorted(self._levels[level])
+            # An odd value out stays at this level
+            self._levels[level] = array('d', ordered[-1:] if len(ordered) % 2 else ())
+            if len(ordered) % 2:
+                ordered.pop()
+            self._levels[level + 1].extend(ordered[self._rng.random() < 0.5::2])
+            self._size = sum(len(items) for items in self._levels)
+            if self._size < self._max_size:
+                break
+
+    def add(self, value: float) -> None:
+        self._levels[0].append(value)
+        self.count += 1
+        self._size += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other: "KllSketch") -> "KllSketch":
+        """Fold another sketch into this one (in place) and return self."""
+        while len(self._levels) < len(other._levels):
+            self._grow()
+        for level, items in enumerate(other._levels):
+            self._levels[level].extend(items)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._size = sum(len(items) for items in self._levels)
+        while self._size >= self._max_size:
+            self._compress()
+        return self
+
+    @classmethod
+    def merged(cls, sketches: Iterable["KllSketch"], k: int = QUANTILE_SKETCH_K) -> "KllSketch":
+        result = cls(k)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Approximate values at the given ranks (0..1); None when empty."""
+        if not self.count:
+            return [None] * len(qs)
+        weighted = sorted(
+            (value, 1 << level) for level, items in enumerate(self._levels) for value in items
+        )
+        total = sum(weight for _, weight in weighted)
+        results: Dict[float, float] = {}
+        pending = sorted(qs)
+        cumulative, i = 0, 0
+        for value, weight in weighted:
+            cumulative += weight
+            while i < len(pending) and cumulative >= pending[i] * total:
+                results[pending[i]] = value
+                i += 1
+            if i == len(pending):
+                break
+        for q in pending[i:]:
+            results[q] = self.max
+        return [self.min if q <= 0 else self.max if q >= 1 else results[q] for q in qs]
+
+    def summary(self) -> Dict[str, Any]:
+        values = self.quantiles([q for _, q in QUANTILE_REPORTED])
+        summary: Dict[str, Any] = {name: round(value, 2) for (name, _), value in zip(QUANTILE_REPORTED, values)}
+        summary['samples'] = self.count
+        return summary
+
+    @property
+    def retained(self) -> int:
+        return self._size
+
+
+class QuantileWindows:
+    """One sketch per metric per hour; a period query merges the hours it covers."""
+
+    def __init__(self, metrics: Sequence[str], window_seconds: float = QUANTILE_WINDOW_SECONDS,
+                 windows: int = QUANTILE_WINDOWS, k: int = QUANTILE_SKETCH_K):
+        self.metrics = tuple(metrics)
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self.k = k
+        self._windows: List[Tuple[float, List[KllSketch]]] = []
+
+    def add(self, ts: float, values: Sequence[Optional[float]]) -> None:
+        """Add one sample (values in metric order, None = missing)."""
+        start = ts - ts % self.window_seconds
+        if not self._windows or self._windows[-1][0] != start:
+            self._windows.append((start, [KllSketch(self.k) for _ in self.metrics]))
+            del self._windows[:-self.windows]
+        for sketch, value in zip(self._windows[-1][1], values):
+            if value is not None:
+                sketch.add(value)
+
+    def merged(self, since: float) -> Dict[str, KllSketch]:
+        """Per-metric sketch over all windows overlapping [since, now]."""
+        selected = [sketches for start, sketches in self._windows if start + self.window_seconds > since]
+        return {
+            metric: KllSketch.merged((sketches[i] for sketches in selected), self.k)
+            for i, metric in enumerate(self.metrics)
+        }
+
+    @property
+    def retained(self) -> int:
+        return sum(sketch.retained for _, sketches in self._windows for sketch in sketches)
+
+    def reset(self) -> None:
+        self._windows.clear()
+
+
+def summarise_sketches(sketches: Dict[str, KllSketch]) -> Dict[str, Dict[str, Any]]:
+    """p50/p90/p99 per metric, skipping metrics without samples."""
+    return {metric: sketch.summary() for metric, sketch in sketches.items() if sketch.count}
@@ -0,0 +1,119 @@
+# /config/custom_components/lumentree/read_planner.py
+# Computes the minimal Modbus register ranges needed by enabled entities and analytics
+
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+
+from .const import _LOGGER, CONF_DEVICE_SN
+
+from .parser import REGISTER_FIELDS, DERIVED_FIELDS, REG_ADDR_CELL_START, REG_ADDR_CELL_COUNT
+
+MAX_REGISTERS_PER_READ = 125 # Modbus limit for function 3
+DEFAULT_MERGE_GAP = 8 # Read over gaps up to this many registers instead of issuing another request
+
+# Data key -> (first register, register count) in the main block (0-94)
+REGISTER_MAP: Dict[str, Tuple[int, int]] = {key: (spec[0], spec[1]) for key, spec in REGISTER_FIELDS.items()}
+# Derived data keys -> source keys
+DERIVED_KEYS: Dict[str, Tuple[str, ...]] = DERIVED_FIELDS
+CELL_KEYS = ("battery_cell_info", "battery_cells")
+CELL_KEY_PREFIX = "battery_cell_"
+ANOMALY_SUFFIX = "_anomaly"
+
+# Inputs the analytics layer needs regardless of which entities are enabled
+ANALYTICS_KEYS: Tuple[str, ...] = (
+    "pv_power", "battery_power", "load_power", "grid_power", "battery_status",
+    "battery_soc", "battery_voltage", "battery_temperature", "inverter_temperature",
+    "device_temperature", "fault_code",
+)
+
+
+def merge_ranges(registers: Iterable[Tuple[int, int]], max_gap: int = DEFAULT_MERGE_GAP,
+                 max_count: int = MAX_REGISTERS_PER_READ) -> List[Tuple[int, int]]:
+    """Merge (start, count) spans separated by at most max_gap registers."""
+    merged: List[Tuple[int, int]] = []
+    for start, count in sorted(registers):
+        end = start + count
+        if merged:
+            m_start, m_count = merged[-1]
+            m_end = m_start + m_count
+            if start - m_end <= max_gap and max(end, m_end) - m_start <= max_count:
+                merged[-1] = (m_start, max(end, m_end) - m_start)
+                continue
+        merged.append((start, count))
+    return merged
+
+
+class ModbusReadPlanner:
+    """Minimal register read plan for a set of wanted data keys."""
+
+    def __init__(self, max_gap: int = DEFAULT_MERGE_GAP, include_analytics: bool = True,
+                 extra_keys: Iterable[str] = ()):
+        self.max_gap = max_gap
+        self.include_analytics = include_analytics
+        self.extra_keys: Set[str] = set(extra_keys) # e.g. inputs of custom alert rules
+        self.wanted_keys: Optional[Set[str]] = None # None = everything (no registry info yet)
+        self.main_ranges: List[Tuple[int, int]] = []
+        self.read_cells = True
+        self.rebuild(None)
+
+    def rebuild(self, wanted_keys: Optional[Iterable[str]]) -> None:
+        """Recompute the plan; wanted_keys=None reads every known register."""
+        self.wanted_keys = set(wanted_keys) if wanted_keys is not None else None
+        if self.wanted_keys is None:
+            keys: Set[str] = set(REGISTER_MAP)
+            self.read_cells = True
+        else:
+            keys = set(self.wanted_keys)
+            if self.include_analytics:
+                keys.update(ANALYTICS_KEYS)
+                keys.update(self.extra_keys)
+            self.read_cells = any(k in CELL_KEYS or k.startswith(CELL_KEY_PREFIX) for k in keys)
+        for key in list(keys):
+            if key.endswith(ANOMALY_SUFFIX): # Anomaly sensors need their source metric
+                keys.add(key[:-len(ANOMALY_SUFFIX)])
+        for key in list(keys):
+            keys.update(DERIVED_KEYS.get(key, ()))
+        spans = [REGISTER_MAP[k] for k in keys if k in REGISTER_MAP]
+        self.main_ranges = merge_ranges(spans, self.max_gap)
+        _LOGGER.debug(f"Read plan: main={self.main_ranges} ({self.register_count} regs), cells={self.read_cells}")
+
+    @property
+    def register_count(self) -> int:
+        return sum(count for _, count in self.main_ranges)
+
+    @property
+    def cell_range(self) -> Optional[Tuple[int, int]]:
+        return (REG_ADDR_CELL_START, REG_ADDR_CELL_COUNT) if self.read_cells else None
+
+    @callback
+    def async_rebuild_from_registry(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        """Rebuild the plan from the entities of this entry enabled in the entity registry."""
+        registry = er.async_get(hass)
+        prefix = f"{entry.data.get(CONF_DEVICE_SN)}_"
+        entries = er.async_entries_for_config_entry(registry, entry.entry_id)
+        if not entries:
+            self.rebuild(None)
+            return
+        self.rebuild(
+            reg.unique_id[len(prefix):] for reg in entries
+            if reg.disabled_by is None and reg.unique_id.startswith(prefix)
+        )
+
+    @callback
+    def async_track_registry(self, hass: HomeAssistant, entry: ConfigEntry):
+        """Rebuild when one of this entry's entities is enabled, disabled, added or removed."""
+        registry = er.async_get(hass)
+
+        @callback
+        def _registry_updated(event: Event) -> None:
+            entity_entry = registry.async_get(event.data["entity_id"])
+            if event.data["action"] != "remove" and (entity_entry is None or entity_entry.config_entry_id != entry.entry_id):
+                return
+            self.async_rebuild_from_registry(hass, entry)
+
+        self.async_rebuild_from_registry(hass, entry)
+        return hass.bus.async_listen(er.EVENT_ENTITY_REGISTRY_UPDATED, _registry_updated)
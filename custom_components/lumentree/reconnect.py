@@ -0,0 +1,141 @@
+# /config/custom_components/lumentree/reconnect.py
+# Full-jitter reconnect backoff and a fleet-wide circuit breaker per broker host
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN, _LOGGER
+
+DATA_BREAKERS = "broker_breakers"
+
+BREAKER_FAILURE_THRESHOLD = 5 # Consecutive failures (any client) that open the breaker
+BREAKER_PROBE_INTERVAL = 30.0 # First wait before a probe once open
+BREAKER_MAX_PROBE_INTERVAL = 300.0 # Probe interval doubles up to this while the broker stays down
+BREAKER_RAMP_PER_SECOND = 2.0 # Clients released per second after the breaker closes
+STORM_WINDOW_SECONDS = 60.0
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+
+
+def full_jitter_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2^(attempt-1)))."""
+    return random.uniform(0, min(cap, base * (2 ** max(attempt - 1, 0))))
+
+
+class BrokerCircuitBreaker:
+    """Shared by all clients of one broker host.
+
+    Closed: attempts pass, paced to BREAKER_RAMP_PER_SECOND. Open: everybody waits
+    except a single probe per interval; a successful probe closes the breaker and
+    the waiting clients are released in a paced ramp.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+        self._probe_interval = BREAKER_PROBE_INTERVAL
+        self._next_probe = 0.0
+        self._next_slot = 0.0
+        self._closed = asyncio.Event()
+        self._closed.set()
+        self._recent_attempts: Deque[float] = deque()
+        self.metrics: Dict[str, Any] = {
+            "attempts": 0, "successes": 0, "failures": 0, "opens": 0, "probes": 0,
+            "waiting": 0, "peak_attempts_per_window": 0,
+        }
+
+    def _record_attempt(self, now: float) -> None:
+        self.metrics["attempts"] += 1
+        self._recent_attempts.append(now)
+        while self._recent_attempts and self._recent_attempts[0] < now - STORM_WINDOW_SECONDS:
+            self._recent_attempts.popleft()
+        self.metrics["peak_attempts_per_window"] = max(self.metrics["peak_attempts_per_window"], len(self._recent_attempts))
+
+    async def async_acquire(self) -> bool:
+        """Wait until a connection attempt is allowed; returns True if this attempt is the probe."""
+        self.metrics["waiting"] += 1
+        try:
+            while True:
+                now = time.monotonic()
+                if self.state == STATE_CLOSED:
+                    slot = max(now, self._next_slot)
+                    self._next_slot = slot + 1.0 / BREAKER_RAMP_PER_SECOND
+                    if slot > now:
+                        await asyncio.sleep(slot - now)
+                    self._record_attempt(time.monotonic())
+                    return False
+                if not self._probe_in_flight and now >= self._next_probe:
+                    self._probe_in_flight = True
+                    self.metrics["probes"] += 1
+                    self._record_attempt(now)
+                    _LOGGER.info(f"Broker {self.host} breaker open, sending probe")
+                    return True
+                try:
+                    await asyncio.wait_for(self._closed.wait(), timeout=max(self._next_probe - now, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.metrics["waiting"] -= 1
+
+    @callback
+    def record_success(self, probe: bool = False) -> None:
+        self.metrics["successes"] += 1
+        self._consecutive_failures = 0
+        if probe:
+            self._probe_in_flight = False
+        if self.state != STATE_CLOSED:
+            _LOGGER.info(f"Broker {self.host} reachable again, closing breaker ({self.metrics['waiting']} clients ramping)")
+            self.state = STATE_CLOSED
+            self._probe_interval = BREAKER_PROBE_INTERVAL
+            self._next_slot = time.monotonic()
+            self._closed.set()
+
+    @callback
+    def record_failure(self, probe: bool = False) -> None:
+        self.metrics["failures"] += 1
+        self._consecutive_failures += 1
+        now = time.monotonic()
+        if probe:
+            self._probe_in_flight = False
+            self._probe_interval = min(self._probe_interval * 2, BREAKER_MAX_PROBE_INTERVAL)
+            self._next_probe = now + random.uniform(0.5, 1.0) * self._probe_interval
+        elif self.state == STATE_CLOSED and self._consecutive_failures >= BREAKER_FAILURE_THRESHOLD:
+            self.state = STATE_OPEN
+            self.metrics["opens"] += 1
+            self._next_probe = now + random.uniform(0.5, 1.0) * self._probe_interval
+            self._closed.clear()
+            _LOGGER.warning(f"Broker {self.host} breaker opened after {self._consecutive_failures} failures")
+
+    @callback
+    def release(self, probe: bool = False) -> None:
+        """Give back an attempt that ended without an outcome (cancelled); an unfinished probe may be resent."""
+        if probe:
+            self._probe_in_flight = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "attempts_last_window": len(self._recent_attempts),
+            **self.metrics,
+        }
+
+
+@callback
+def async_get_breaker(hass: HomeAssistant, host: str) -> BrokerCircuitBreaker:
+    """Return the shared circuit breaker for a broker host."""
+    breakers = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_BREAKERS, {})
+    breaker = breakers.get(host)
+    if breaker is None:
+        breaker = breakers[host] = BrokerCircuitBreaker(host)
+    return breaker
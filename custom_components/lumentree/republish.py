@@ -0,0 +1,96 @@
+# /config/custom_components/lumentree/republish.py
+# Republishes decoded frames (changed values only, batched) to the local broker of HA's MQTT integration
+
+import asyncio
+import json
+import logging
+import time
+from array import array
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import _LOGGER
+
+CONF_REPUBLISH_MODE = "republish_mode"
+CONF_REPUBLISH_PREFIX = "republish_prefix"
+REPUBLISH_OFF = "off"
+REPUBLISH_PER_KEY = "per_key" # <prefix>/<sn>/<key>, retained, plain value
+REPUBLISH_PACKED = "packed" # <prefix>/<sn>/frame, one compact JSON object per batch
+REPUBLISH_MODES = (REPUBLISH_OFF, REPUBLISH_PER_KEY, REPUBLISH_PACKED)
+DEFAULT_REPUBLISH_PREFIX = "lumentree"
+REPUBLISH_BATCH_SECONDS = 1.0
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, array):
+        return value.tolist()
+    return str(value)
+
+
+def encode_value(value: Any) -> str:
+    """Per-key payload: plain text for scalars, compact JSON otherwise."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float, str)):
+        return str(value)
+    return json.dumps(value, separators=(",", ":"), default=_json_default)
+
+
+class FrameRepublisher:
+    """Collects changed values per device and publishes them in batches."""
+
+    def __init__(self, hass: HomeAssistant, device_sn: str, mode: str, prefix: str = DEFAULT_REPUBLISH_PREFIX):
+        self.hass = hass
+        self.mode = mode
+        self._base_topic = f"{prefix.rstrip('/')}/{device_sn}"
+        self._pending: Dict[str, Any] = {}
+        self._unsub_flush: Optional[Callable] = None
+        self._warned_unavailable = False
+        self.metrics: Dict[str, int] = {"batches": 0, "messages": 0, "values": 0, "skipped_no_mqtt": 0}
+
+    @callback
+    def async_add(self, values: Mapping[str, Any]) -> None:
+        """Queue changed values; later values for the same key replace earlier ones."""
+        if not values:
+            return
+        self._pending.update(values)
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(self.hass, REPUBLISH_BATCH_SECONDS, self._async_flush)
+
+    async def _async_flush(self, _now=None) -> None:
+        self._unsub_flush = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        if "mqtt" not in self.hass.config.components:
+            self.metrics["skipped_no_mqtt"] += 1
+            if not self._warned_unavailable:
+                self._warned_unavailable = True
+                _LOGGER.warning("Republish enabled but the MQTT integration is not set up; skipping")
+            return
+        from homeassistant.components import mqtt # Only needed when republishing is enabled
+
+        if self.mode == REPUBLISH_PACKED:
+            payload = json.dumps({"ts": round(time.time(), 3), **batch}, separators=(",", ":"), default=_json_default)
+            publishes = [mqtt.async_publish(self.hass, f"{self._base_topic}/frame", payload, 0, False)]
+        else:
+            publishes = [
+                mqtt.async_publish(self.hass, f"{self._base_topic}/{key}", encode_value(value), 0, True)
+                for key, value in batch.items()
+            ]
+        results = await asyncio.gather(*publishes, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            _LOGGER.warning(f"Republish to {self._base_topic} failed for {len(errors)} messages: {errors[0]!r}")
+        self.metrics["batches"] += 1
+        self.metrics["messages"] += len(publishes) - len(errors)
+        self.metrics["values"] += len(batch)
+
+    @callback
+    def async_stop(self) -> None:
+        if self._unsub_flush:
+            self._unsub_flush()
+            self._unsub_flush = None
+        self._pending.clear()
@@ -4,10 +4,11 @@ from __future__ import annotations
 
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import DOMAIN
+from .state_writer import DEFAULT_DEADBAND, async_get_state_writer
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -30,3 +31,16 @@ class LumentreeSensor(SensorEntity):
     def state(self):
         """Return the state of the sensor."""
         return self._state
+
+    @callback
+    def async_set_state(self, value) -> None:
+        """Write a new state through the shared deadband filter and coalesced writes."""
+        async_get_state_writer(self.hass).async_schedule_write(self, value, DEFAULT_DEADBAND, self._set_state)
+
+    @callback
+    def _set_state(self, value) -> None:
+        self._state = value
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Stop tracking the entity in the state writer."""
+        async_get_state_writer(self.hass).async_forget(self.entity_id)
@@ -0,0 +1,177 @@
+# /config/custom_components/lumentree/services.py
+# Analytics services declared in services.yaml (export, reset, statistics, frame recording and replay)
+
+import json
+import logging
+from typing import Any, Dict
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse, callback
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, _LOGGER, CONF_DEVICE_SN
+
+from .quantiles import KllSketch, summarise_sketches
+
+SERVICE_EXPORT = "export_analytics_data"
+SERVICE_RESET = "reset_analytics"
+SERVICE_STATS = "get_analytics_stats"
+SERVICE_CURVES = "get_daily_curves"
+SERVICE_START_RECORDING = "start_frame_recording"
+SERVICE_STOP_RECORDING = "stop_frame_recording"
+SERVICE_REPLAY = "replay_frames"
+ATTR_DEVICE_SN = "device_sn"
+ATTR_FILE_PATH = "file_path"
+ATTR_PERIOD_HOURS = "period_hours"
+ATTR_RESOLUTION_SECONDS = "resolution_seconds"
+ATTR_DATE = "date"
+ATTR_SPEED = "speed"
+
+DEVICE_SCHEMA = vol.Schema({vol.Required(ATTR_DEVICE_SN): cv.string})
+STATS_SCHEMA = vol.Schema({vol.Optional(ATTR_DEVICE_SN): cv.string})
+CURVES_SCHEMA = DEVICE_SCHEMA.extend({vol.Optional(ATTR_DATE): cv.date})
+RECORDING_SCHEMA = DEVICE_SCHEMA.extend({vol.Optional(ATTR_FILE_PATH, default="lumentree_frames.bin"): cv.string})
+REPLAY_SCHEMA = RECORDING_SCHEMA.extend({vol.Optional(ATTR_SPEED): vol.All(vol.Coerce(float), vol.Range(min=0))})
+EXPORT_SCHEMA = DEVICE_SCHEMA.extend({
+    vol.Optional(ATTR_FILE_PATH, default="lumentree_export.json"): cv.string,
+    vol.Optional(ATTR_PERIOD_HOURS, default=24): vol.All(vol.Coerce(float), vol.Range(min=0.1, max=24 * 90)),
+    vol.Optional(ATTR_RESOLUTION_SECONDS, default=60): vol.All(vol.Coerce(float), vol.Range(min=0)),
+})
+
+
+@callback
+def _all_entry_data(hass: HomeAssistant) -> Dict[str, Dict[str, Any]]:
+    """Runtime data of all loaded entries, by device serial."""
+    found: Dict[str, Dict[str, Any]] = {}
+    for entry_id, entry_data in hass.data.get(DOMAIN, {}).items():
+        if not isinstance(entry_data, dict) or "mqtt_client" not in entry_data:
+            continue
+        entry = hass.config_entries.async_get_entry(entry_id)
+        if entry:
+            found[entry.data.get(CONF_DEVICE_SN)] = entry_data
+    return found
+
+
+@callback
+def _all_analytics(hass: HomeAssistant) -> Dict[str, Any]:
+    """Analytics instances of all loaded entries, by device serial."""
+    return {
+        device_sn: entry_data["mqtt_client"].analytics
+        for device_sn, entry_data in _all_entry_data(hass).items() if entry_data["mqtt_client"].analytics
+    }
+
+
+@callback
+def _get_analytics(hass: HomeAssistant, device_sn: str):
+    """Analytics instance of the entry whose device serial matches."""
+    analytics = _all_analytics(hass).get(device_sn)
+    if analytics is None:
+        raise HomeAssistantError(f"No Lumentree device with serial {device_sn}")
+    return analytics
+
+
+@callback
+def _get_client(hass: HomeAssistant, device_sn: str):
+    """Register client (MQTT or local Modbus) of the entry whose device serial matches."""
+    entry_data = _all_entry_data(hass).get(device_sn)
+    if entry_data is None:
+        raise HomeAssistantError(f"No Lumentree device with serial {device_sn}")
+    return entry_data["mqtt_client"]
+
+
+@callback
+def _allowed_path(hass: HomeAssistant, file_path: str) -> str:
+    """Absolute path below the config directory, rejected when not allowed."""
+    path = hass.config.path(file_path)
+    if not hass.config.is_allowed_path(path):
+        raise HomeAssistantError(f"Path not allowed: {path}")
+    return path
+
+
+@callback
+def _fleet_statistics(hass: HomeAssistant) -> Dict[str, Any]:
+    """Fleet percentiles: the devices' sketches merged per metric."""
+    devices = _all_analytics(hass)
+    merged: Dict[str, KllSketch] = {}
+    for analytics in devices.values():
+        for metric, sketch in analytics.quantile_sketches().items():
+            merged.setdefault(metric, KllSketch(sketch.k)).merge(sketch)
+    return {"devices": sorted(devices), "quantiles": summarise_sketches(merged)}
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, separators=(",", ":"))
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration services (once)."""
+    if hass.services.has_service(DOMAIN, SERVICE_STATS):
+        return
+
+    async def _async_export(call: ServiceCall) -> ServiceResponse:
+        analytics = _get_analytics(hass, call.data[ATTR_DEVICE_SN])
+        export = analytics.export_history(call.data[ATTR_PERIOD_HOURS] * 3600, call.data[ATTR_RESOLUTION_SECONDS])
+        path = _allowed_path(hass, call.data[ATTR_FILE_PATH])
+        await hass.async_add_executor_job(_write_json, path, {"device_sn": call.data[ATTR_DEVICE_SN], **export})
+        _LOGGER.info(f"Exported {len(export['points'])} points ({export['resolution_seconds']}s) to {path}")
+        return {"path": path, "points": len(export["points"]), "resolution_seconds": export["resolution_seconds"]}
+
+    async def _async_reset(call: ServiceCall) -> None:
+        _get_analytics(hass, call.data[ATTR_DEVICE_SN]).reset_history()
+
+    async def _async_stats(call: ServiceCall) -> ServiceResponse:
+        if ATTR_DEVICE_SN not in call.data:
+            return _fleet_statistics(hass)
+        return _get_analytics(hass, call.data[ATTR_DEVICE_SN]).get_statistics()
+
+    async def _async_curves(call: ServiceCall) -> ServiceResponse:
+        entry_data = _all_entry_data(hass).get(call.data[ATTR_DEVICE_SN])
+        coordinator = entry_data.get("stats_coordinator") if entry_data else None
+        if coordinator is None:
+            raise HomeAssistantError(f"No Lumentree device with serial {call.data[ATTR_DEVICE_SN]}")
+        day = call.data.get(ATTR_DATE) or dt_util.now().date()
+        await coordinator.curves.async_load()
+        curves = coordinator.curves.as_dict(day)
+        if curves is None:
+            raise HomeAssistantError(f"No intraday curves cached for {day}")
+        return curves
+
+    async def _async_start_recording(call: ServiceCall) -> None:
+        client = _get_client(hass, call.data[ATTR_DEVICE_SN])
+        path = _allowed_path(hass, call.data[ATTR_FILE_PATH])
+        await client.async_stop_recording() # Flush a running recording first
+        client.async_start_recording(path)
+
+    async def _async_stop_recording(call: ServiceCall) -> ServiceResponse:
+        return {"frames": await _get_client(hass, call.data[ATTR_DEVICE_SN]).async_stop_recording()}
+
+    async def _async_replay(call: ServiceCall) -> ServiceResponse:
+        client = _get_client(hass, call.data[ATTR_DEVICE_SN])
+        path = _allowed_path(hass, call.data[ATTR_FILE_PATH])
+        try:
+            return await client.async_replay(path, call.data.get(ATTR_SPEED))
+        except (OSError, ValueError) as e:
+            raise HomeAssistantError(f"Cannot replay {path}: {e}") from e
+
+    hass.services.async_register(DOMAIN, SERVICE_EXPORT, _async_export, schema=EXPORT_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, SERVICE_RESET, _async_reset, schema=DEVICE_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_STATS, _async_stats, schema=STATS_SCHEMA, supports_response=SupportsResponse.ONLY)
+    hass.services.async_register(DOMAIN, SERVICE_CURVES, _async_curves, schema=CURVES_SCHEMA, supports_response=SupportsResponse.ONLY)
+    hass.services.async_register(DOMAIN, SERVICE_START_RECORDING, _async_start_recording, schema=RECORDING_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_STOP_RECORDING, _async_stop_recording, schema=DEVICE_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, SERVICE_REPLAY, _async_replay, schema=REPLAY_SCHEMA, supports_response=SupportsResponse.ONLY)
+
+
+@callback
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Remove the integration services (after the last entry unloads)."""
+    for service in (
+        SERVICE_EXPORT, SERVICE_RESET, SERVICE_STATS, SERVICE_CURVES,
+        SERVICE_START_RECORDING, SERVICE_STOP_RECORDING, SERVICE_REPLAY,
+    ):
+        hass.services.async_remove(DOMAIN, service)
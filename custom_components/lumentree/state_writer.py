@@ -0,0 +1,227 @@
+# /config/custom_components/lumentree/state_writer.py
+# Deadband filtering and coalesced state writes (one event-loop tick per frame), with a timed heartbeat
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+
+from .const import DOMAIN, _LOGGER
+
+DATA_STATE_WRITER = "state_writer"
+HEARTBEAT_CHECK_SECONDS = 30 # How often entities due a heartbeat write are looked for
+
+
+@dataclass(frozen=True)
+class Deadband:
+    """Write filter for one entity: absolute/percent deadband, min interval and heartbeat (seconds)."""
+    absolute: float = 0.0
+    percent: float = 0.0
+    min_interval: float = 10.0
+    heartbeat: float = 300.0
+
+
+DEFAULT_DEADBAND = Deadband()
+# Binary/alert states are written on every change, without rate limiting
+CHANGE_ONLY_DEADBAND = Deadband(min_interval=0.0, heartbeat=0.0)
+
+# Per-key deadbands; keys not listed use DEFAULT_DEADBAND (exact change + min interval)
+DEADBANDS: Dict[str, Deadband] = {
+    "pv_power": Deadband(absolute=10.0, percent=1.0),
+    "pv1_power": Deadband(absolute=10.0, percent=1.0),
+    "pv2_power": Deadband(absolute=10.0, percent=1.0),
+    "battery_power": Deadband(absolute=10.0, percent=1.0),
+    "load_power": Deadband(absolute=10.0, percent=1.0),
+    "grid_power": Deadband(absolute=10.0, percent=1.0),
+    "ac_output_power": Deadband(absolute=10.0, percent=1.0),
+    "ac_output_va": Deadband(absolute=10.0, percent=1.0),
+    "ac_input_power": Deadband(absolute=10.0, percent=1.0),
+    "battery_voltage": Deadband(absolute=0.1),
+    "battery_current": Deadband(absolute=0.2),
+    "pv1_voltage": Deadband(absolute=1.0),
+    "pv2_voltage": Deadband(absolute=1.0),
+    "grid_voltage": Deadband(absolute=1.0),
+    "ac_output_voltage": Deadband(absolute=1.0),
+    "ac_input_voltage": Deadband(absolute=1.0),
+    "ac_output_frequency": Deadband(absolute=0.05),
+    "ac_input_frequency": Deadband(absolute=0.05),
+    "device_temperature": Deadband(absolute=0.5),
+    "battery_soc": Deadband(absolute=1.0, min_interval=0.0),
+    "pv_today": Deadband(absolute=0.01, min_interval=30.0),
+    "charge_today": Deadband(absolute=0.01, min_interval=30.0),
+    "discharge_today": Deadband(absolute=0.01, min_interval=30.0),
+    "grid_in_today": Deadband(absolute=0.01, min_interval=30.0),
+    "load_today": Deadband(absolute=0.01, min_interval=30.0),
+}
+
+
+def get_deadband(key: str) -> Deadband:
+    return DEADBANDS.get(key, DEFAULT_DEADBAND)
+
+
+class StateWriteCoalescer:
+    """Filters entity state writes through deadbands and flushes accepted ones in a single loop tick.
+
+    A timer writes the latest value of every entity whose last write is older than its
+    heartbeat, so the recorder gets a row even while no new value arrives.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._pending: Dict[str, Entity] = {}
+        self._last: Dict[str, Tuple[Any, float]] = {} # entity_id -> (written value, monotonic ts)
+        # Latest value seen per entity (written or not), for the heartbeat
+        self._latest: Dict[str, Tuple[Entity, Any, Optional[Callable[[Any], None]], Deadband]] = {}
+        self._unsub_heartbeat: Optional[Callable[[], None]] = None
+        # Latest value held back by min_interval, written when the interval has passed
+        self._trailing: Dict[str, Tuple[Entity, Any, Optional[Callable[[Any], None]]]] = {}
+        self._trailing_unsub: Dict[str, Callable[[], None]] = {}
+        self._flush_scheduled = False
+        self.writes = 0
+        self.suppressed = 0
+        self.trailing_writes = 0
+        self.heartbeat_writes = 0
+        self.flushes = 0
+
+    @staticmethod
+    def _outside_deadband(old: Any, new: Any, deadband: Deadband) -> bool:
+        if old is None or new is None or isinstance(new, bool) or not isinstance(new, (int, float)) or not isinstance(old, (int, float)):
+            return old != new
+        delta = abs(new - old)
+        if delta == 0:
+            return False
+        if deadband.absolute and delta < deadband.absolute:
+            return False
+        if deadband.percent and old and delta * 100.0 / abs(old) < deadband.percent:
+            return False
+        return True
+
+    def _write_delay(self, entity_id: str, value: Any, deadband: Deadband, now: float) -> Optional[float]:
+        """Seconds until the value may be written (0 = now), None when it is inside the deadband."""
+        last = self._last.get(entity_id)
+        if last is None:
+            return 0.0
+        last_value, last_ts = last
+        elapsed = now - last_ts
+        if deadband.heartbeat and elapsed >= deadband.heartbeat:
+            return 0.0
+        if not self._outside_deadband(last_value, value, deadband):
+            return None
+        return max(deadband.min_interval - elapsed, 0.0)
+
+    @callback
+    def async_schedule_write(self, entity: Entity, value: Any, deadband: Optional[Deadband] = None,
+                             apply: Optional[Callable[[Any], None]] = None) -> bool:
+        """Queue a state write for the entity if the new value passes its deadband.
+
+        apply(value) sets the entity state and is only called for values that get written,
+        so entity and recorder state never disagree. A value held back by min_interval is
+        written once the interval has passed (unless a later value falls back inside the deadband).
+        """
+        now = time.monotonic()
+        entity_id = entity.entity_id
+        deadband = deadband or DEFAULT_DEADBAND
+        self._latest[entity_id] = (entity, value, apply, deadband)
+        if self._unsub_heartbeat is None:
+            self._unsub_heartbeat = async_track_time_interval(
+                self.hass, self._async_heartbeat, timedelta(seconds=HEARTBEAT_CHECK_SECONDS)
+            )
+        delay = self._write_delay(entity_id, value, deadband, now)
+        if delay is None:
+            self._trailing.pop(entity_id, None)
+            self.suppressed += 1
+            return False
+        if delay > 0:
+            self._trailing[entity_id] = (entity, value, apply)
+            if entity_id not in self._trailing_unsub:
+                self._trailing_unsub[entity_id] = async_call_later(self.hass, delay, partial(self._async_write_trailing, entity_id))
+            self.suppressed += 1
+            return False
+        self._trailing.pop(entity_id, None)
+        self._write(entity, value, apply, now)
+        return True
+
+    @callback
+    def _write(self, entity: Entity, value: Any, apply: Optional[Callable[[Any], None]], now: float) -> None:
+        if apply is not None:
+            apply(value)
+        self._last[entity.entity_id] = (value, now)
+        self._pending[entity.entity_id] = entity
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.hass.loop.call_soon(self._flush)
+
+    @callback
+    def _async_write_trailing(self, entity_id: str, _now: Any = None) -> None:
+        """Write the value held back by min_interval."""
+        self._trailing_unsub.pop(entity_id, None)
+        trailing = self._trailing.pop(entity_id, None)
+        if trailing is None or trailing[0].hass is None:
+            return
+        entity, value, apply = trailing
+        self._write(entity, value, apply, time.monotonic())
+        self.trailing_writes += 1
+
+    @callback
+    def _async_heartbeat(self, _now: Any = None) -> None:
+        """Write the latest value of entities not written for longer than their heartbeat."""
+        now = time.monotonic()
+        for entity_id, (entity, value, apply, deadband) in list(self._latest.items()):
+            last = self._last.get(entity_id)
+            if not deadband.heartbeat or last is None or now - last[1] < deadband.heartbeat or entity.hass is None:
+                continue
+            self._trailing.pop(entity_id, None)
+            self._write(entity, value, apply, now)
+            self.heartbeat_writes += 1
+
+    @callback
+    def _flush(self) -> None:
+        """Write all states queued during this tick."""
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        for entity in pending.values():
+            if entity.hass is None:
+                continue
+            entity.async_write_ha_state()
+            self.writes += 1
+        self.flushes += 1
+
+    @callback
+    def async_forget(self, entity_id: str) -> None:
+        """Drop tracking for a removed entity."""
+        self._last.pop(entity_id, None)
+        self._latest.pop(entity_id, None)
+        self._pending.pop(entity_id, None)
+        self._trailing.pop(entity_id, None)
+        if (unsub := self._trailing_unsub.pop(entity_id, None)) is not None:
+            unsub()
+        if not self._latest and self._unsub_heartbeat is not None:
+            self._unsub_heartbeat()
+            self._unsub_heartbeat = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        total = self.writes + self.suppressed
+        return {
+            "writes": self.writes,
+            "suppressed_writes": self.suppressed,
+            "trailing_writes": self.trailing_writes,
+            "heartbeat_writes": self.heartbeat_writes,
+            "flushes": self.flushes,
+            "suppressed_ratio": round(self.suppressed / total, 3) if total else 0.0,
+        }
+
+
+@callback
+def async_get_state_writer(hass: HomeAssistant) -> StateWriteCoalescer:
+    """Return the integration-wide state write coalescer."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    writer = domain_data.get(DATA_STATE_WRITER)
+    if writer is None:
+        writer = domain_data[DATA_STATE_WRITER] = StateWriteCoalescer(hass)
+    return writer
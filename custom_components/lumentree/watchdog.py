@@ -0,0 +1,67 @@
+# /config/custom_components/lumentree/watchdog.py
+# Shared online watchdog: frames store a last-seen timestamp, one coarse periodic sweep flips devices offline
+
+import logging
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import DOMAIN, _LOGGER, DEFAULT_POLLING_INTERVAL
+
+DATA_WATCHDOG = "watchdog"
+OFFLINE_TIMEOUT_SECONDS = DEFAULT_POLLING_INTERVAL * 2.5
+WATCHDOG_SWEEP_SECONDS = max(OFFLINE_TIMEOUT_SECONDS / 5, 1.0) # Offline detection latency <= timeout + sweep
+
+
+class OnlineWatchdog:
+    """Flips watched devices offline when their last frame is older than the timeout.
+
+    Watched objects expose ``last_seen`` (time.monotonic() of the last frame, 0 if none),
+    ``online`` and a ``_set_offline()`` callback. Per frame, the owner only stores ``last_seen``.
+    """
+
+    def __init__(self, hass: HomeAssistant, timeout: float = OFFLINE_TIMEOUT_SECONDS,
+                 sweep_interval: float = WATCHDOG_SWEEP_SECONDS):
+        self.hass = hass
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self._watched: Dict[str, object] = {}
+        self._unsub_sweep: Optional[Callable] = None
+
+    @callback
+    def async_register(self, device_sn: str, watched: object) -> None:
+        self._watched[device_sn] = watched
+        if self._unsub_sweep is None:
+            self._unsub_sweep = async_track_time_interval(
+                self.hass, self._async_sweep, timedelta(seconds=self.sweep_interval)
+            )
+            _LOGGER.debug(f"Watchdog started (timeout {self.timeout}s, sweep {self.sweep_interval}s)")
+
+    @callback
+    def async_unregister(self, device_sn: str) -> None:
+        self._watched.pop(device_sn, None)
+        if not self._watched and self._unsub_sweep:
+            self._unsub_sweep()
+            self._unsub_sweep = None
+            _LOGGER.debug("Watchdog stopped (no devices)")
+
+    @callback
+    def _async_sweep(self, _now=None) -> None:
+        """Single pass over all devices."""
+        deadline = time.monotonic() - self.timeout
+        for watched in list(self._watched.values()):
+            if watched.online and watched.last_seen < deadline:
+                watched._set_offline()
+
+
+@callback
+def async_get_watchdog(hass: HomeAssistant) -> OnlineWatchdog:
+    """Return the integration-wide online watchdog."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    watchdog = domain_data.get(DATA_WATCHDOG)
+    if watchdog is None:
+        watchdog = domain_data[DATA_WATCHDOG] = OnlineWatchdog(hass)
+    return watchdog
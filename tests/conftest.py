@@ -0,0 +1,11 @@
+"""Test setup: load the integration modules without Home Assistant's loader."""
+import sys
+import types
+from pathlib import Path
+
+COMPONENT_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "lumentree"
+
+# Bare package (no __init__ side effects) so submodules import like they do in HA
+_package = types.ModuleType("lumentree")
+_package.__path__ = [str(COMPONENT_DIR)]
+sys.modules.setdefault("lumentree", _package)
@@ -0,0 +1,88 @@
+"""Adaptive timeouts and hedged GETs against a local aiohttp server."""
+import asyncio
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from lumentree import api
+
+
+async def _with_server(handler, test, monkeypatch):
+    app = web.Application()
+    app.router.add_route("*", "/x", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    monkeypatch.setattr(api, "BASE_URL", f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}")
+    try:
+        async with aiohttp.ClientSession() as session:
+            client = api.LumentreeHttpApiClient(session)
+            client.set_token("token")
+            await test(client)
+    finally:
+        await runner.cleanup()
+
+
+def test_slow_outliers_are_hedged(monkeypatch):
+    calls = 0
+
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(2.0 if calls % 40 == 0 else 0.01)
+        return web.json_response({"returnValue": 1, "data": {}})
+
+    async def _test(client):
+        worst = 0.0
+        for _ in range(120):
+            started = time.perf_counter()
+            await client._request("GET", "/x")
+            worst = max(worst, time.perf_counter() - started)
+        stats = client.latency_stats["endpoints"]["/x"]
+        assert stats["hedged"] >= 1 and stats["hedge_wins"] >= 1
+        assert worst < 1.0 # A 2 s outlier is answered by its hedge
+        assert stats["timeout_s"] == 5.0 # 3x p99 of ~10 ms, clamped to the minimum
+
+    asyncio.run(_with_server(handler, _test, monkeypatch))
+
+
+def test_api_errors_are_not_latency_samples(monkeypatch):
+    async def handler(request):
+        return web.json_response({"returnValue": 0, "msg": "server error"})
+
+    async def _test(client):
+        for _ in range(20):
+            with pytest.raises(api.ApiException):
+                await client._request("GET", "/x")
+        stats = client.latency_stats["endpoints"]["/x"]
+        assert stats["requests"] == 20
+        assert "p50_ms" not in stats # No samples recorded: fixed timeout, no hedging
+        assert stats["timeout_s"] == 30.0
+
+    asyncio.run(_with_server(handler, _test, monkeypatch))
+
+
+def test_timeout_widens_when_latency_steps_up(monkeypatch):
+    slow = False
+
+    async def handler(request):
+        await asyncio.sleep(6.0 if slow else 0.01)
+        return web.json_response({"returnValue": 1, "data": {}})
+
+    async def _test(client):
+        nonlocal slow
+        for _ in range(20):
+            await client._request("POST", "/x") # POST: not hedged
+        assert client.latency_stats["endpoints"]["/x"]["timeout_s"] == 5.0
+        slow = True # The service now needs 6 s, above the learned 5 s timeout
+        with pytest.raises(api.ApiException, match="Timeout"):
+            await client._request("POST", "/x")
+        assert client.latency_stats["endpoints"]["/x"]["timeout_s"] == 15.0 # 3x the censored 5 s sample
+        await client._request("POST", "/x") # Answered within the widened timeout
+        stats = client.latency_stats["endpoints"]["/x"]
+        assert stats["timeouts"] == 1 and 18.0 <= stats["timeout_s"] < 19.0 # 3x the ~6 s p99
+
+    asyncio.run(_with_server(handler, _test, monkeypatch))
@@ -0,0 +1,74 @@
+"""Shared DNS lookups and broker connection racing with a scripted resolver."""
+import asyncio
+import socket
+import time
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from lumentree.broker_endpoints import BrokerEndpoint, ConnectStats, async_get_dns_cache, async_race_connect
+
+
+async def _with_resolver(answers, test):
+    """Run test(hass) with getaddrinfo answering from answers: host -> (delay, address or exception)."""
+    hass = HomeAssistant("/tmp")
+
+    async def _getaddrinfo(host, port, **kwargs):
+        delay, answer = answers[host]
+        await asyncio.sleep(delay)
+        if isinstance(answer, BaseException):
+            raise answer
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (answer, port))]
+
+    hass.loop.getaddrinfo = _getaddrinfo
+    try:
+        await test(hass)
+    finally:
+        del hass.loop.getaddrinfo
+
+
+def test_waiters_do_not_hang_when_lookup_is_cancelled():
+    async def _test(hass):
+        dns = async_get_dns_cache(hass)
+        first = asyncio.ensure_future(dns.async_resolve("broker", 1883))
+        second = asyncio.ensure_future(dns.async_resolve("broker", 1883))
+        await asyncio.sleep(0.05)
+        first.cancel() # A waiter giving up leaves the shared lookup running
+        assert await asyncio.wait_for(second, 1) == [(socket.AF_INET, "10.0.0.1")]
+        third = asyncio.ensure_future(dns.async_resolve("other", 1883))
+        await asyncio.sleep(0.05)
+        dns._inflight[("other", 1883)].cancel() # The lookup itself dies
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(third, 1)
+        assert not dns._inflight
+
+    asyncio.run(_with_resolver({"broker": (0.2, "10.0.0.1"), "other": (5, "10.0.0.2")}, _test))
+
+
+def test_race_dials_first_answer_without_waiting_for_slow_dns():
+    started = {}
+
+    async def _attempt(endpoint, address, index):
+        started[endpoint.host] = time.monotonic()
+        return address
+
+    async def _test(hass):
+        t0 = time.monotonic()
+        endpoints = [BrokerEndpoint("slow", 1883), BrokerEndpoint("fast", 1883)]
+        result, endpoint, address = await async_race_connect(hass, endpoints, ConnectStats(), _attempt, lambda r: None, 5)
+        assert endpoint.host == "fast" and address == "10.0.0.2"
+        assert started["fast"] - t0 < 0.5
+
+    asyncio.run(_with_resolver({"slow": (3, "10.0.0.1"), "fast": (0, "10.0.0.2")}, _test))
+
+
+def test_race_dns_is_bounded_by_the_timeout():
+    async def _test(hass):
+        stats = ConnectStats()
+        t0 = time.monotonic()
+        with pytest.raises(ConnectionRefusedError, match="timeout"):
+            await async_race_connect(hass, [BrokerEndpoint("stuck", 1883)], stats, None, lambda r: None, 0.3)
+        assert time.monotonic() - t0 < 1
+        assert stats.history[-1]["error"] == "timeout"
+
+    asyncio.run(_with_resolver({"stuck": (30, "10.0.0.1")}, _test))
@@ -0,0 +1,26 @@
+"""Frame log recording and replay."""
+import asyncio
+
+from lumentree.capture import FrameRecorder, async_replay_frames
+
+
+def test_replay_merges_polls_at_the_recorded_time(tmp_path):
+    path = str(tmp_path / "frames.bin")
+    recorder = FrameRecorder(path)
+    for ts, start in ((1000.0, 0), (1000.5, 95), (1005.0, 0), (1005.5, 95)):
+        recorder.record("reportApp/SN1", bytes((start,)), timestamp=ts, start_address=start)
+    recorder.flush()
+
+    class _Analytics:
+        def __init__(self):
+            self.calls = []
+
+        def update_data(self, data, now=None):
+            self.calls.append((now.timestamp(), sorted(data)))
+            return {}
+
+    analytics = _Analytics()
+    # Plain dict frames (no ParsedFrame.start_address)
+    result = asyncio.run(async_replay_frames(path, lambda payload, start: {f"reg_{start}": payload[0]}, analytics))
+    assert result["frames"] == 4 and result["polls"] == 2
+    assert analytics.calls == [(1000.5, ["reg_0", "reg_95"]), (1005.5, ["reg_0", "reg_95"])]
@@ -0,0 +1,94 @@
+"""Intraday curves from the day-data endpoints (fixture in the shape of the getXDayData replies)."""
+import asyncio
+import json
+import math
+from datetime import date
+from pathlib import Path
+
+from homeassistant.core import HomeAssistant
+
+from lumentree import api
+from lumentree.curves import CURVE_POINTS, DailyCurveStore, parse_curve
+
+FIXTURE = json.loads((Path(__file__).parent / "fixtures" / "day_data.json").read_text())
+RESPONSES = {api.URL_GET_PV_DAY_DATA: "pv", api.URL_GET_BAT_DAY_DATA: "bat", api.URL_GET_OTHER_DAY_DATA: "other"}
+
+
+def _daily_data(points: int, partial: bool):
+    """get_daily_data on the fixture, series cut to the first points."""
+    async def _request(method, url, **kwargs):
+        reply = json.loads(json.dumps(FIXTURE[RESPONSES[url]]))
+        data = reply["data"]
+        for item in [*data.get("bats", []), *(v for v in data.values() if isinstance(v, dict))]:
+            item["tableValueInfo"] = item["tableValueInfo"][:points]
+        return reply
+
+    client = api.LumentreeHttpApiClient(None)
+    client._request = _request
+    return asyncio.run(client.get_daily_data("SN1", FIXTURE["queryDate"], partial=partial))
+
+
+def test_full_day_is_five_minute_grid():
+    totals, curves = _daily_data(CURVE_POINTS, partial=False)
+    assert totals["pv_today"] == 25.3 and totals["load_today"] == 16.2
+    assert sorted(curves) == ["charge", "discharge", "grid_in", "load", "pv"]
+    minutes, values = curves["pv"]
+    assert minutes == 5 and len(values) == CURVE_POINTS
+    assert list(values) == FIXTURE["pv"]["data"]["pv"]["tableValueInfo"]
+
+
+def test_partial_day_fills_leading_slots():
+    _totals, curves = _daily_data(144, partial=True) # Fetched at noon
+    minutes, values = curves["pv"]
+    assert minutes == 5 and len(values) == CURVE_POINTS
+    assert list(values[:144]) == FIXTURE["pv"]["data"]["pv"]["tableValueInfo"][:144]
+    assert all(math.isnan(v) for v in values[144:])
+
+
+def test_off_grid_lengths_are_rejected():
+    _totals, curves = _daily_data(144, partial=False) # A finished day must be complete
+    assert curves == {}
+    assert parse_curve({"tableValueInfo": list(range(CURVE_POINTS + 1))}, partial=True) is None
+    assert parse_curve({"tableValueInfo": list(range(96))}) is None
+
+
+def test_past_day_without_curves_is_frozen(tmp_path):
+    _totals, curves = _daily_data(100, partial=True)
+
+    async def _test():
+        hass = HomeAssistant(str(tmp_path))
+        store = DailyCurveStore(hass, "SN1")
+        today, yesterday = date(2025, 6, 15), date(2025, 6, 14)
+        assert store.update(yesterday, curves, yesterday) # Partial, fetched before midnight
+        assert store.days_to_finalize(today) == [yesterday]
+        assert store.update(yesterday, {}, today)
+        assert store.days_to_finalize(today) == []
+        assert store.as_dict(yesterday)["complete"]
+        assert not store.update(today, {}, today)
+        await hass.async_stop(force=True)
+
+    asyncio.run(_test())
+
+
+def test_coordinator_stores_curves_and_freezes_past_days(tmp_path):
+    from lumentree.coordinator_stats import LumentreeStatsCoordinator
+
+    today, yesterday = date(2025, 6, 15), date(2025, 6, 14)
+    _totals, partial_curves = _daily_data(100, partial=True)
+
+    class _Api:
+        async def get_daily_data(self, device_sn, query_date, partial=False):
+            return {"pv_today": 25.3}, {} # Past day: totals, but no curves
+
+    async def _test():
+        hass = HomeAssistant(str(tmp_path))
+        coordinator = LumentreeStatsCoordinator(hass, _Api(), "SN1")
+        await coordinator.curves.async_load()
+        coordinator.curves.update(yesterday, partial_curves, yesterday)
+        await coordinator._async_update_curves(today, partial_curves)
+        assert coordinator.curves.as_dict(today)["flows"]["pv"]["interval_minutes"] == 5
+        assert coordinator.curves.as_dict(yesterday)["complete"]
+        assert coordinator.curves.days_to_finalize(today) == []
+        await hass.async_stop(force=True)
+
+    asyncio.run(_test())
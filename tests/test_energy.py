@@ -0,0 +1,30 @@
+"""MQTT energy integration reconciled with the HTTP daily totals."""
+from datetime import datetime, timedelta, timezone
+
+from lumentree.analytics import EnergyIntegrator
+
+T0 = datetime(2025, 6, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def _integrate(energy, pv_watts, seconds, start):
+    for step in range(0, seconds + 1, 5):
+        energy.update({"pv_power": pv_watts}, start + timedelta(seconds=step))
+
+
+def test_reconcile_snaps_both_ways_and_keeps_energy_since_the_sample():
+    energy = EnergyIntegrator()
+    _integrate(energy, 3600, 600, T0) # 0.6 kWh by 12:10
+    requested = T0 + timedelta(seconds=600)
+    _integrate(energy, 3600, 60, requested) # Another 0.06 kWh while the HTTP request runs
+    totals = energy.reconcile({"pv_today": 0.5}, requested + timedelta(seconds=60), requested)
+    assert abs(totals["pv_today"] - 0.56) < 1e-3 # Lower HTTP total + energy since the sample
+    totals = energy.reconcile({"pv_today": 2.0}, requested + timedelta(seconds=60), requested)
+    assert abs(totals["pv_today"] - 2.06) < 1e-3
+    assert energy.reconcile({"pv_today": None}, requested + timedelta(seconds=60))["pv_today"] == totals["pv_today"]
+
+
+def test_reconcile_ignores_totals_of_the_previous_day():
+    energy = EnergyIntegrator()
+    _integrate(energy, 3600, 60, T0)
+    totals = energy.reconcile({"pv_today": 9.0}, T0 + timedelta(seconds=60), T0 - timedelta(days=1))
+    assert totals["pv_today"] < 0.1
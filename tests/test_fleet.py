@@ -0,0 +1,64 @@
+"""Fleet analytics step over all devices (NumPy and pure Python backends)."""
+import asyncio
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from lumentree.fleet import EVENT_FLEET_ALERTS, FleetAnalytics, FleetAnalyticsManager
+
+
+def _frame(device: int, tick: int):
+    return {
+        "pv_power": 1000 + 100 * tick * device, "load_power": 800.0 + device, "system_efficiency": 90 + device,
+        "battery_temperature": 30 + 3 * tick if device == 1 else 25, "battery_soc": 15 if device == 2 else 60,
+        "battery_voltage": 52.0, "fault_code": 0,
+    }
+
+
+def _run(use_numpy: bool):
+    engine = FleetAnalytics(use_numpy=use_numpy)
+    for device in range(3):
+        engine.register(f"SN{device}")
+    results = []
+    for tick in range(6):
+        for device in range(3):
+            engine.record(f"SN{device}", _frame(device, tick))
+        results.append(engine.step())
+    return results
+
+
+def test_backends_agree():
+    pytest.importorskip("numpy")
+    assert _run(True) == _run(False)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_window_stats_and_alerts(use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    last = _run(use_numpy)[-1]
+    assert last["SN0"]["avg_pv_power_10min"] == 1000.0 and last["SN0"]["power_trend"] == "stable"
+    assert last["SN1"]["temperature_trend"] == "rising" and last["SN1"]["power_trend"] == "increasing"
+    assert last["SN1"]["energy_self_sufficiency"] == 100.0
+    assert last["SN2"]["low_battery_alert"] and not last["SN0"]["low_battery_alert"]
+    assert not any(last[sn]["voltage_alert"] or last[sn]["system_fault_alert"] for sn in last)
+
+
+def test_alert_changes_are_one_event_per_tick(tmp_path):
+    async def _test():
+        hass = HomeAssistant(str(tmp_path))
+        events = []
+        hass.bus.async_listen(EVENT_FLEET_ALERTS, events.append)
+        fleet = FleetAnalyticsManager(hass)
+        for device in range(3):
+            fleet.engine.register(f"SN{device}")
+            fleet.async_record(f"SN{device}", _frame(device, 0))
+        fleet._async_tick()
+        fleet._async_tick() # Nothing changed: no event
+        await hass.async_block_till_done()
+        assert len(events) == 1
+        assert set(events[0].data["devices"]) == {"SN0", "SN1", "SN2"}
+        assert events[0].data["devices"]["SN2"]["low_battery_alert"] is True
+        await hass.async_stop(force=True)
+
+    asyncio.run(_test())
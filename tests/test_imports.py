@@ -0,0 +1,29 @@
+"""The integration imports as Home Assistant loads it (no test shims) and binds the real implementations."""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHECK = """
+import custom_components.lumentree as package
+from custom_components.lumentree import analytics, api, broker_endpoints, capture, command_queue, curves, energy_statistics, parser
+from custom_components.lumentree import coordinator_stats, modbus_tcp, mqtt
+from custom_components.lumentree import binary_sensor, sensor # Platforms load on the pinned core
+
+assert mqtt.LumentreeAnalytics is analytics.LumentreeAnalytics
+assert hasattr(mqtt.LumentreeAnalytics(), "energy")
+assert mqtt.ModbusCommandQueue is command_queue.ModbusCommandQueue
+assert modbus_tcp.ModbusCommandQueue is command_queue.ModbusCommandQueue
+assert mqtt.parse_mqtt_payload is parser.parse_mqtt_payload
+assert mqtt.FrameRecorder is capture.FrameRecorder
+assert mqtt.async_race_connect is broker_endpoints.async_race_connect
+assert coordinator_stats.LumentreeHttpApiClient is api.LumentreeHttpApiClient
+assert coordinator_stats.DailyEnergyStatistics is energy_statistics.DailyEnergyStatistics
+assert coordinator_stats.DailyCurveStore is curves.DailyCurveStore
+"""
+
+
+def test_modules_bind_real_implementations():
+    result = subprocess.run([sys.executable, "-c", CHECK], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
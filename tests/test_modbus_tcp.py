@@ -0,0 +1,110 @@
+"""Local Modbus transports against an in-process stand-in gateway."""
+import asyncio
+import struct
+import types
+
+import pytest
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from lumentree.modbus_tcp import LumentreeModbusTcpClient
+from lumentree.parser import crc16_modbus
+
+REGISTERS = list(range(300))
+REGISTERS[11] = 5200 # battery_voltage 52.00 V
+REGISTERS[22] = 1234 # pv1_power
+REGISTERS[50] = 87 # battery_soc
+REGISTERS[74] = 100 # pv2_power
+
+
+async def _serve(reader, writer, mbap: bool, garbage: bytes = b"", tid_offset: int = 0) -> None:
+    """Stand-in gateway: answers function 3/4 reads from REGISTERS (the first MBAP reply with tid + tid_offset)."""
+    try:
+        while True:
+            if mbap:
+                tid, _, length, unit = struct.unpack(">HHHB", await reader.readexactly(7))
+                pdu = await reader.readexactly(length - 1)
+            else:
+                request = await reader.readexactly(8)
+                assert crc16_modbus(request[:-2]) == int.from_bytes(request[-2:], "little")
+                unit, pdu = request[0], request[1:6]
+            func, address, count = struct.unpack(">BHH", pdu)
+            data = b"".join(struct.pack(">H", REGISTERS[a]) for a in range(address, address + count))
+            response = bytes((func, len(data))) + data
+            if mbap:
+                writer.write(struct.pack(">HHHB", (tid + tid_offset) & 0xFFFF, 0, len(response) + 1, unit) + response)
+                tid_offset = 0
+            else:
+                frame = bytes((unit,)) + response
+                writer.write(garbage + frame + crc16_modbus(frame).to_bytes(2, "little"))
+                garbage = b""
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _with_gateway(transport: str, test, config_dir, **serve_kwargs):
+    hass = HomeAssistant(str(config_dir))
+    await er.async_load(hass) # Empty registry: the read planner reads every register
+    server = await asyncio.start_server(
+        lambda r, w: _serve(r, w, transport == "modbus_tcp", **serve_kwargs), "127.0.0.1", 0
+    )
+    port = server.sockets[0].getsockname()[1]
+    entry = types.SimpleNamespace(
+        data={"transport": transport, "host": "127.0.0.1", "port": port, "device_sn": "SN1"}, options={}, entry_id="e1"
+    )
+    client = LumentreeModbusTcpClient(hass, entry, "SN1", "SN1")
+    client._commands.timeout = 1.0
+    try:
+        await client.connect()
+        await test(client)
+    finally:
+        await client.disconnect()
+        server.close()
+        await hass.async_stop(force=True)
+
+
+@pytest.mark.parametrize("transport", ["modbus_tcp", "rtu_over_tcp"])
+def test_poll_reads_all_planned_ranges(transport, tmp_path):
+    async def _test(client):
+        data = await client.async_request_data()
+        assert data is not None
+        assert data["battery_soc"] == 87
+        assert data["battery_voltage"] == 52.0
+        assert data["pv_power"] == 1334 # pv1 and pv2 come from different ranges
+        assert client.command_stats["responses"] == len(client.read_planner.main_ranges)
+        assert client.online
+
+    asyncio.run(_with_gateway(transport, _test, tmp_path))
+
+
+def test_rtu_resync_after_lost_framing(tmp_path):
+    async def _test(client):
+        # The first response is preceded by noise: it is dropped, the retry is answered
+        data = await client.async_request_data()
+        assert data is not None and data["battery_soc"] == 87
+
+    asyncio.run(_with_gateway("rtu_over_tcp", _test, tmp_path, garbage=b"\x01\x10\xff"))
+
+
+def test_mbap_length_zero_drops_connection(tmp_path):
+    async def _test(client):
+        reader = asyncio.StreamReader()
+        reader.feed_data(struct.pack(">HHHB", 1, 0, 0, 1))
+        with pytest.raises(ConnectionError):
+            await client._async_read_frame(reader)
+
+    asyncio.run(_with_gateway("modbus_tcp", _test, tmp_path))
+
+
+def test_mbap_reply_with_foreign_transaction_id_is_dropped(tmp_path):
+    async def _test(client):
+        # Same register count, wrong transaction id: not taken for the pending read, the retry is answered
+        data = await client.async_request_data()
+        assert data is not None and data["battery_soc"] == 87
+        assert client.command_stats["unsolicited"] == 1
+        assert client.command_stats["retries"] == 1
+
+    asyncio.run(_with_gateway("modbus_tcp", _test, tmp_path, tid_offset=1000))
@@ -0,0 +1,30 @@
+"""Modbus response parsing."""
+import struct
+
+from lumentree.parser import ParsedFrame, crc16_modbus, parse_mqtt_payload, verify_crc
+
+
+def _response(registers, start_byte=b"\x01\x03"):
+    frame = start_byte + bytes((2 * len(registers),)) + b"".join(struct.pack(">H", r) for r in registers)
+    return frame + crc16_modbus(frame).to_bytes(2, "little")
+
+
+def test_crc_is_checked():
+    frame = _response(list(range(95)))
+    assert verify_crc(frame)
+    assert isinstance(parse_mqtt_payload(frame), ParsedFrame)
+    corrupt = frame[:10] + bytes((frame[10] ^ 0xFF,)) + frame[11:]
+    assert not verify_crc(corrupt)
+    assert parse_mqtt_payload(corrupt) == {}
+
+
+def test_frame_is_a_view_of_the_payload():
+    payload = _response(list(range(95)))
+    frame = parse_mqtt_payload(payload)
+    assert frame._view.obj is payload # No copy of the register data
+    assert frame["battery_voltage"] == 0.11 and frame["battery_soc"] == 50
+
+
+def test_battery_cells_from_the_payload_view():
+    cells = parse_mqtt_payload(_response([3300, 3310, 3295, 0, 0]), 250)["battery_cells"]
+    assert list(cells) == [3300, 3310, 3295]
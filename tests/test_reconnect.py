@@ -0,0 +1,38 @@
+"""Reconnect loop and the shared broker circuit breaker."""
+import asyncio
+import time
+import types
+
+from homeassistant.core import HomeAssistant
+
+from lumentree import mqtt
+from lumentree.reconnect import STATE_OPEN, async_get_breaker
+
+
+def test_cancelled_probe_is_released(tmp_path, monkeypatch):
+    monkeypatch.setattr(mqtt, "full_jitter_delay", lambda *args: 0)
+
+    async def _test():
+        hass = HomeAssistant(str(tmp_path))
+        entry = types.SimpleNamespace(data={"device_sn": "SN1"}, options={}, entry_id="e1")
+        client = mqtt.LumentreeMqttClient(hass, entry, "SN1", "SN1")
+        breaker = async_get_breaker(hass, client._broker_host)
+        breaker.state, breaker._next_probe = STATE_OPEN, time.monotonic()
+        breaker._closed.clear()
+        attempting = asyncio.Event()
+
+        async def _hanging_reconnect():
+            attempting.set()
+            await asyncio.sleep(60)
+
+        client._async_reconnect_once = _hanging_reconnect
+        task = asyncio.ensure_future(client._async_reconnect_loop())
+        await asyncio.wait_for(attempting.wait(), 5)
+        assert breaker._probe_in_flight
+        task.cancel() # Unload while the probe is out
+        await asyncio.gather(task, return_exceptions=True)
+        assert not breaker._probe_in_flight
+        assert await asyncio.wait_for(breaker.async_acquire(), 1) # The next client may probe
+        await hass.async_stop(force=True)
+
+    asyncio.run(_test())
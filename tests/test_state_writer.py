@@ -0,0 +1,46 @@
+"""Deadband-filtered, coalesced state writes with a timed heartbeat."""
+import asyncio
+
+from homeassistant.core import HomeAssistant
+
+from lumentree import state_writer
+from lumentree.state_writer import Deadband, StateWriteCoalescer
+
+
+class _Entity:
+    def __init__(self, hass, entity_id):
+        self.hass, self.entity_id = hass, entity_id
+        self.state, self.written = None, []
+
+    def async_write_ha_state(self):
+        self.written.append(self.state)
+
+
+def test_heartbeat_writes_latest_value_without_new_frames(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(state_writer.time, "monotonic", lambda: clock[0])
+
+    async def _test():
+        hass = HomeAssistant(str(tmp_path))
+        writer = StateWriteCoalescer(hass)
+        entity = _Entity(hass, "sensor.pv")
+        deadband = Deadband(absolute=10.0, min_interval=0.0, heartbeat=300.0)
+        apply = lambda value: setattr(entity, "state", value)
+        assert writer.async_schedule_write(entity, 1000, deadband, apply)
+        assert not writer.async_schedule_write(entity, 1004, deadband, apply) # Inside the deadband
+        await asyncio.sleep(0)
+        assert entity.written == [1000]
+        clock[0] += 299
+        writer._async_heartbeat()
+        await asyncio.sleep(0)
+        assert entity.written == [1000]
+        clock[0] += 2 # No new value arrived, the timer still writes the latest one
+        writer._async_heartbeat()
+        await asyncio.sleep(0)
+        assert entity.written == [1000, 1004] and writer.heartbeat_writes == 1
+        assert writer._unsub_heartbeat is not None
+        writer.async_forget(entity.entity_id)
+        assert writer._unsub_heartbeat is None
+        await hass.async_stop(force=True)
+
+    asyncio.run(_test())